@@ -0,0 +1,240 @@
+"""性能基准测试
+
+对 FishingStateManager.update_state 循环做微基准测试，在同一帧上对比旧版本的识别方式
+(每次检查都从磁盘读取模板并在整张截图上匹配) 与当前实现的每秒处理帧数，
+模拟器合成的各界面画面上按状态分别对比，以及缩小的窗口配合按比例缩放的模板时的每秒处理帧数。
+另外对比方向图标位置聚类在密集匹配结果上的逐点比较实现与连通域实现的耗时，
+两者在实际画面上结果一致的检查见 tests/test_peaks.py，
+以及启动耗时：导入 main 模块的时间、识别所有界面与只确认上次状态两种初始状态判断的耗时。
+指定录制的会话时，在无界面环境下回放会话，输出每秒帧数、各项检查的耗时分位数、状态切换延迟
+和启动到第一次鼠标操作的时间。
+指定 --simulate N 时，分别用 1 个和 N 个模拟窗口运行 simulator.py 的模拟器，
+输出各实例的识别帧率、反应时间和多实例时的总识别帧率。
+
+用法:
+    python benchmark.py [截图路径] [--frames N] [--peak-radius R]
+    python benchmark.py --session <会话目录> [--speed S]
+    python benchmark.py --simulate N [--duration S] [--speed S]
+
+不指定截图时，使用由模板图像拼接出的抛竿界面作为测试帧。
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from common import STATE_TEMPLATES, FishState
+from main import FishingStateManager
+from replay import print_report, replay_session
+from setting import Config
+from simulator import FishingSimulator, print_report as print_simulation, run_simulation
+from vision import ImageProcessor, TemplateRegistry
+
+# 旧版本 update_state 在各状态下依次检查的界面模板，任一模板匹配后不再检查后面的模板
+BASELINE_CHECKS: Dict[FishState, Tuple[Path, ...]] = {
+    FishState.START_FISHING: (Config.BAIT_IMAGE,),
+    FishState.CAST_ROD: (Config.USE_BUTTON, Config.TIME_IMAGE),
+    FishState.NO_BAIT: (Config.USE_BUTTON,),
+    FishState.CATCH_FISH: (Config.PRESSURE_IMAGE,),
+    FishState.FISHING: (Config.RETRY_BUTTON, Config.UP_IMAGE),
+    FishState.INSTANT_KILL: (Config.RETRY_BUTTON,),
+    FishState.END_FISHING: (Config.BAIT_IMAGE,),
+}
+
+
+def baseline_update_state(img: np.ndarray, state: FishState) -> None:
+    """旧版本 update_state 的识别开销：每次检查都从磁盘读取模板，在整张截图上匹配"""
+    for path in BASELINE_CHECKS[state]:
+        template = cv2.imread(str(path))
+        res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
+        if len(np.where(res >= 0.8)[0]) > 0:
+            break
+
+
+def measure_baseline_fps(frame: np.ndarray, state: FishState, frames: int) -> float:
+    """测量旧版本识别方式在指定状态下的每秒处理帧数"""
+    start = time.perf_counter()
+    for _ in range(frames):
+        baseline_update_state(frame, state)
+    return frames / (time.perf_counter() - start)
+
+
+def make_synthetic_frame() -> np.ndarray:
+    """生成一张包含鱼饵图标的合成抛竿界面截图"""
+    width, height = Config.WINDOW_SIZE[2], Config.WINDOW_SIZE[3]
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    bait = cv2.imread(str(Config.BAIT_IMAGE))
+    y, x = height // 2, width // 2
+    frame[y:y + bait.shape[0], x:x + bait.shape[1]] = bait
+    return frame
+
+
+def measure_fps(frame: np.ndarray, templates: TemplateRegistry, frames: int, 
+                state: Optional[FishState] = None) -> float:
+    """测量 update_state 循环的每秒处理帧数，每一帧都完整识别
+    
+    指定状态时从该状态开始识别，否则使用初始状态判断的结果
+    """
+    state_manager = FishingStateManager(frame, templates, last_state=state)
+    if state is not None and state_manager.current_state != state:
+        state_manager.publish(state, 0)
+    state_manager._is_unchanged = lambda img: False
+    start = time.perf_counter()
+    for _ in range(frames):
+        state_manager.update_state(frame)
+    return frames / (time.perf_counter() - start)
+
+
+def measure_import_time(rounds: int = 3) -> float:
+    """在新的解释器中测量导入 main 模块的平均耗时(毫秒)"""
+    code = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    total = 0.0
+    for _ in range(rounds):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=str(Config.BASE_DIR))
+        total += float(result.stdout.strip().splitlines()[-1])
+    return total / rounds * 1000
+
+
+def measure_initial_state(frame: np.ndarray, templates: TemplateRegistry, 
+                          last_state: FishState, rounds: int = 20) -> Tuple[float, float]:
+    """测量识别所有界面和只确认上次状态两种方式判断初始状态的平均耗时(毫秒)"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        FishingStateManager(frame, templates)
+    full = (time.perf_counter() - start) / rounds * 1000
+    
+    start = time.perf_counter()
+    for _ in range(rounds):
+        FishingStateManager(frame, templates, last_state=last_state)
+    restored = (time.perf_counter() - start) / rounds * 1000
+    return full, restored
+
+
+def make_dense_response(radius: int, count: int = 8) -> np.ndarray:
+    """生成密集的方向图标匹配结果，每个图标实例周围半径 radius 内的点都超过阈值"""
+    width, height = Config.WINDOW_SIZE[2], Config.WINDOW_SIZE[3] // 2
+    rng = np.random.default_rng(0)
+    res = rng.uniform(0, 0.7, size=(height, width)).astype(np.float32)
+    yy, xx = np.mgrid[0:height, 0:width]
+    for i in range(count):
+        cx, cy = (i + 1) * width // (count + 1), height // 2
+        blob = np.hypot(xx - cx, yy - cy) <= radius
+        res[blob] = 0.8 + 0.2 * rng.random(int(blob.sum()))
+    return res
+
+
+def baseline_classify_positions(point_list: list) -> list:
+    """旧版本 FishingActionExecutor._classify_positions 的逐点比较聚类，作为对比基准"""
+    result_points = []
+    for i in range(len(point_list)):
+        point_set = set()
+        if point_list[i] is None:
+            continue
+        point_set.add(point_list[i])
+        for j in range(i + 1, len(point_list)):
+            if point_list[j] is None:
+                continue
+            if (abs(point_list[i][0] - point_list[j][0]) < 10 and 
+                abs(point_list[i][1] - point_list[j][1]) < 10):
+                point_set.add(point_list[j])
+                point_list[j] = None
+        if len(point_set) > 1:
+            average_x = int(sum([x[0] for x in point_set]) / len(point_set))
+            average_y = int(sum([x[1] for x in point_set]) / len(point_set))
+            result_points.append((average_x, average_y))
+    return result_points
+
+
+def measure_peaks(res: np.ndarray, rounds: int = 3) -> Tuple[float, float, int, int]:
+    """测量逐点比较聚类和连通域峰值提取的平均耗时(毫秒)以及各自得到的位置数"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        expected = baseline_classify_positions(list(zip(*np.where(res >= 0.8)[::-1])))
+    before = (time.perf_counter() - start) / rounds * 1000
+    
+    start = time.perf_counter()
+    for _ in range(rounds):
+        peaks = ImageProcessor.extract_peaks(res, 0.8)
+    after = (time.perf_counter() - start) / rounds * 1000
+    return before, after, len(expected), len(peaks)
+
+
+def run(screenshot: Optional[str], frames: int, peak_radius: int) -> None:
+    """运行基准测试并输出结果"""
+    if screenshot:
+        frame = cv2.imread(screenshot)
+        if frame is None:
+            raise FileNotFoundError(f"无法读取截图: {screenshot}")
+    else:
+        frame = make_synthetic_frame()
+
+    templates = TemplateRegistry()
+    state = FishingStateManager(frame, templates).current_state
+    before = measure_baseline_fps(frame, state, frames)
+    after = measure_fps(frame, templates, frames, state)
+    print(f"update_state 测试帧 ({state.name})")
+    print(f"旧版本: {before:.1f} fps")
+    print(f"当前:   {after:.1f} fps")
+    print(f"提升: {after / before:.2f}x")
+    for scale in (0.75, 0.5):
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        fps = measure_fps(small, templates.scaled(scale), frames, state)
+        print(f"update_state 窗口缩小到 {scale:.2f} 倍: {fps:.1f} fps ({fps / after:.2f}x)")
+    print("update_state 模拟画面，旧版本 / 当前:")
+    simulator = FishingSimulator(Config.WINDOW_SIZE)
+    for state in STATE_TEMPLATES:
+        image = simulator.render_state(state)
+        before = measure_baseline_fps(image, state, frames)
+        after = measure_fps(image, templates, frames, state)
+        print(f"  {state.name}: {before:.1f} / {after:.1f} fps ({after / before:.2f}x)")
+
+    res = make_dense_response(peak_radius)
+    before, after, before_count, after_count = measure_peaks(res)
+    print(f"方向图标聚类 ({int((res >= 0.8).sum())} 个候选点，8 个图标实例)")
+    print(f"逐点比较: {before:.1f} ms，{before_count} 个位置")
+    print(f"连通域:   {after:.1f} ms，{after_count} 个位置")
+    print(f"提升: {before / after:.2f}x")
+
+    print(f"导入 main 模块: {measure_import_time():.1f} ms")
+    last_state = FishingStateManager(frame, templates).current_state
+    full, restored = measure_initial_state(frame, templates, last_state)
+    print(f"初始状态判断 ({last_state.name})")
+    print(f"识别所有界面: {full:.1f} ms")
+    print(f"确认上次状态: {restored:.1f} ms")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="识别性能基准测试")
+    parser.add_argument("screenshot", nargs="?", help="用作测试帧的截图路径")
+    parser.add_argument("--frames", type=int, default=200, help="每轮测试的帧数")
+    parser.add_argument("--peak-radius", type=int, default=15, help="密集匹配结果中每个图标实例超过阈值的半径")
+    parser.add_argument("--session", help="回放录制的会话目录")
+    parser.add_argument("--speed", type=float, default=0, help="会话回放倍速，为0时逐帧回放；模拟时为游戏节奏倍速，默认为1")
+    parser.add_argument("--simulate", type=int, help="用模拟器测试，指定最多的模拟窗口数")
+    parser.add_argument("--duration", type=float, default=30, help="每轮模拟的运行时间(秒)")
+    args = parser.parse_args()
+    Config.init()
+    if args.session:
+        print_report(replay_session(Path(args.session), args.speed))
+    elif args.simulate:
+        single = run_simulation(1, args.duration, args.speed or 1.0)
+        print_simulation(single)
+        if args.simulate > 1:
+            multiple = run_simulation(args.simulate, args.duration, args.speed or 1.0)
+            print_simulation(multiple)
+            total = sum(report.frames for report in multiple) / multiple[0].duration
+            print(f"多实例扩展: {total / (single[0].frames / single[0].duration):.2f}x ({args.simulate} 个实例)")
+    else:
+        run(args.screenshot, args.frames, args.peak_radius)
+
+
+if __name__ == '__main__':
+    main()
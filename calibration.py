@@ -0,0 +1,391 @@
+"""配置文件和位置标定的读写，以及位置标定的导入导出命令
+
+ConfigManager 读写 config.yaml 和运行状态，CalibrationStore 保存位置标定。
+
+位置标定按窗口标题和分辨率保存在 generate/calibration 目录下的 JSON 文件中，
+需要手动查看或修改时先导出为 YAML，编辑后再导入。导出的位置是相对窗口左上角的坐标。
+learn 由录制的会话学习各界面模板的匹配阈值，保存到录制时窗口对应的标定中。
+
+用法:
+    python calibration.py list
+    python calibration.py export <标定文件名> [YAML路径]
+    python calibration.py import <YAML路径>
+    python calibration.py learn <会话目录>
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from common import FishState, GameConfig
+from setting import Config
+
+
+class ConfigManager:
+    """配置管理类，处理配置文件的读写"""
+    
+    # 配置文件中不属于 GameConfig 的运行选项
+    RUNTIME_OPTIONS = ('instances', 'vision_pool', 'record_session', 'metrics', 'metrics_port', 'input_backend')
+    
+    @staticmethod
+    def write_yaml(data: Dict[str, Any], path: Path = Config.CONFIG_FILE) -> None:
+        """写入YAML配置文件"""
+        import yaml
+        with open(str(path), 'w', encoding='utf-8') as f:
+            yaml.dump(data, f)
+    
+    @staticmethod
+    def read_yaml(path: Path = Config.CONFIG_FILE) -> Dict[str, Any]:
+        """读取YAML配置文件"""
+        import yaml
+        with open(str(path), 'r', encoding='utf-8') as f:
+            return yaml.load(f, Loader=yaml.FullLoader)
+    
+    @staticmethod
+    def state_path(config: GameConfig) -> Path:
+        """状态快照的路径，与实例的配置文件放在一起"""
+        path = Path(config.config_path) if config.config_path else Config.CONFIG_FILE
+        return path.with_suffix('.state.json')
+    
+    @staticmethod
+    def save_state(config: GameConfig, state: FishState) -> None:
+        """保存当前状态快照，重启时先确认快照中的状态，不必识别所有界面"""
+        path = ConfigManager.state_path(config)
+        data = {
+            'state': state.name,
+            'window_size': list(config.window_size),
+            'resources': Config.resource_digest,
+            'time': time.time(),
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix('.tmp')
+        temp.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(temp, path)
+    
+    @staticmethod
+    def load_state(config: GameConfig) -> Optional[FishState]:
+        """读取状态快照，窗口大小或资源文件与保存时不同时返回None"""
+        try:
+            data = json.loads(ConfigManager.state_path(config).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        if data.get('window_size') != list(config.window_size) or data.get('resources') != Config.resource_digest:
+            return None
+        return FishState.__members__.get(data.get('state'))
+    
+    @staticmethod
+    def instance_config_path(window_title: str) -> Path:
+        """多实例时各实例配置文件的路径"""
+        name = re.sub(r'[\\/:*?"<>|]', '_', window_title)
+        return Config.INSTANCE_CONFIG_DIR / f"{name}.yaml"
+
+
+class CalibrationStore:
+    """位置标定存储
+    
+    每个窗口标题和分辨率的标定保存为 directory 下的一个 JSON 文件，多个实例各写各的文件。
+    只保存数据，共享或被修改过的文件不会执行任何代码，格式不符时当作没有标定。
+    检测到新位置时只更新缓存中对应的字段，值有变化时标记为待写入，由 flush 统一写入，
+    先写临时文件再替换，中途退出不会留下损坏的文件。
+    位置以相对窗口左上角的坐标保存，窗口移动后仍然有效。
+    YAML 作为可手动编辑的导入导出格式，见 export_yaml 和 import_yaml。
+    """
+    
+    FIELDS = ('start_fishing_pos', 'rod_position', 'pressure_indicator_pos', 'low_pressure_color',
+              'original_rod_color', 'direction_icon_positions', 'retry_button_center',
+              'use_bait_button_pos', 'ui_rois', 'template_scale', 'template_thresholds',
+              'fishing_click_interval', 'rod_retrieve_interval', 'pressure_backoff')
+    # 以屏幕坐标保存在 GameConfig 中的位置字段
+    POSITION_FIELDS = ('start_fishing_pos', 'rod_position', 'pressure_indicator_pos',
+                       'retry_button_center', 'use_bait_button_pos')
+    # 保存为单个数值的字段，模板比例和自动调整的钓鱼节奏参数
+    SCALAR_FIELDS = ('template_scale', 'fishing_click_interval', 'rod_retrieve_interval', 'pressure_backoff')
+    
+    directory: Path = Config.CALIBRATION_DIR
+    _cache: Dict[Path, Dict[str, Any]] = {}
+    _dirty: Set[Path] = set()  # 有未写入修改的存储文件
+    _lock = Lock()
+    
+    @staticmethod
+    def use(directory: Path) -> None:
+        """更换存储目录，回放时使用临时目录，不影响实际的标定"""
+        CalibrationStore.flush()
+        with CalibrationStore._lock:
+            CalibrationStore.directory = Path(directory)
+            CalibrationStore._cache.clear()
+    
+    @staticmethod
+    def path(window_title: str, resolution: Tuple[int, int]) -> Path:
+        """窗口标题和分辨率对应的存储文件"""
+        name = re.sub(r'[\\/:*?"<>|]', '_', window_title)
+        return CalibrationStore.directory / f"{name}_{resolution[0]}x{resolution[1]}.json"
+    
+    @staticmethod
+    def _path_for(config: GameConfig) -> Path:
+        return CalibrationStore.path(config.window_title, tuple(config.window_size[2:]))
+    
+    @staticmethod
+    def _normalize(data: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON 和 YAML 中的列表还原为坐标元组，格式不符时抛出ValueError"""
+        try:
+            fields = data.get('fields') or {}
+            if 'window_title' not in data or 'resolution' not in data or set(fields) - set(CalibrationStore.FIELDS):
+                raise ValueError("缺少窗口信息或含有未知字段")
+            return {
+                'window_title': str(data['window_title']),
+                'resolution': tuple(map(int, data['resolution'])),
+                'fields': {
+                    name: value if value is None or name in (*CalibrationStore.SCALAR_FIELDS, 'template_thresholds')
+                    else {key: tuple(pos) for key, pos in value.items()} if isinstance(value, dict) 
+                    else tuple(value)
+                    for name, value in fields.items()
+                },
+            }
+        except (AttributeError, TypeError) as e:
+            raise ValueError(str(e)) from e
+    
+    @staticmethod
+    def read(path: Path) -> Optional[Dict[str, Any]]:
+        """读取存储文件，文件不存在或已损坏时返回None"""
+        try:
+            return CalibrationStore._normalize(json.loads(path.read_text(encoding='utf-8')))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"位置标定文件 {path} 读取失败，将重新标定: {e}")
+            return None
+    
+    @staticmethod
+    def _write(path: Path, data: Dict[str, Any]) -> None:
+        """先写临时文件再替换"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix(f'.{os.getpid()}.tmp')
+        temp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding='utf-8')
+        os.replace(temp, path)
+    
+    @staticmethod
+    def flush() -> None:
+        """写入所有有未保存修改的标定文件"""
+        with CalibrationStore._lock:
+            for path in CalibrationStore._dirty:
+                CalibrationStore._write(path, CalibrationStore._cache[path])
+            CalibrationStore._dirty.clear()
+    
+    @staticmethod
+    def _to_relative(config: GameConfig, name: str) -> Any:
+        """GameConfig 中的字段值转换为保存的值"""
+        value = getattr(config, name)
+        if value is None:
+            return None
+        x, y = config.window_size[:2]
+        if name in CalibrationStore.POSITION_FIELDS:
+            return (int(value[0] - x), int(value[1] - y))
+        if name == 'direction_icon_positions':
+            return {key: (int(pos[0] - x), int(pos[1] - y)) for key, pos in value.items()}
+        if name == 'ui_rois':
+            return {key: tuple(map(int, roi)) for key, roi in value.items()}
+        if name in CalibrationStore.SCALAR_FIELDS:
+            return float(value)
+        if name == 'template_thresholds':
+            return {key: float(threshold) for key, threshold in value.items()}
+        return tuple(map(int, value))
+    
+    @staticmethod
+    def _to_absolute(config: GameConfig, name: str, value: Any) -> Any:
+        """保存的值转换为 GameConfig 中的字段值"""
+        if value is None:
+            return None
+        x, y = config.window_size[:2]
+        if name in CalibrationStore.POSITION_FIELDS:
+            return (value[0] + x, value[1] + y)
+        if name == 'direction_icon_positions':
+            return {key: (pos[0] + x, pos[1] + y) for key, pos in value.items()}
+        if name in ('ui_rois', 'template_thresholds'):
+            return dict(value)
+        if name in CalibrationStore.SCALAR_FIELDS:
+            return float(value)
+        return tuple(value)
+    
+    @staticmethod
+    def load(config: GameConfig) -> None:
+        """把保存的标定填入配置
+        
+        还没有保存过时，把配置文件中已有的标定导入存储，兼容旧版本只保存在 config.yaml 中的标定。
+        """
+        path = CalibrationStore._path_for(config)
+        with CalibrationStore._lock:
+            data = CalibrationStore.read(path)
+            if data is None:
+                data = {
+                    'window_title': config.window_title,
+                    'resolution': tuple(config.window_size[2:]),
+                    'fields': {name: CalibrationStore._to_relative(config, name) 
+                               for name in CalibrationStore.FIELDS if getattr(config, name) is not None},
+                }
+                if data['fields']:
+                    CalibrationStore._write(path, data)
+            CalibrationStore._cache[path] = data
+        for name, value in data['fields'].items():
+            setattr(config, name, CalibrationStore._to_absolute(config, name, value))
+    
+    @staticmethod
+    def update(config: GameConfig, *names: str) -> None:
+        """保存配置中的指定标定字段，其它字段保持不变
+        
+        只更新缓存，值有变化时在下一次 flush 时写入文件。
+        """
+        path = CalibrationStore._path_for(config)
+        with CalibrationStore._lock:
+            data = CalibrationStore._cache.get(path) or CalibrationStore.read(path) or {
+                'window_title': config.window_title,
+                'resolution': tuple(config.window_size[2:]),
+                'fields': {},
+            }
+            CalibrationStore._cache[path] = data
+            for name in names:
+                value = CalibrationStore._to_relative(config, name)
+                if name not in data['fields'] or data['fields'][name] != value:
+                    data['fields'][name] = value
+                    CalibrationStore._dirty.add(path)
+    
+    @staticmethod
+    def derive(config: GameConfig) -> bool:
+        """同一窗口标题在其它分辨率下有标定时，按模板比例换算出本分辨率的标定
+        
+        只填入配置中还没有的字段，换算后的位置按窗口内容整体缩放估计，之后检测到的位置会覆盖。
+        
+        Returns:
+            是否找到可以换算的标定
+        """
+        if config.template_scale is None:
+            return False
+        own = CalibrationStore._path_for(config)
+        for path in CalibrationStore.entries():
+            data = CalibrationStore.read(path)
+            if path == own or data is None or data.get('window_title') != config.window_title:
+                continue
+            fields = data['fields']
+            if not fields.get('template_scale'):
+                continue
+            ratio = config.template_scale / fields['template_scale']
+            derived = []
+            for name, value in fields.items():
+                # 匹配分数随分辨率变化，学习的阈值不换算
+                if value is None or getattr(config, name) is not None or name in ('template_scale', 'template_thresholds'):
+                    continue
+                if name in CalibrationStore.POSITION_FIELDS:
+                    value = (round(value[0] * ratio), round(value[1] * ratio))
+                elif name == 'direction_icon_positions':
+                    value = {key: (round(pos[0] * ratio), round(pos[1] * ratio)) for key, pos in value.items()}
+                elif name == 'ui_rois':
+                    value = {key: tuple(round(v * ratio) for v in roi) for key, roi in value.items()}
+                setattr(config, name, CalibrationStore._to_absolute(config, name, value))
+                derived.append(name)
+            if derived:
+                CalibrationStore.update(config, *derived)
+                logging.info(f"由分辨率 {data['resolution'][0]}x{data['resolution'][1]} 的标定换算出: {derived}")
+            return True
+        return False
+    
+    @staticmethod
+    def entries() -> List[Path]:
+        """所有保存的标定文件"""
+        return sorted(CalibrationStore.directory.glob('*.json'))
+    
+    @staticmethod
+    def export_yaml(path: Path, yaml_path: Path) -> None:
+        """把一个标定文件导出为 YAML，位置为相对窗口左上角的坐标"""
+        CalibrationStore.flush()
+        data = CalibrationStore.read(path)
+        if data is None:
+            raise FileNotFoundError(f"位置标定文件不存在: {path}")
+        # 坐标写成普通列表，方便手动编辑
+        ConfigManager.write_yaml(json.loads(json.dumps(data)), yaml_path)
+    
+    @staticmethod
+    def import_yaml(yaml_path: Path) -> Path:
+        """从 YAML 导入标定，覆盖同一窗口标题和分辨率的已有标定，返回写入的标定文件"""
+        try:
+            data = CalibrationStore._normalize(ConfigManager.read_yaml(yaml_path) or {})
+        except ValueError as e:
+            raise ValueError(f"无效的位置标定文件: {yaml_path}") from e
+        path = CalibrationStore.path(data['window_title'], data['resolution'])
+        with CalibrationStore._lock:
+            CalibrationStore._write(path, data)
+            CalibrationStore._cache[path] = data
+            CalibrationStore._dirty.discard(path)
+        return path
+
+
+def list_entries() -> None:
+    """列出所有保存的标定"""
+    entries = CalibrationStore.entries()
+    if not entries:
+        print(f"{CalibrationStore.directory} 中没有保存的标定")
+    for path in entries:
+        data = CalibrationStore.read(path) or {'fields': {}}
+        fields = [name for name, value in data['fields'].items() if value is not None]
+        print(f"{path.stem}: {', '.join(fields) or '无'}")
+
+
+def learn_thresholds(session_path: Path) -> None:
+    """由录制的会话学习匹配阈值并保存"""
+    import cv2
+    from capture import RecordedSession
+    from main import ThresholdLearner
+    from vision import ScaleCalibrator, TemplateRegistry
+    
+    session = RecordedSession.load(session_path)
+    config = session.game_config()
+    CalibrationStore.load(config)
+    templates = TemplateRegistry()
+    if config.template_scale is None and session.frames:
+        first = cv2.imread(str(session.path / session.frames[0]['file']))
+        config.template_scale, _ = ScaleCalibrator.estimate(first, templates)
+    thresholds = ThresholdLearner.learn(session, templates.scaled(config.template_scale or 1.0))
+    if not thresholds:
+        print("会话中没有可用于学习的状态变化记录")
+        return
+    config.template_thresholds = {**(config.template_thresholds or {}), **thresholds}
+    CalibrationStore.update(config, 'template_thresholds')
+    CalibrationStore.flush()
+    for name, threshold in thresholds.items():
+        print(f"{name}: {threshold:.3f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="位置标定的导入导出")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出所有保存的标定")
+    export_parser = commands.add_parser("export", help="导出为 YAML")
+    export_parser.add_argument("name", help="标定文件名，见 list 的输出")
+    export_parser.add_argument("yaml", nargs="?", help="导出路径，默认为当前目录下的同名 .yaml 文件")
+    import_parser = commands.add_parser("import", help="从 YAML 导入")
+    import_parser.add_argument("yaml", help="导出后编辑过的 YAML 文件")
+    learn_parser = commands.add_parser("learn", help="由录制的会话学习匹配阈值")
+    learn_parser.add_argument("session", help="会话目录")
+    args = parser.parse_args()
+    Config.init()
+
+    match args.command:
+        case "list":
+            list_entries()
+        case "export":
+            path = CalibrationStore.directory / f"{Path(args.name).stem}.json"
+            yaml_path = Path(args.yaml) if args.yaml else Path(f"{path.stem}.yaml")
+            CalibrationStore.export_yaml(path, yaml_path)
+            print(f"已导出到 {yaml_path}")
+        case "import":
+            print(f"已导入到 {CalibrationStore.import_yaml(Path(args.yaml))}")
+        case "learn":
+            learn_thresholds(Path(args.session))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,619 @@
+"""窗口查找和截图
+
+WindowManager 查找模拟器窗口，FrameSource 的各个后端截图并发布到 FrameBus，
+SessionRecorder 和 RecordedSession 录制和读取会话。
+"""
+import copy
+import json
+import queue
+import weakref
+import time
+import numpy as np
+from threading import Thread, Condition, Event, Lock, local
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any, List, Callable
+from dataclasses import dataclass
+from setting import Config
+from common import FishState, GameConfig, LazyModule
+from metrics import Metrics
+import logging
+
+# OpenCV 导入较慢，推迟到第一次识别时
+cv2 = LazyModule('cv2', globals())
+
+
+class WindowBackend:
+    """窗口操作后端基类"""
+    
+    def find_window(self, title: str) -> int:
+        """查找指定标题的窗口句柄，未找到时返回0"""
+        raise NotImplementedError
+    
+    def get_window_rect(self, hwnd: int) -> Tuple[int, int, int, int]:
+        """获取窗口的 (left, top, right, bottom)"""
+        raise NotImplementedError
+    
+    def bring_to_front(self, hwnd: int) -> None:
+        """将窗口置于最前端并激活"""
+        raise NotImplementedError
+    
+    def set_window_pos(self, hwnd: int, window_size: Tuple[int, int, int, int]) -> None:
+        """设置窗口位置和大小 (x, y, width, height)"""
+        raise NotImplementedError
+    
+    def list_windows(self) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+        """列出所有可见窗口的 (标题, (left, top, right, bottom))"""
+        raise NotImplementedError
+
+
+class Win32WindowBackend(WindowBackend):
+    """通过 win32gui 操作窗口"""
+    
+    def __init__(self):
+        import win32gui
+        import win32con
+        self._win32gui = win32gui
+        self._win32con = win32con
+    
+    def find_window(self, title: str) -> int:
+        return self._win32gui.FindWindow(None, title)
+    
+    def get_window_rect(self, hwnd: int) -> Tuple[int, int, int, int]:
+        return self._win32gui.GetWindowRect(hwnd)
+    
+    def bring_to_front(self, hwnd: int) -> None:
+        self._win32gui.SetForegroundWindow(hwnd)
+        self._win32gui.ShowWindow(hwnd, self._win32con.SW_RESTORE)
+    
+    def set_window_pos(self, hwnd: int, window_size: Tuple[int, int, int, int]) -> None:
+        self._win32gui.SetWindowPos(hwnd, None, *window_size, 0)
+    
+    def list_windows(self) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+        windows = []
+        
+        def callback(hwnd: int, _) -> bool:
+            if self._win32gui.IsWindowVisible(hwnd):
+                windows.append((self._win32gui.GetWindowText(hwnd), self._win32gui.GetWindowRect(hwnd)))
+            return True
+        
+        self._win32gui.EnumWindows(callback, None)
+        return windows
+
+
+class FakeWindowBackend(WindowBackend):
+    """内存中的窗口，用于无界面环境下回放和测试"""
+    
+    def __init__(self, windows: Optional[Dict[str, Tuple[int, int, int, int]]] = None):
+        # 窗口标题 -> (x, y, width, height)，句柄为列表下标加1
+        self.titles = list(windows or {})
+        self.sizes = list((windows or {}).values())
+    
+    def add_window(self, title: str, window_size: Tuple[int, int, int, int]) -> int:
+        """添加一个窗口，返回句柄"""
+        self.titles.append(title)
+        self.sizes.append(tuple(window_size))
+        return len(self.titles)
+    
+    def find_window(self, title: str) -> int:
+        return self.titles.index(title) + 1 if title in self.titles else 0
+    
+    def get_window_rect(self, hwnd: int) -> Tuple[int, int, int, int]:
+        x, y, width, height = self.sizes[hwnd - 1]
+        return (x, y, x + width, y + height)
+    
+    def bring_to_front(self, hwnd: int) -> None:
+        pass
+    
+    def set_window_pos(self, hwnd: int, window_size: Tuple[int, int, int, int]) -> None:
+        self.sizes[hwnd - 1] = tuple(window_size)
+    
+    def list_windows(self) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+        return [(title, self.get_window_rect(hwnd)) for hwnd, title in enumerate(self.titles, 1)]
+
+
+class WindowManager:
+    """窗口管理类，处理窗口相关的操作
+    
+    具体操作由 backend 完成，默认在第一次使用时创建 Win32WindowBackend，
+    回放和测试时可以通过 use 替换为 FakeWindowBackend。
+    """
+    
+    backend: Optional[WindowBackend] = None
+    
+    @staticmethod
+    def use(backend: WindowBackend) -> None:
+        """替换窗口操作后端"""
+        WindowManager.backend = backend
+    
+    @staticmethod
+    def _backend() -> WindowBackend:
+        if WindowManager.backend is None:
+            WindowManager.backend = Win32WindowBackend()
+        return WindowManager.backend
+    
+    @staticmethod
+    def find_window(title: str) -> int:
+        """查找指定标题的窗口句柄"""
+        return WindowManager._backend().find_window(title)
+    
+    @staticmethod
+    def get_window_rect(hwnd: int) -> Tuple[int, int, int, int]:
+        """获取窗口位置和大小"""
+        return WindowManager._backend().get_window_rect(hwnd)
+    
+    @staticmethod
+    def bring_to_front(hwnd: int) -> None:
+        """将窗口置于最前端并激活"""
+        WindowManager._backend().bring_to_front(hwnd)
+    
+    @staticmethod
+    def discover_windows(title_prefix: str) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+        """查找所有标题以 title_prefix 开头的可见窗口
+        
+        Returns:
+            (窗口标题, 窗口位置和大小 (x, y, width, height)) 的列表，按标题排序
+        """
+        windows = []
+        for title, (left, top, right, bottom) in WindowManager._backend().list_windows():
+            if title.startswith(title_prefix):
+                windows.append((title, (left, top, right - left, bottom - top)))
+        return sorted(windows)
+    
+    @staticmethod
+    def handle_window(config: GameConfig) -> None:
+        """处理窗口配置和位置"""
+        hwnd = WindowManager.find_window(config.window_title)
+        if not hwnd:
+            raise ValueError(f"未找到标题为 {config.window_title} 的窗口")
+        
+        WindowManager.bring_to_front(hwnd)
+        WindowManager._backend().set_window_pos(hwnd, config.window_size)
+        time.sleep(0.5)
+
+
+class FrameSource:
+    """截图来源基类
+    
+    grab 返回的是预分配并复用的BGR图像，下一次在同一线程调用 grab 时内容会被覆盖，
+    需要保留时请自行复制，或通过 out 参数传入自己的缓冲区。
+    """
+    
+    def __init__(self):
+        # 每个线程使用独立的缓冲区，避免状态检查线程与动作线程互相覆盖
+        self._local = local()
+    
+    def _get_buffer(self, height: int, width: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """获取输出缓冲区，尺寸变化时重新分配"""
+        if out is not None and out.shape == (height, width, 3):
+            return out
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape != (height, width, 3):
+            buffer = np.empty((height, width, 3), dtype=np.uint8)
+            self._local.buffer = buffer
+        return buffer
+    
+    def grab(self, region: Tuple[int, int, int, int], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """截取屏幕区域
+        
+        Args:
+            region: 截图区域 (x, y, width, height)，屏幕坐标
+            out: 可选的输出缓冲区，尺寸不符时忽略
+            
+        Returns:
+            BGR格式的截图
+        """
+        raise NotImplementedError
+    
+    def close(self) -> None:
+        """释放截图资源"""
+    
+    @staticmethod
+    def create(spec: str, window_size: Tuple[int, int, int, int]) -> 'FrameSource':
+        """根据配置创建截图来源
+        
+        Args:
+            spec: 截图来源配置，pyautogui、mss 或 replay:<图片目录、视频文件或录制的会话目录>
+            window_size: 窗口位置和大小，回放来源用它将屏幕坐标换算为录制画面中的坐标
+        """
+        name, _, arg = spec.partition(':')
+        match name:
+            case 'pyautogui':
+                return PyAutoGUIFrameSource()
+            case 'mss':
+                return MSSFrameSource()
+            case 'replay':
+                return ReplayFrameSource(Path(arg), window_size)
+        raise ValueError(f"未知的截图来源: {spec}")
+
+
+class PyAutoGUIFrameSource(FrameSource):
+    """通过 pyautogui 截图，直接转换到复用的缓冲区中"""
+    
+    def __init__(self):
+        super().__init__()
+        import pyautogui
+        self._pyautogui = pyautogui
+    
+    def grab(self, region: Tuple[int, int, int, int], out: Optional[np.ndarray] = None) -> np.ndarray:
+        rgb = np.asarray(self._pyautogui.screenshot(region=region))
+        buffer = self._get_buffer(rgb.shape[0], rgb.shape[1], out)
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=buffer)
+        return buffer
+
+
+class MSSFrameSource(FrameSource):
+    """通过 mss 截图，Windows 下使用 GDI，Linux 下使用 X11 共享内存
+    
+    直接在 mss 返回的BGRA内存上建立视图，只做一次到BGR缓冲区的转换。
+    """
+    
+    def __init__(self):
+        super().__init__()
+        import mss
+        self._mss = mss
+    
+    def grab(self, region: Tuple[int, int, int, int], out: Optional[np.ndarray] = None) -> np.ndarray:
+        # mss 实例不能跨线程使用，每个线程单独创建
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            sct = self._mss.mss()
+            self._local.sct = sct
+        
+        x, y, width, height = region
+        shot = sct.grab({'left': x, 'top': y, 'width': width, 'height': height})
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        buffer = self._get_buffer(shot.height, shot.width, out)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=buffer)
+        return buffer
+    
+    def close(self) -> None:
+        sct = getattr(self._local, 'sct', None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class ReplayFrameSource(FrameSource):
+    """从图片目录、视频文件或录制的会话目录回放窗口画面
+    
+    每次截取整个窗口时前进一帧，截取窗口内的子区域时复用当前帧。
+    图片目录和视频播放结束后循环；会话目录按录制时的时间回放(speed 为回放倍速，为0时逐帧回放)，
+    播放结束后停在最后一帧并设置 finished。
+    """
+    
+    IMAGE_SUFFIXES = ('.png', '.jpg', '.bmp')
+    
+    def __init__(self, path: Path, window_size: Tuple[int, int, int, int], speed: float = 1.0):
+        super().__init__()
+        self.window_size = window_size
+        self.speed = speed
+        self.finished = False
+        self._frame: Optional[np.ndarray] = None
+        self._frame_file: Optional[Path] = None
+        self._capture = None
+        self._files: List[Path] = []
+        self._times: Optional[List[float]] = None  # 会话中各帧的录制时间
+        self._start: Optional[float] = None
+        self._index = 0
+        if (path / SessionRecorder.INDEX_FILE).exists():
+            session = RecordedSession.load(path)
+            if not session.frames:
+                raise FileNotFoundError(f"会话中没有截图: {path}")
+            self._files = [path / record['file'] for record in session.frames]
+            self._times = [record['t'] for record in session.frames]
+        elif path.is_dir():
+            self._files = sorted(f for f in path.iterdir() if f.suffix.lower() in self.IMAGE_SUFFIXES)
+            if not self._files:
+                raise FileNotFoundError(f"回放目录中没有图片: {path}")
+        else:
+            self._capture = cv2.VideoCapture(str(path))
+            if not self._capture.isOpened():
+                raise FileNotFoundError(f"无法打开回放视频: {path}")
+    
+    def _next_session_index(self) -> int:
+        """会话回放时选择下一帧，按倍速换算出录制时间，取该时间之前的最后一帧"""
+        if self._start is None:
+            self._start = time.perf_counter()
+            return 0
+        if self.speed <= 0:
+            index = self._index + 1
+        else:
+            recorded_time = self._times[0] + (time.perf_counter() - self._start) * self.speed
+            index = max(self._index, int(np.searchsorted(self._times, recorded_time, side='right')) - 1)
+        if index >= len(self._files) - 1:
+            self.finished = True
+        return min(index, len(self._files) - 1)
+    
+    def _next_frame(self) -> np.ndarray:
+        """读取下一帧"""
+        if self._capture is not None:
+            ok, frame = self._capture.read(self._frame)
+            if not ok:
+                self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self._capture.read(self._frame)
+                if not ok:
+                    raise EOFError("回放视频没有可读取的帧")
+            return frame
+        
+        if self._times is not None:
+            self._index = self._next_session_index()
+            path = self._files[self._index]
+        else:
+            path = self._files[self._index]
+            self._index = (self._index + 1) % len(self._files)
+        # 会话中连续相同的截图引用同一个文件，不重复解码
+        if path != self._frame_file:
+            self._frame = cv2.imread(str(path))
+            self._frame_file = path
+        return self._frame
+    
+    def grab(self, region: Tuple[int, int, int, int], out: Optional[np.ndarray] = None) -> np.ndarray:
+        if self._frame is None or region == self.window_size:
+            self._frame = self._next_frame()
+        
+        # 将屏幕坐标换算为录制画面中的坐标
+        x = region[0] - self.window_size[0]
+        y = region[1] - self.window_size[1]
+        view = self._frame[y:y + region[3], x:x + region[2]]
+        buffer = self._get_buffer(view.shape[0], view.shape[1], out)
+        np.copyto(buffer, view)
+        return buffer
+    
+    def close(self) -> None:
+        if self._capture is not None:
+            self._capture.release()
+
+
+@dataclass(frozen=True)
+class Frame:
+    """帧总线上发布的一帧截图"""
+    seq: int  # 帧序号，从1开始递增
+    timestamp: float  # 截图完成的时间
+    image: np.ndarray  # BGR格式的截图
+    origin: Tuple[int, int]  # 截图左上角的屏幕坐标 (x, y)
+    
+    def crop(self, region: Tuple[int, int, int, int]) -> np.ndarray:
+        """按屏幕坐标截取帧中的子区域，返回视图"""
+        x = region[0] - self.origin[0]
+        y = region[1] - self.origin[1]
+        return self.image[max(0, y):y + region[3], max(0, x):x + region[2]]
+    
+    @Metrics.timed('pixel')
+    def pixel(self, screen_pos: Tuple[int, int]) -> Tuple[int, int, int]:
+        """读取屏幕坐标处的像素，返回与 pyautogui.pixel 一致的RGB颜色"""
+        blue, green, red = self.image[screen_pos[1] - self.origin[1], screen_pos[0] - self.origin[0]]
+        return (int(red), int(green), int(blue))
+
+
+class FrameBus:
+    """单生产者帧总线
+    
+    采集线程把截图写入环形缓冲区的下一个槽位，再整体替换 latest 引用完成发布，
+    状态机、像素探测和方向序列识别都读取 latest，读取路径不加锁。
+    仍被读取方持有的帧(包括 latest)所在槽位不会被覆盖，所有槽位都被持有时增加一个槽位，
+    因此使用图像期间应持有 Frame 对象本身。
+    listeners 中的回调在每帧发布后由采集线程调用，用于录制等旁路处理，不能阻塞。
+    """
+    
+    def __init__(self, frame_source: FrameSource, 
+                 region: Tuple[int, int, int, int],
+                 allocator: Optional[Callable[[Tuple[int, ...]], np.ndarray]] = None,
+                 release: Optional[Callable[[np.ndarray], None]] = None):
+        self.frame_source = frame_source
+        self.region = region
+        self.latest: Optional[Frame] = None
+        # 槽位缓冲区的分配和释放函数，使用进程池识别时分配在共享内存中
+        self._allocator = allocator or (lambda shape: np.empty(shape, dtype=np.uint8))
+        self._release = release or (lambda array: None)
+        self._slots: List[Optional[np.ndarray]] = [None] * Config.FRAME_BUS_SLOTS
+        self._published: List[Optional[weakref.ref]] = [None] * Config.FRAME_BUS_SLOTS
+        self._next_index = 0
+        self._seq = 0
+        self.listeners: List[Callable[[Frame], None]] = []
+        # 唤醒等待中的采集线程，提前截取下一帧
+        self._wake = Event()
+        # 只用于阻塞等待新帧，发布和读取不依赖它
+        self._new_frame = Condition()
+    
+    def _next_slot(self) -> int:
+        """找到下一个可以写入的槽位，所有槽位都被读取方持有时增加一个槽位"""
+        for offset in range(len(self._slots)):
+            index = (self._next_index + offset) % len(self._slots)
+            published = self._published[index]
+            if published is None or published() is None:
+                self._next_index = index + 1
+                return index
+        self._slots.append(None)
+        self._published.append(None)
+        logging.info(f"帧总线槽位全部被占用，增加到 {len(self._slots)} 个")
+        return len(self._slots) - 1
+    
+    @Metrics.timed('capture')
+    def capture(self) -> Frame:
+        """截取一帧并发布"""
+        index = self._next_slot()
+        slot = self._slots[index]
+        if slot is None:
+            slot = self._allocator((self.region[3], self.region[2], 3))
+            self._slots[index] = slot
+        image = self.frame_source.grab(self.region, out=slot)
+        if image is not slot:
+            # 实际截图尺寸与预期不符(如窗口超出屏幕)，按实际尺寸重新分配槽位并释放原来的缓冲区
+            self._release(slot)
+            slot = self._allocator(image.shape)
+            np.copyto(slot, image)
+            image = slot
+            self._slots[index] = image
+        
+        self._seq += 1
+        frame = Frame(self._seq, time.time(), image, (self.region[0], self.region[1]))
+        self._published[index] = weakref.ref(frame)
+        self.latest = frame
+        with self._new_frame:
+            self._new_frame.notify_all()
+        for listener in self.listeners:
+            listener(frame)
+        return frame
+    
+    def wait_for(self, after_seq: int, timeout: Optional[float] = None) -> Optional[Frame]:
+        """等待序号大于 after_seq 的帧，超时返回None"""
+        frame = self.latest
+        if frame is not None and frame.seq > after_seq:
+            return frame
+        with self._new_frame:
+            self._new_frame.wait_for(
+                lambda: self.latest is not None and self.latest.seq > after_seq, timeout)
+        frame = self.latest
+        return frame if frame is not None and frame.seq > after_seq else None
+    
+    def wake(self) -> None:
+        """让采集线程结束等待，立即截取下一帧"""
+        self._wake.set()
+    
+    def close(self) -> None:
+        """停止截图后释放所有槽位的缓冲区，之后不能再读取已发布的帧"""
+        slots = [slot for slot in self._slots if slot is not None]
+        self.latest = None
+        self._slots = [None] * len(self._slots)
+        self._published = [None] * len(self._published)
+        for slot in slots:
+            self._release(slot)
+    
+    def run(self, should_stop: Callable[[], bool], 
+            interval: float | Callable[[], float] = Config.CAPTURE_INTERVAL) -> None:
+        """采集线程主循环，两次截图之间间隔 interval 秒
+        
+        interval 也可以是每次截图后调用、返回下一次间隔的函数，等待期间调用 wake 会提前截图。
+        """
+        while not should_stop():
+            self._wake.clear()
+            start = time.perf_counter()
+            self.capture()
+            next_interval = interval() if callable(interval) else interval
+            remaining = next_interval - (time.perf_counter() - start)
+            if remaining > 0:
+                self._wake.wait(remaining)
+
+
+class SessionRecorder:
+    """把截图、鼠标操作和状态变化录制到会话目录
+    
+    session.jsonl 按时间顺序每行记录一条 JSON，第一行是会话信息和游戏配置；
+    截图以PNG保存在 frames 目录中，与上一帧完全相同的截图只记录对上一个文件的引用。
+    PNG编码在后台线程中进行，不阻塞采集线程，写入跟不上时丢弃新的截图。
+    """
+    
+    INDEX_FILE = 'session.jsonl'
+    FRAME_DIR = 'frames'
+    QUEUE_SIZE = 64  # 等待编码的截图数量上限
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        (self.path / self.FRAME_DIR).mkdir(parents=True, exist_ok=True)
+        self._index_file = open(self.path / self.INDEX_FILE, 'w', encoding='utf-8')
+        # 采集线程、状态线程和动作线程都会写入记录
+        self._lock = Lock()
+        self._last_image: Optional[np.ndarray] = None
+        self._last_file: Optional[str] = None
+        self._pending: queue.Queue[Optional[Tuple[str, np.ndarray]]] = queue.Queue(self.QUEUE_SIZE)
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self._writer = Thread(target=self._write_frames, daemon=True)
+        self._writer.start()
+    
+    def _write(self, record: Dict[str, Any]) -> None:
+        """写入一条记录"""
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._index_file.write(line + '\n')
+    
+    def _write_frames(self) -> None:
+        """后台编码并保存截图"""
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            file, image = item
+            cv2.imwrite(str(self.path / file), image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    
+    def record_header(self, config: GameConfig) -> None:
+        """记录会话信息和游戏配置"""
+        data = {k: v for k, v in config.__dict__.items() if k not in ('config_path', 'frame_source')}
+        self._write({'type': 'session', 't': time.time(), 'config': data})
+    
+    def record_frame(self, frame: Frame) -> None:
+        """记录一帧截图，作为帧总线的监听回调在采集线程中调用"""
+        image = frame.image
+        if (self._last_image is None or self._last_image.shape != image.shape 
+                or not np.array_equal(self._last_image, image)):
+            file = f"{self.FRAME_DIR}/{frame.seq:06d}.png"
+            copy = image.copy()
+            try:
+                self._pending.put_nowait((file, copy))
+            except queue.Full:
+                self.dropped_frames += 1
+                return
+            self._last_image = copy
+            self._last_file = file
+        self.frame_count += 1
+        self._write({'type': 'frame', 't': frame.timestamp, 'seq': frame.seq, 'file': self._last_file})
+    
+    def record_action(self, action: str, *args) -> None:
+        """记录一次鼠标操作"""
+        self._write({'type': 'action', 't': time.time(), 'action': action, 'args': list(args)})
+    
+    def record_state(self, old_state: FishState, new_state: FishState, frame_seq: int) -> None:
+        """记录一次状态变化"""
+        self._write({'type': 'state', 't': time.time(), 'from': old_state.name, 
+                     'to': new_state.name, 'seq': frame_seq})
+    
+    def close(self) -> None:
+        """等待截图写完并关闭会话"""
+        self._pending.put(None)
+        self._writer.join()
+        with self._lock:
+            self._index_file.close()
+        logging.info(f"会话已保存到 {self.path}，共 {self.frame_count} 帧，丢弃 {self.dropped_frames} 帧")
+
+
+@dataclass
+class RecordedSession:
+    """读取录制的会话"""
+    path: Path
+    header: Dict[str, Any]
+    frames: List[Dict[str, Any]]
+    actions: List[Dict[str, Any]]
+    states: List[Dict[str, Any]]
+    
+    @staticmethod
+    def load(path: Path) -> 'RecordedSession':
+        """读取会话目录"""
+        session = RecordedSession(Path(path), {}, [], [], [])
+        with open(session.path / SessionRecorder.INDEX_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                match record['type']:
+                    case 'session':
+                        session.header = record
+                    case 'frame':
+                        session.frames.append(record)
+                    case 'action':
+                        session.actions.append(record)
+                    case 'state':
+                        session.states.append(record)
+        return session
+    
+    def game_config(self) -> GameConfig:
+        """还原录制时的游戏配置，JSON中的列表还原为元组"""
+        def to_tuple(value: Any) -> Any:
+            if isinstance(value, list):
+                return tuple(value)
+            if isinstance(value, dict):
+                return {k: to_tuple(v) for k, v in value.items()}
+            return value
+        
+        data = {k: to_tuple(v) for k, v in self.header.get('config', {}).items()}
+        data['frame_source'] = f"replay:{self.path}"
+        return GameConfig(**data)
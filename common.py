@@ -0,0 +1,83 @@
+"""各模块共用的状态枚举、游戏配置和状态快照"""
+import importlib
+from enum import Enum, auto
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any
+from dataclasses import dataclass, field
+from setting import Config
+
+
+class LazyModule:
+    """首次访问属性时才导入的模块，导入后用真正的模块替换所在模块中的同名全局变量
+    
+    例如 cv2 = LazyModule('cv2', globals())，OpenCV 导入较慢，推迟到第一次识别时。
+    """
+    
+    def __init__(self, name: str, namespace: Dict[str, Any]):
+        self._name = name
+        self._namespace = namespace
+    
+    def __getattr__(self, attr: str) -> Any:
+        module = importlib.import_module(self._name)
+        self._namespace[self._name] = module
+        return getattr(module, attr)
+
+
+class FishState(Enum):
+    """钓鱼游戏的状态枚举"""
+    START_FISHING = auto()  # 开始钓鱼
+    CAST_ROD = auto()       # 抛竿
+    NO_BAIT = auto()        # 鱼饵不足
+    CATCH_FISH = auto()     # 捕鱼
+    FISHING = auto()        # 钓鱼中
+    INSTANT_KILL = auto()   # 秒杀
+    END_FISHING = auto()    # 结束钓鱼
+    EXIT = auto()           # 退出
+
+
+# 各状态对应的界面识别模板
+STATE_TEMPLATES: Dict[FishState, Path] = {
+    FishState.START_FISHING: Config.START_FISH_BUTTON,
+    FishState.CAST_ROD: Config.BAIT_IMAGE,
+    FishState.NO_BAIT: Config.USE_BUTTON,
+    FishState.CATCH_FISH: Config.TIME_IMAGE,
+    FishState.FISHING: Config.PRESSURE_IMAGE,
+    FishState.INSTANT_KILL: Config.UP_IMAGE,
+    FishState.END_FISHING: Config.RETRY_BUTTON,
+}
+
+
+@dataclass
+class GameConfig:
+    """游戏配置数据类"""
+    window_title: str  # 模拟器窗口标题
+    window_size: Tuple[int, int, int, int]  # 模拟器窗口大小和位置 (x, y, width, height)
+    start_fishing_pos: Optional[Tuple[int, int]] = None  # 开始钓鱼按钮的中心点坐标
+    rod_position: Optional[Tuple[int, int]] = None  # 钓鱼界面拉杆位置中心点坐标
+    pressure_indicator_pos: Optional[Tuple[int, int]] = None  # 用来判断压力是否过高的点的位置
+    low_pressure_color: Optional[Tuple[int, int, int]] = None  # 用来判断压力是否过高的点的颜色
+    original_rod_color: Optional[Tuple[int, int, int]] = None  # 钓鱼界面拉杆位置中心点颜色
+    direction_icon_positions: Optional[Dict[str, Tuple[int, int]]] = None  # 方向图标位置字典
+    retry_button_center: Optional[Tuple[int, int]] = None  # 再来一次按钮的中心点坐标
+    use_bait_button_pos: Optional[Tuple[int, int]] = None  # 使用鱼饵按钮的位置
+    frame_source: str = 'pyautogui'  # 截图来源: pyautogui、mss 或 replay:<图片目录、视频文件或录制的会话目录>
+    config_path: Optional[str] = field(default=None, repr=False)  # 实例的配置文件路径，为None时使用 Config.CONFIG_FILE，不写入配置文件
+    ui_rois: Optional[Dict[str, Tuple[int, int, int, int]]] = None  # 界面识别学习到的搜索区域 (x, y, width, height)，相对于窗口
+    template_scale: Optional[float] = None  # 窗口内容相对模板图像的缩放比例，为None时启动后搜索
+    template_thresholds: Optional[Dict[str, float]] = None  # 由录制会话学习的各界面模板匹配阈值，覆盖 Config.MATCH_THRESHOLD
+    capture_rates: Optional[Dict[str, float]] = None  # 各状态的截图帧率，覆盖 Config.CAPTURE_RATES 中的默认值
+    capture_latency_budgets: Optional[Dict[str, float]] = None  # 各状态的识别延迟预算(秒)，覆盖 Config.CAPTURE_LATENCY_BUDGETS
+    instant_kill_budget: Optional[float] = None  # 秒杀方向序列求解的延迟预算(秒)，覆盖 Config.INSTANT_KILL_BUDGET
+    fishing_click_interval: Optional[float] = None  # 钓鱼时点击的间隔(秒)，覆盖 Config.FISHING_CLICK_INTERVAL，自动调整的结果保存在标定中
+    rod_retrieve_interval: Optional[float] = None  # 钓鱼时收杆的间隔(秒)，覆盖 Config.ROD_RETRIEVE_INTERVAL
+    pressure_backoff: Optional[float] = None  # 压力条变色后暂停点击的时间(点击间隔的倍数)，覆盖 Config.PRESSURE_BACKOFF
+    auto_tune: bool = False  # 是否在运行中自动调整上面三个钓鱼节奏参数
+
+
+@dataclass(frozen=True)
+class StateSnapshot:
+    """识别线程发布的页面状态，不可修改，每次状态变化都发布新的对象"""
+    state: FishState
+    entered_at: float  # 进入该状态的时间
+    frame_seq: int  # 识别出该状态的帧序号，初始状态和退出时为发布时的最新帧
+    version: int  # 发布序号，从1开始递增，同一状态的再次进入也是新的版本
@@ -0,0 +1,434 @@
+"""鼠标输入
+
+输入后端、按优先级串行执行鼠标操作的 InputDispatcher 和供各模块调用的 MouseController。
+"""
+import heapq
+import ctypes
+import time
+from threading import Thread, Condition, Event, Lock
+from enum import IntEnum
+from typing import Optional, Tuple, Dict, List, Hashable
+from dataclasses import dataclass, field
+from setting import Config
+from common import FishState
+from metrics import Metrics
+from capture import SessionRecorder
+import logging
+
+
+class InputBackend:
+    """鼠标输入后端基类"""
+    
+    pause: float = Config.INPUT_PAUSE  # 每次操作后的等待时间(秒)
+    
+    @staticmethod
+    def create(spec: str) -> 'InputBackend':
+        """根据配置创建输入后端
+        
+        Args:
+            spec: pyautogui、sendinput(Windows SendInput) 或 xdotool(Linux X11)
+        """
+        match spec:
+            case 'pyautogui':
+                return PyAutoGUIInputBackend()
+            case 'sendinput':
+                return SendInputBackend()
+            case 'xdotool':
+                return XdotoolInputBackend()
+        raise ValueError(f"未知的输入后端: {spec}")
+    
+    def mouse_down(self, x: int, y: int, button: str = 'left') -> None:
+        """在指定位置按下鼠标"""
+        raise NotImplementedError
+    
+    def move_to(self, x: int, y: int, duration: float = 0.0) -> None:
+        """移动鼠标到指定位置"""
+        raise NotImplementedError
+    
+    def mouse_up(self, button: str = 'left') -> None:
+        """松开鼠标"""
+        raise NotImplementedError
+    
+    def click(self, position: Tuple[int, int]) -> None:
+        """点击指定位置"""
+        raise NotImplementedError
+    
+    def set_pause(self, seconds: float) -> None:
+        """设置每次操作后的等待时间"""
+        self.pause = seconds
+
+
+class PyAutoGUIInputBackend(InputBackend):
+    """通过 pyautogui 模拟鼠标"""
+    
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+        # 每次操作后的等待时间
+        pyautogui.PAUSE = self.pause
+    
+    def mouse_down(self, x: int, y: int, button: str = 'left') -> None:
+        self._pyautogui.mouseDown(x, y, button=button)
+    
+    def move_to(self, x: int, y: int, duration: float = 0.0) -> None:
+        self._pyautogui.moveTo(x, y, duration=duration)
+    
+    def mouse_up(self, button: str = 'left') -> None:
+        self._pyautogui.mouseUp(button=button)
+    
+    def click(self, position: Tuple[int, int]) -> None:
+        self._pyautogui.click(position)
+    
+    def set_pause(self, seconds: float) -> None:
+        self.pause = seconds
+        self._pyautogui.PAUSE = seconds
+
+
+class _MouseInput(ctypes.Structure):
+    """SendInput 的 MOUSEINPUT 结构"""
+    _fields_ = [
+        ('dx', ctypes.c_long),
+        ('dy', ctypes.c_long),
+        ('mouseData', ctypes.c_ulong),
+        ('dwFlags', ctypes.c_ulong),
+        ('time', ctypes.c_ulong),
+        ('dwExtraInfo', ctypes.c_size_t),
+    ]
+
+
+class _Input(ctypes.Structure):
+    """SendInput 的 INPUT 结构，MOUSEINPUT 是联合体中最大的成员"""
+    _fields_ = [('type', ctypes.c_ulong), ('mi', _MouseInput)]
+
+
+class SendInputBackend(InputBackend):
+    """通过 Windows SendInput 直接注入鼠标事件，不经过 pyautogui 的封装和失效保护"""
+    
+    INPUT_MOUSE = 0
+    BUTTON_FLAGS = {'left': (0x0002, 0x0004), 'right': (0x0008, 0x0010)}  # (按下, 松开)
+    MOVE_STEP = 0.01  # 拖动时移动光标的间隔(秒)
+    
+    def __init__(self, pause: float = Config.INPUT_PAUSE):
+        from ctypes import wintypes
+        self._user32 = ctypes.windll.user32
+        self._wintypes = wintypes
+        self.pause = pause
+    
+    def _send(self, flags: int) -> None:
+        event = _Input(self.INPUT_MOUSE, _MouseInput(0, 0, 0, flags, 0, 0))
+        self._user32.SendInput(1, ctypes.byref(event), ctypes.sizeof(_Input))
+    
+    def mouse_down(self, x: int, y: int, button: str = 'left') -> None:
+        self._user32.SetCursorPos(x, y)
+        self._send(self.BUTTON_FLAGS[button][0])
+        time.sleep(self.pause)
+    
+    def move_to(self, x: int, y: int, duration: float = 0.0) -> None:
+        point = self._wintypes.POINT()
+        self._user32.GetCursorPos(ctypes.byref(point))
+        steps = max(1, int(duration / self.MOVE_STEP))
+        for step in range(1, steps + 1):
+            self._user32.SetCursorPos(point.x + (x - point.x) * step // steps, 
+                                      point.y + (y - point.y) * step // steps)
+            if step < steps:
+                time.sleep(self.MOVE_STEP)
+        time.sleep(self.pause)
+    
+    def mouse_up(self, button: str = 'left') -> None:
+        self._send(self.BUTTON_FLAGS[button][1])
+        time.sleep(self.pause)
+    
+    def click(self, position: Tuple[int, int]) -> None:
+        self._user32.SetCursorPos(*position)
+        down, up = self.BUTTON_FLAGS['left']
+        self._send(down)
+        self._send(up)
+        time.sleep(self.pause)
+
+
+class XdotoolInputBackend(InputBackend):
+    """通过 xdotool 命令在 X11 下模拟鼠标"""
+    
+    BUTTONS = {'left': '1', 'right': '3'}
+    MOVE_STEP = 0.01  # 拖动时移动光标的间隔(秒)
+    
+    def __init__(self, pause: float = Config.INPUT_PAUSE):
+        self.pause = pause
+        self._position = (0, 0)
+    
+    def _run(self, *args) -> None:
+        import subprocess
+        subprocess.run(['xdotool', *map(str, args)], check=True)
+    
+    def mouse_down(self, x: int, y: int, button: str = 'left') -> None:
+        self._run('mousemove', x, y, 'mousedown', self.BUTTONS[button])
+        self._position = (x, y)
+        time.sleep(self.pause)
+    
+    def move_to(self, x: int, y: int, duration: float = 0.0) -> None:
+        start_x, start_y = self._position
+        steps = max(1, int(duration / self.MOVE_STEP))
+        for step in range(1, steps + 1):
+            self._run('mousemove', start_x + (x - start_x) * step // steps, 
+                      start_y + (y - start_y) * step // steps)
+            if step < steps:
+                time.sleep(self.MOVE_STEP)
+        self._position = (x, y)
+        time.sleep(self.pause)
+    
+    def mouse_up(self, button: str = 'left') -> None:
+        self._run('mouseup', self.BUTTONS[button])
+        time.sleep(self.pause)
+    
+    def click(self, position: Tuple[int, int]) -> None:
+        self._run('mousemove', *position, 'click', self.BUTTONS['left'])
+        self._position = tuple(position)
+        time.sleep(self.pause)
+
+
+class RecordingInputBackend(InputBackend):
+    """记录所有鼠标操作，有实际后端时再转发给它
+    
+    没有实际后端时只记录不操作，用于无界面环境下的回放。
+    """
+    
+    def __init__(self, inner: Optional[InputBackend] = None, recorder: Optional[SessionRecorder] = None):
+        self.inner = inner
+        self.recorder = recorder
+        self.actions: List[Tuple[float, str, tuple]] = []  # (时间, 操作, 参数)
+    
+    def _record(self, action: str, *args) -> None:
+        self.actions.append((time.time(), action, args))
+        if self.recorder is not None:
+            self.recorder.record_action(action, *args)
+    
+    def mouse_down(self, x: int, y: int, button: str = 'left') -> None:
+        self._record('mouse_down', x, y, button)
+        if self.inner is not None:
+            self.inner.mouse_down(x, y, button)
+    
+    def move_to(self, x: int, y: int, duration: float = 0.0) -> None:
+        self._record('move_to', x, y, duration)
+        if self.inner is not None:
+            self.inner.move_to(x, y, duration)
+    
+    def mouse_up(self, button: str = 'left') -> None:
+        self._record('mouse_up', button)
+        if self.inner is not None:
+            self.inner.mouse_up(button)
+    
+    def click(self, position: Tuple[int, int]) -> None:
+        self._record('click', *position)
+        if self.inner is not None:
+            self.inner.click(position)
+    
+    def set_pause(self, seconds: float) -> None:
+        self.pause = seconds
+        if self.inner is not None:
+            self.inner.set_pause(seconds)
+
+
+class InputPriority(IntEnum):
+    """输入命令的优先级，数值小的先执行，相同优先级按提交顺序执行"""
+    ROD = 0       # 拉杆修正和收杆
+    SEQUENCE = 1  # 秒杀方向序列和各界面的按钮
+    ROUTINE = 2   # 捕鱼和钓鱼时的常规点击
+
+
+@dataclass
+class InputCommand:
+    """一条输入命令，由若干个按顺序执行、不会被其他命令打断的后端操作组成"""
+    name: str  # 命令名称，用于耗时统计
+    steps: Tuple[Tuple[str, tuple], ...]  # (InputBackend 方法名, 参数)
+    priority: InputPriority
+    created: float  # 提交时间(time.monotonic)，合并时更新为最新一次提交的时间
+    max_age: Optional[float] = None  # 等待超过该时间后丢弃，为None时不过期
+    coalesce_key: Optional[Hashable] = None  # 相同键的命令在等待或执行时，新提交的命令被合并
+    state: Optional[FishState] = None  # 提交时所处的状态，用于耗时统计
+    done: Optional[Event] = None  # 命令执行完或被丢弃后设置
+    merged: List[Event] = field(default_factory=list)  # 合并到该命令的其他命令的 done，与 done 一起设置
+
+
+class InputDispatcher:
+    """异步输入分发器
+    
+    动作线程提交命令后立即返回，输入线程按优先级依次在后端上执行，
+    鼠标是全局资源，所有实例共享一个分发器，命令之间不会互相打断。
+    带合并键的命令在已有相同键的命令等待或执行时被合并；
+    设置了 max_age 的命令等待过久时被丢弃，避免按过时的画面操作。
+    """
+    
+    def __init__(self, backend: InputBackend):
+        self.backend = backend
+        self._queue: List[Tuple[int, int, InputCommand]] = []  # (优先级, 提交序号, 命令)
+        self._pending: Dict[Hashable, InputCommand] = {}  # 合并键 -> 等待或执行中的命令
+        self._condition = Condition()
+        self._seq = 0
+        self._busy = False
+        self.executed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._thread = Thread(target=self._run, name='input', daemon=True)
+        self._thread.start()
+    
+    def submit(self, command: InputCommand) -> bool:
+        """提交命令，被合并时返回False，命令的 done 在合并到的命令执行完或被丢弃后设置"""
+        with self._condition:
+            if command.coalesce_key is not None:
+                pending = self._pending.get(command.coalesce_key)
+                if pending is not None:
+                    pending.created = max(pending.created, command.created)
+                    if command.done is not None:
+                        pending.merged.append(command.done)
+                    self.coalesced += 1
+                    return False
+                self._pending[command.coalesce_key] = command
+            self._seq += 1
+            heapq.heappush(self._queue, (command.priority, self._seq, command))
+            self._condition.notify_all()
+        return True
+    
+    def _next_command(self) -> InputCommand:
+        """取出下一条未过期的命令"""
+        with self._condition:
+            while True:
+                self._condition.wait_for(lambda: self._queue)
+                _, _, command = heapq.heappop(self._queue)
+                if command.max_age is not None and time.monotonic() - command.created > command.max_age:
+                    self.dropped += 1
+                    self._release(command)
+                    continue
+                self._busy = True
+                return command
+    
+    def _release(self, command: InputCommand) -> None:
+        """命令执行完或被丢弃后，允许提交相同合并键的命令，需持有锁"""
+        if command.coalesce_key is not None and self._pending.get(command.coalesce_key) is command:
+            del self._pending[command.coalesce_key]
+        if command.done is not None:
+            command.done.set()
+        for done in command.merged:
+            done.set()
+        self._condition.notify_all()
+    
+    def _run(self) -> None:
+        """输入线程主循环"""
+        while True:
+            command = self._next_command()
+            Metrics.set_state(command.state)
+            if Metrics.enabled:
+                Metrics.record('input_wait', time.monotonic() - command.created)
+            start = time.perf_counter()
+            try:
+                for method, args in command.steps:
+                    getattr(self.backend, method)(*args)
+            except Exception as e:
+                logging.error(f"输入命令 {command.name} 执行出错: {e}")
+            if Metrics.enabled:
+                Metrics.record(command.name, time.perf_counter() - start)
+            with self._condition:
+                self.executed += 1
+                self._busy = False
+                self._release(command)
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的命令全部执行完，超时返回False"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+
+class MouseController:
+    """鼠标控制类，处理所有鼠标操作
+    
+    操作提交到全局的 InputDispatcher 后立即返回，由输入线程按优先级执行，
+    多实例时所有操作都在同一个输入线程中串行执行，拖拽等组合操作不会被其他实例打断。
+    具体操作由 backend 完成，默认在第一次使用时创建 PyAutoGUIInputBackend，可以通过 use 替换。
+    """
+    
+    backend: Optional[InputBackend] = None
+    dispatcher: Optional[InputDispatcher] = None
+    pause: float = Config.INPUT_PAUSE  # 每次操作后的等待时间(秒)，见 limit_pause
+    _lock = Lock()
+    
+    @staticmethod
+    def use(backend: InputBackend) -> None:
+        """替换鼠标输入后端"""
+        with MouseController._lock:
+            backend.set_pause(MouseController.pause)
+            MouseController.backend = backend
+            if MouseController.dispatcher is not None:
+                MouseController.dispatcher.backend = backend
+    
+    @staticmethod
+    def _dispatcher() -> InputDispatcher:
+        if MouseController.dispatcher is None:
+            with MouseController._lock:
+                if MouseController.backend is None:
+                    MouseController.backend = PyAutoGUIInputBackend()
+                    MouseController.backend.set_pause(MouseController.pause)
+                if MouseController.dispatcher is None:
+                    MouseController.dispatcher = InputDispatcher(MouseController.backend)
+        return MouseController.dispatcher
+    
+    @staticmethod
+    def limit_pause(click_interval: float) -> None:
+        """每次操作后的等待时间不超过点击间隔的一半
+        
+        所有实例共用一个输入线程，等待时间按点击间隔最短的实例确定，只缩短不延长。
+        """
+        with MouseController._lock:
+            if click_interval / 2 >= MouseController.pause:
+                return
+            MouseController.pause = click_interval / 2
+            if MouseController.backend is not None:
+                MouseController.backend.set_pause(MouseController.pause)
+            logging.info(f"鼠标操作后的等待时间缩短为 {MouseController.pause * 1000:.0f} ms")
+    
+    @staticmethod
+    def drag_steps(start_x: int, start_y: int, 
+                   x: int, y: int, button: str = 'left') -> Tuple[Tuple[str, tuple], ...]:
+        """拖拽操作的后端步骤"""
+        return (
+            ('mouse_down', (start_x, start_y, button)),
+            ('move_to', (start_x + x, start_y + y, 0.03)),
+            ('mouse_up', (button,)),
+        )
+    
+    @staticmethod
+    def submit(name: str, 
+               steps: Tuple[Tuple[str, tuple], ...], 
+               priority: InputPriority = InputPriority.SEQUENCE,
+               max_age: Optional[float] = None,
+               coalesce_key: Optional[Hashable] = None,
+               done: Optional[Event] = None) -> bool:
+        """提交输入命令，立即返回，被合并时返回False，命令执行完或被丢弃后设置 done"""
+        command = InputCommand(name, steps, priority, time.monotonic(), max_age, 
+                               coalesce_key, Metrics.current_state(), done)
+        return MouseController._dispatcher().submit(command)
+    
+    @staticmethod
+    def press_mouse_move(start_x: int, start_y: int, 
+                        x: int, y: int, button: str = 'left',
+                        priority: InputPriority = InputPriority.SEQUENCE,
+                        max_age: Optional[float] = None,
+                        coalesce_key: Optional[Hashable] = None) -> bool:
+        """模拟鼠标拖拽操作"""
+        return MouseController.submit('press_mouse_move', MouseController.drag_steps(start_x, start_y, x, y, button),
+                                      priority, max_age, coalesce_key)
+    
+    @staticmethod
+    def click(position: Tuple[int, int],
+              priority: InputPriority = InputPriority.SEQUENCE,
+              max_age: Optional[float] = None,
+              coalesce: bool = False,
+              done: Optional[Event] = None) -> bool:
+        """点击指定位置，coalesce 为True时与等待中的相同位置点击合并"""
+        return MouseController.submit('click', (('click', (tuple(position),)),), priority, max_age, 
+                                      ('click', tuple(position)) if coalesce else None, done)
+    
+    @staticmethod
+    def flush(timeout: Optional[float] = None) -> bool:
+        """等待已提交的操作全部执行完"""
+        if MouseController.dispatcher is None:
+            return True
+        return MouseController.dispatcher.flush(timeout)
@@ -1,291 +1,291 @@
-import os
-import win32gui
-import win32con
-import pyautogui
+import math
+import queue
 import time
-import cv2
 import numpy as np
-import yaml
-import keyboard
-from threading import Thread
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
 from enum import Enum, auto
-from typing import Optional, Tuple, Dict, Any
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any, List, Hashable, Iterable, Callable, TYPE_CHECKING
 from dataclasses import dataclass
 from setting import Config
+from common import FishState, GameConfig, LazyModule, STATE_TEMPLATES, StateSnapshot
+from metrics import Metrics, MetricsExporter
+from capture import Frame, FrameBus, FrameSource, RecordedSession, SessionRecorder, WindowManager
+from vision import (ColorProbe, FrameChangeDetector, ProbeSampler, PyramidMatcher, ScaleCalibrator, Template,
+                    TemplateRegistry, VisionJobs)
+from calibration import CalibrationStore, ConfigManager
+from inputs import InputBackend, InputPriority, MouseController, RecordingInputBackend
+from stats import FishingCycle, SessionStats
 import logging
 
+if TYPE_CHECKING:
+    from vision_pool import VisionWorkerPool
 
-class FishState(Enum):
-    """钓鱼游戏的状态枚举"""
-    START_FISHING = auto()  # 开始钓鱼
-    CAST_ROD = auto()       # 抛竿
-    NO_BAIT = auto()        # 鱼饵不足
-    CATCH_FISH = auto()     # 捕鱼
-    FISHING = auto()        # 钓鱼中
-    INSTANT_KILL = auto()   # 秒杀
-    END_FISHING = auto()    # 结束钓鱼
-    EXIT = auto()           # 退出
+# OpenCV 导入较慢，推迟到第一次识别时
+cv2 = LazyModule('cv2', globals())
 
 
-@dataclass
-class GameConfig:
-    """游戏配置数据类"""
-    window_title: str  # 模拟器窗口标题
-    window_size: Tuple[int, int, int, int]  # 模拟器窗口大小和位置 (x, y, width, height)
-    start_fishing_pos: Optional[Tuple[int, int]] = None  # 开始钓鱼按钮的中心点坐标
-    rod_position: Optional[Tuple[int, int]] = None  # 钓鱼界面拉杆位置中心点坐标
-    pressure_indicator_pos: Optional[Tuple[int, int]] = None  # 用来判断压力是否过高的点的位置
-    low_pressure_color: Optional[Tuple[int, int, int]] = None  # 用来判断压力是否过高的点的颜色
-    original_rod_color: Optional[Tuple[int, int, int]] = None  # 钓鱼界面拉杆位置中心点颜色
-    direction_icon_positions: Optional[Dict[str, Tuple[int, int]]] = None  # 方向图标位置字典
-    retry_button_center: Optional[Tuple[int, int]] = None  # 再来一次按钮的中心点坐标
-    use_bait_button_pos: Optional[Tuple[int, int]] = None  # 使用鱼饵按钮的位置
-
-
-class WindowManager:
-    """窗口管理类，处理窗口相关的操作"""
+class TransitionVoter:
+    """状态转换的多帧确认
     
-    @staticmethod
-    def find_window(title: str) -> int:
-        """查找指定标题的窗口句柄"""
-        return win32gui.FindWindow(None, title)
-    
-    @staticmethod
-    def get_window_rect(hwnd: int) -> Tuple[int, int, int, int]:
-        """获取窗口位置和大小"""
-        return win32gui.GetWindowRect(hwnd)
+    为每个候选的目标状态保留最近M帧是否识别到其界面的滑动窗口，窗口内有N帧识别到时确认转换，
+    单帧的误匹配不会改变状态。强匹配(分数远高于阈值)时单帧即确认，不增加正常切换的延迟。
+    N 和 M 由 Config.STATE_CONFIRMATION 和按目标状态覆盖的 Config.STATE_CONFIRMATIONS 决定，状态发布后清空。
+    """
     
-    @staticmethod
-    def bring_to_front(hwnd: int) -> None:
-        """将窗口置于最前端并激活"""
-        win32gui.SetForegroundWindow(hwnd)
-        win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-    
-    @staticmethod
-    def handle_window(config: GameConfig) -> None:
-        """处理窗口配置和位置"""
-        hwnd = WindowManager.find_window(config.window_title)
-        if not hwnd:
-            raise ValueError(f"未找到标题为 {config.window_title} 的窗口")
-        
-        WindowManager.bring_to_front(hwnd)
-        win32gui.SetWindowPos(hwnd, None, *config.window_size, 0)
-        time.sleep(0.5)
-
-class ImageProcessor:
-    """图像处理类，处理所有图像相关的操作"""
-    
-    @staticmethod
-    def get_screenshot(size: Tuple[int, int, int, int], 
-                      is_save: bool = False, 
-                      save_path: Optional[str] = None) -> np.ndarray:
-        """获取屏幕截图"""
-        img = pyautogui.screenshot(region=size)
-        img_np = np.array(img)
-        img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-        if is_save and save_path:
-            img.save(save_path)
-        return img_np
+    def __init__(self):
+        self.windows: Dict[FishState, deque] = {}
+        # 有候选状态被识别到但还没有确认，采集线程读取该值调节截图频率
+        self.undecided = False
     
     @staticmethod
-    def is_match_template(img: np.ndarray, 
-                         template: np.ndarray, 
-                         threshold: float = 0.8) -> bool:
-        """模板匹配判断"""
-        res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
-        loc = np.where(res >= threshold)
-        return len(loc[0]) > 0
+    def confirmation(state: FishState) -> Tuple[int, int]:
+        """目标状态需要的确认帧数 (N, M)"""
+        return Config.STATE_CONFIRMATIONS.get(state.name, Config.STATE_CONFIRMATION)
     
-    @staticmethod
-    def match_template(img: np.ndarray, 
-                      template: np.ndarray, 
-                      threshold: float = 0.8,
-                      position: Tuple[float, float] = (0.5, 0.5)) -> Tuple[int, int]:
-        """模板匹配并返回指定位置
+    def observe(self, candidates: Iterable[FishState], 
+                hit: Optional[FishState], 
+                strong: bool = False) -> Optional[FishState]:
+        """记录一帧的识别结果
         
         Args:
-            img: 输入图像
-            template: 模板图像
-            threshold: 匹配阈值
-            position: 归一化位置坐标，范围[0,1]，(0,0)表示左上角，(1,1)表示右下角，默认为(0.5,0.5)即中心位置
-                    如果值超出范围，将自动调整到最近的合法值
+            candidates: 本帧检查的候选状态
+            hit: 本帧识别到的状态，没有时为None
+            strong: 是否为强匹配
             
         Returns:
-            返回指定位置的坐标 (x, y)
+            确认转换到的状态，还需要更多帧确认时返回None
         """
-        # 将position值限制在[0,1]范围内
-        clamped_x = max(0, min(1, position[0]))
-        clamped_y = max(0, min(1, position[1]))
-        
-        # 如果值被调整，记录日志
-        if clamped_x != position[0] or clamped_y != position[1]:
-            logging.warning(f"position参数值被调整: {position} -> ({clamped_x}, {clamped_y})")
-            
-        res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
-        
-        # 获取模板的宽高
-        template_width = template.shape[1]
-        template_height = template.shape[0]
-        
-        # 根据归一化位置计算实际坐标
-        x = int(max_loc[0] + template_width * clamped_x)
-        y = int(max_loc[1] + template_height * clamped_y)
-            
-        return (x, y)
+        for state in candidates:
+            window = self.windows.get(state)
+            if window is None:
+                window = self.windows[state] = deque(maxlen=self.confirmation(state)[1])
+            window.append(state == hit)
+        self.undecided = any(any(window) for window in self.windows.values())
+        if hit is not None and (strong or sum(self.windows[hit]) >= self.confirmation(hit)[0]):
+            return hit
+        return None
+    
+    def reset(self) -> None:
+        """清空所有窗口"""
+        self.windows.clear()
+        self.undecided = False
 
 
-class ConfigManager:
-    """配置管理类，处理配置文件的读写"""
+class FishingStateManager:
+    """负责状态管理和转换的类
     
-    @staticmethod
-    def write_yaml(data: Dict[str, Any]) -> None:
-        """写入YAML配置文件"""
-        with open(str(Config.CONFIG_FILE), 'w', encoding='utf-8') as f:
-            yaml.dump(data, f)
+    只有识别线程修改状态，每次状态变化时构造新的 StateSnapshot 并整体替换 snapshot 引用完成发布，
+    动作线程读取 snapshot 得到的状态、进入时间和帧序号总是同一次发布的，读取路径不加锁。
+    状态转换经 TransitionVoter 多帧确认后才生效。
+    需要等待界面稳定的转换记为截止时间，截止前照常识别后续的帧，到期后再发布。
+    """
     
-    @staticmethod
-    def read_yaml() -> Dict[str, Any]:
-        """读取YAML配置文件"""
-        with open(str(Config.CONFIG_FILE), 'r', encoding='utf-8') as f:
-            return yaml.load(f, Loader=yaml.FullLoader)
-
-
-class MouseController:
-    """鼠标控制类，处理所有鼠标操作"""
+    # 各状态下可能转换到的目标状态
+    STATE_TRANSITIONS: Dict[FishState, Tuple[FishState, ...]] = {
+        FishState.START_FISHING: (FishState.CAST_ROD,),
+        FishState.CAST_ROD: (FishState.NO_BAIT, FishState.CATCH_FISH),
+        FishState.CATCH_FISH: (FishState.FISHING,),
+        FishState.FISHING: (FishState.END_FISHING, FishState.INSTANT_KILL),
+        FishState.INSTANT_KILL: (FishState.END_FISHING,),
+        FishState.END_FISHING: (FishState.CAST_ROD,),
+    }
     
-    @staticmethod
-    def press_mouse_move(start_x: int, start_y: int, 
-                        x: int, y: int, button: str = 'left') -> None:
-        """模拟鼠标拖拽操作"""
-        pyautogui.mouseDown(start_x, start_y, button=button)
-        pyautogui.moveTo(start_x + x, start_y + y, duration=0.03)
-        pyautogui.mouseUp(button=button)
+    # 识别到目标界面后延迟发布的转换 (原状态, 新状态) -> 延迟(秒)
+    TRANSITION_DELAYS: Dict[Tuple[FishState, FishState], float] = {
+        # FISHING 页面已就绪，但有些元素状态重置需要时间，比如挥杆
+        (FishState.CATCH_FISH, FishState.FISHING): Config.FISHING_READY_DELAY,
+    }
     
-    @staticmethod
-    def click(position: Tuple[int, int]) -> None:
-        """点击指定位置"""
-        pyautogui.click(position)
-
-
-class FishingStateManager:
-    """负责状态管理和转换的类"""
-    
-    def __init__(self, current_img: np.ndarray):
-        self.ui_recognizer = FishingUIRecognizer()
-        self.current_state = self._determine_initial_state(current_img)
-        self._setup_state_flags()
-    
-    def _setup_state_flags(self) -> None:
-        """初始化状态标志"""
-        self.first_start_fishing = True
-        self.first_cast_rod = True
-        self.first_no_bait = True
-        self.first_retry = True
-        self.first_instant_kill = True
-        self.rod_retrieve_time = 0
+    def __init__(self, current_img: np.ndarray, 
+                 templates: TemplateRegistry, 
+                 config: Optional[GameConfig] = None,
+                 vision: Optional['VisionJobs | VisionWorkerPool'] = None,
+                 last_state: Optional[FishState] = None,
+                 frame_seq: int = 0):
+        self.vision = VisionJobs(templates) if vision is None else vision
+        self.ui_recognizer = FishingUIRecognizer(templates, config, self.vision)
+        self.snapshot = StateSnapshot(self._determine_initial_state(current_img, last_state), 
+                                      time.time(), frame_seq, 1)
+        self.pending: Optional[Tuple[FishState, float]] = None  # 等待发布的转换 (新状态, 截止时间)
+        self.voter = TransitionVoter()
+        self._recovery_check_time = self.snapshot.entered_at
+        # 画面在相关区域内没有变化时跳过识别
+        self.change_detector = FrameChangeDetector()
+        self._reference_signature: Optional[np.ndarray] = None  # 上一次完整识别的画面签名
+        self._reference_state: Optional[FishState] = None  # 上一次完整识别时的状态
+        self._last_full_check = 0.0
+        self.skipped_frames = 0
+    
+    @property
+    def current_state(self) -> FishState:
+        """最近一次发布的页面状态"""
+        return self.snapshot.state
+    
+    def publish(self, state: FishState, frame_seq: int) -> StateSnapshot:
+        """发布新的页面状态，只能在识别线程中调用"""
+        old = self.snapshot
+        self.pending = None
+        self.voter.reset()
+        self.snapshot = StateSnapshot(state, time.time(), frame_seq, old.version + 1)
+        self._recovery_check_time = self.snapshot.entered_at
+        logging.info(f"页面状态变化: {old.state} -> {state}")
+        return self.snapshot
     
-    def update_state(self, current_img: np.ndarray) -> None:
-        """更新当前状态"""
-        old_state = self.current_state
+    def _transition(self, state: FishState, frame_seq: int) -> None:
+        """识别到新状态的界面，需要等待界面稳定时只记下截止时间"""
+        delay = self.TRANSITION_DELAYS.get((self.current_state, state))
+        if not delay:
+            self.publish(state, frame_seq)
+        elif self.pending is None or self.pending[0] != state:
+            self.pending = (state, time.time() + delay)
+    
+    def _relevant_regions(self, current_img: np.ndarray) -> Optional[List[Tuple[int, int, int, int]]]:
+        """当前状态及其可能转换到的状态的界面所在区域，有任一区域未知时返回None"""
+        regions = []
+        for state in (self.current_state, *self.STATE_TRANSITIONS.get(self.current_state, ())):
+            roi = self.ui_recognizer.state_roi(current_img, state)
+            if roi is None:
+                return None
+            regions.append(roi)
+        return regions
+    
+    def _is_unchanged(self, current_img: np.ndarray) -> bool:
+        """相关区域自上一次完整识别以来没有变化，且未到强制重新识别的时间"""
+        signature = self.change_detector.signature(current_img)
+        current_time = time.time()
+        if (self._reference_state == self.current_state
+                and current_time - self._last_full_check < Config.FRAME_RECHECK_INTERVAL
+                and not self.change_detector.changed(signature, self._reference_signature, 
+                                                     current_img.shape, self._relevant_regions(current_img))):
+            return True
+        self._reference_signature = signature
+        self._reference_state = self.current_state
+        self._last_full_check = current_time
+        return False
+    
+    @Metrics.timed()
+    def update_state(self, current_img: np.ndarray, frame_seq: int = 0) -> None:
+        """更新当前状态，画面相关区域没有变化时沿用上一次的识别结果
+        
+        Args:
+            current_img: 当前截图
+            frame_seq: 截图的帧序号，记录在发布的状态中
+        """
+        if self.pending is not None and time.time() >= self.pending[1]:
+            # 等待的转换已到期，界面已在截止前确认过
+            self.publish(self.pending[0], frame_seq)
+            return
+        # 有待确认的转换时每帧都识别
+        if not self.voter.undecided and self._is_unchanged(current_img):
+            self.skipped_frames += 1
+            return
         
         match self.current_state:
-            case FishState.START_FISHING:
-                if self.ui_recognizer.check_cast_rod_ui(current_img):
-                    self.current_state = FishState.CAST_ROD
-            
-            case FishState.CAST_ROD:
-                if self.ui_recognizer.check_no_bait_ui(current_img):
-                    self.current_state = FishState.NO_BAIT
-                elif self.ui_recognizer.check_catch_fish_ui(current_img):
-                    self.current_state = FishState.CATCH_FISH
-            
             case FishState.NO_BAIT:
-                if not self.ui_recognizer.check_no_bait_ui(current_img):
-                    self.current_state = FishState.CAST_ROD
-            
-            case FishState.CATCH_FISH:
-                if self.ui_recognizer.check_fishing_ui(current_img):
-                    # FISHING 页面已就绪，但有些元素状态重置需要时间，比如挥杆
-                    time.sleep(2)
-                    self.current_state = FishState.FISHING
-            
-            case FishState.FISHING:
-                if self.ui_recognizer.check_end_fishing_ui(current_img):
-                    self.current_state = FishState.END_FISHING
-                elif self.ui_recognizer.check_instant_kill_ui(current_img):
-                    self.current_state = FishState.INSTANT_KILL
-
-            case FishState.INSTANT_KILL:
-                if self.ui_recognizer.check_end_fishing_ui(current_img):
-                    self.current_state = FishState.END_FISHING
+                # 鱼饵不足界面消失后回到抛竿
+                no_bait = self.ui_recognizer.check_no_bait_ui(current_img)
+                confirmed = self.voter.observe((FishState.CAST_ROD,), None if no_bait else FishState.CAST_ROD, 
+                                               no_bait.absent)
+                if confirmed is not None:
+                    self.publish(confirmed, frame_seq)
             
-            case FishState.END_FISHING:
-                if self.ui_recognizer.check_cast_rod_ui(current_img):
-                    self.current_state = FishState.CAST_ROD
-        
-        if old_state != self.current_state:
-            logging.info(f"页面状态变化: {old_state} -> {self.current_state}")
+            case _:
+                candidates = self.STATE_TRANSITIONS.get(self.current_state, ())
+                result = self._classify(current_img, candidates)
+                new_state, found = result if result is not None else (None, None)
+                confirmed = self.voter.observe(candidates, new_state, found is not None and found.strong)
+                if confirmed is not None:
+                    self._transition(confirmed, frame_seq)
+                elif (new_state is None and self.pending is None 
+                      and time.time() - self._recovery_check_time > Config.STATE_RECOVERY_TIMEOUT):
+                    self._recover_state(current_img, frame_seq)
     
-    def reset_state_flags(self) -> None:
-        """重置所有状态标志"""
-        self._setup_state_flags()
+    @Metrics.timed('classify')
+    def _classify(self, current_img: np.ndarray, 
+                  states: Iterable[FishState]) -> Optional[Tuple[FishState, 'TemplateMatch']]:
+        """对候选状态批量打分，只在最高分状态的粗匹配峰值附近以原始分辨率确认，返回确认的状态及其匹配结果
         
-    def _determine_initial_state(self, current_img: np.ndarray) -> FishState:
+        最高分低于 Config.CLASSIFY_MIN_SCORE 时不做确认，直接视为没有候选状态的界面
+        """
+        states = tuple(states)
+        if not states:
+            return None
+        scores = self.vision.submit('classify', current_img, states).result()
+        state = max(states, key=lambda candidate: scores[candidate][0])
+        score, loc = scores[state]
+        if score < Config.CLASSIFY_MIN_SCORE:
+            return None
+        found = self.ui_recognizer.confirm_state_ui(current_img, state, loc)
+        return (state, found) if found else None
+    
+    def _recover_state(self, current_img: np.ndarray, frame_seq: int) -> None:
+        """状态长时间未变化且当前界面不符时，重新识别所处的状态"""
+        self._recovery_check_time = time.time()
+        if self._classify(current_img, (self.current_state,)) is not None:
+            return
+        result = self._classify(current_img, STATE_TEMPLATES)
+        if result is not None and result[0] != self.current_state:
+            logging.warning(f"当前界面与状态 {self.current_state} 不符，重新识别为: {result[0]}")
+            self.publish(result[0], frame_seq)
+    
+    def _determine_initial_state(self, current_img: np.ndarray, last_state: Optional[FishState] = None) -> FishState:
         """调整初始状态，兼容从任何页面启动程序
         
         Args:
             current_img: 当前屏幕截图
+            last_state: 上次运行保存的状态，当前界面符合时直接沿用
         """
+        if last_state is not None and self._classify(current_img, (last_state,)) is not None:
+            logging.info(f"恢复上次的页面状态: {last_state}")
+            return last_state
 
-        state = FishState.START_FISHING
-        # 检查各个UI界面，设置对应的状态
-        if self.ui_recognizer.check_start_fishing_ui(current_img):
-            state = FishState.START_FISHING
-        elif self.ui_recognizer.check_cast_rod_ui(current_img):
-            state = FishState.CAST_ROD
-        elif self.ui_recognizer.check_no_bait_ui(current_img):
-            state = FishState.NO_BAIT
-        elif self.ui_recognizer.check_catch_fish_ui(current_img):
-            state = FishState.CATCH_FISH
-        elif self.ui_recognizer.check_fishing_ui(current_img):
-            state = FishState.FISHING
-        elif self.ui_recognizer.check_end_fishing_ui(current_img):
-            state = FishState.END_FISHING
-        elif self.ui_recognizer.check_instant_kill_ui(current_img):
-            state = FishState.INSTANT_KILL
-        else:
-            # 如果都不匹配，默认设置为开始钓鱼状态
-            state = FishState.START_FISHING
-            
+        # 一次性为所有界面打分，只确认最高分的界面
+        result = self._classify(current_img, STATE_TEMPLATES)
+        # 如果都不匹配，默认设置为开始钓鱼状态
+        state = FishState.START_FISHING if result is None else result[0]
+        
         logging.info(f"初始页面状态调整为: {state}")
         return state
 
+
 class FishingPositionDetector:
     """负责位置检测的类"""
     
-    def __init__(self, config: GameConfig):
+    def __init__(self, config: GameConfig, 
+                 templates: TemplateRegistry, 
+                 frame_bus: FrameBus,
+                 vision: Optional['VisionJobs | VisionWorkerPool'] = None):
         self.config = config
+        self.templates = templates
+        self.frame_bus = frame_bus
+        self.vision = VisionJobs(templates) if vision is None else vision
+    
+    def _match_position(self, img: np.ndarray, path: Path, position: Tuple[float, float] = (0.5, 0.5)) -> Future:
+        """提交位置匹配任务"""
+        return self.vision.submit('match_position', img, path, position)
     
     def detect_start_fishing_pos(self) -> None:
         """检测开始钓鱼按钮位置"""
-        start_fishing_UI_img = ImageProcessor.get_screenshot(self.config.window_size)
-        start_fishing_button_img = cv2.imread(str(Config.START_FISH_BUTTON))
-        pos = ImageProcessor.match_template(start_fishing_UI_img, start_fishing_button_img)
+        frame = self.frame_bus.latest
+        start_fishing_UI_img = frame.image
+        pos = self._match_position(start_fishing_UI_img, Config.START_FISH_BUTTON).result()
         self.config.start_fishing_pos = (
             pos[0] + self.config.window_size[0],
             pos[1] + self.config.window_size[1]
         )
-        ConfigManager.write_yaml(self.config.__dict__)
+        CalibrationStore.update(self.config, 'start_fishing_pos')
     
     def detect_fishing_positions(self) -> None:
         """检测钓鱼相关位置"""
-        fishing_img = ImageProcessor.get_screenshot(self.config.window_size)
-        push_rod_icon = cv2.imread(str(Config.PUSH_ROD_BUTTON))
-        pressure_img = cv2.imread(str(Config.PRESSURE_IMAGE))
-        
-        rod_pos = ImageProcessor.match_template(fishing_img, push_rod_icon)
-        pressure_pos = ImageProcessor.match_template(fishing_img, pressure_img, position=(0.25, 0.5))
+        frame = self.frame_bus.latest
+        fishing_img = frame.image
+        rod_future = self._match_position(fishing_img, Config.PUSH_ROD_BUTTON)
+        pressure_future = self._match_position(fishing_img, Config.PRESSURE_IMAGE, (0.25, 0.5))
+        rod_pos = rod_future.result()
+        pressure_pos = pressure_future.result()
         
         self.config.rod_position = (
             rod_pos[0] + self.config.window_size[0],
@@ -296,32 +296,37 @@ class FishingPositionDetector:
             pressure_pos[1] + self.config.window_size[1]
         )
         
-        self.config.low_pressure_color = pyautogui.pixel(*self.config.pressure_indicator_pos)
-        self.config.original_rod_color = pyautogui.pixel(*self.config.rod_position)
+        # 参考颜色与探针一样取小块的平均颜色
+        origin = self.config.window_size[:2]
+        self.config.low_pressure_color = ProbeSampler.patch_color(
+            fishing_img, origin, self.config.pressure_indicator_pos)
+        self.config.original_rod_color = ProbeSampler.patch_color(
+            fishing_img, origin, self.config.rod_position)
         
-        ConfigManager.write_yaml(self.config.__dict__)
+        CalibrationStore.update(self.config, 'rod_position', 'pressure_indicator_pos', 
+                                'low_pressure_color', 'original_rod_color')
     
     def detect_use_button_pos(self) -> None:
         """检测使用按钮位置"""
-        bait_ui_img = ImageProcessor.get_screenshot(self.config.window_size)
-        use_button_img = cv2.imread(str(Config.USE_BUTTON))
-        pos = ImageProcessor.match_template(bait_ui_img, use_button_img)
+        frame = self.frame_bus.latest
+        bait_ui_img = frame.image
+        pos = self._match_position(bait_ui_img, Config.USE_BUTTON).result()
         self.config.use_bait_button_pos = (
             pos[0] + self.config.window_size[0],
             pos[1] + self.config.window_size[1]
         )
-        ConfigManager.write_yaml(self.config.__dict__)
+        CalibrationStore.update(self.config, 'use_bait_button_pos')
     
     def detect_retry_button_pos(self) -> None:
         """检测再次钓鱼按钮位置"""
-        game_over_img = ImageProcessor.get_screenshot(self.config.window_size)
-        retry_icon = cv2.imread(str(Config.RETRY_BUTTON))
-        pos = ImageProcessor.match_template(game_over_img, retry_icon)
+        frame = self.frame_bus.latest
+        game_over_img = frame.image
+        pos = self._match_position(game_over_img, Config.RETRY_BUTTON).result()
         self.config.retry_button_center = (
             pos[0] + self.config.window_size[0],
             pos[1] + self.config.window_size[1]
         )
-        ConfigManager.write_yaml(self.config.__dict__)
+        CalibrationStore.update(self.config, 'retry_button_center')
     
     def detect_direction_icons(self) -> None:
         """检测方向图标位置"""
@@ -331,28 +336,248 @@ class FishingPositionDetector:
             self.config.window_size[2],
             (self.config.window_size[1] + self.config.window_size[3]) // 2
         )
-        bottom_half_img = ImageProcessor.get_screenshot(bottom_half_size)
+        frame = self.frame_bus.latest
+        bottom_half_img = frame.crop(bottom_half_size)
         
+        futures = [(path, self._match_position(bottom_half_img, path)) for path in Config.DIRECTION_ICONS]
         self.config.direction_icon_positions = {}
-        for dir_icon_path in Config.DIRECTION_ICONS:
-            dir_icon = cv2.imread(str(dir_icon_path))
-            pos = ImageProcessor.match_template(bottom_half_img, dir_icon)
+        for dir_icon_path, future in futures:
+            pos = future.result()
             name = dir_icon_path.stem
             self.config.direction_icon_positions[name] = (
                 pos[0] + bottom_half_size[0],
                 pos[1] + bottom_half_size[1]
             )
         
-        ConfigManager.write_yaml(self.config.__dict__)
+        CalibrationStore.update(self.config, 'direction_icon_positions')
+
+
+@dataclass
+class SolveAttempt:
+    """一次秒杀方向序列求解，时间从开始识别算起(秒)"""
+    icons: int  # 识别出并点击的图标数
+    first_click: float  # 提交第一次点击
+    decoded: float  # 整条序列识别完
+    completed: float  # 点击全部执行完，超时未执行完时为 -1
+    verified: bool = False  # 之后在新的一帧上确认图标已全部消失
+
+
+class DirectionSequenceSolver:
+    """秒杀方向序列求解
+    
+    只在图标所在的横条内识别，横条按列分段，每段的八个图标共享一次批量匹配。
+    从左到右每识别完一段就立即提交这一段的点击，输入线程点击的同时继续识别右侧的段。
+    点击全部执行后等界面刷新，在新的一帧上重新识别：图标已消失则完成，仍有图标时在延迟预算内重试。
+    重试时仍识别到的图标应是上一次识别结果的后缀，即还没有输入的部分，只点击这部分，不是后缀时停止输入。
+    """
+    
+    STRIP = 'direction_strip'  # 学习到的图标横条在 GameConfig.ui_rois 中的键
+    
+    def __init__(self, config: GameConfig, 
+                 templates: TemplateRegistry, 
+                 frame_bus: FrameBus,
+                 vision: 'VisionJobs | VisionWorkerPool'):
+        self.config = config
+        self.frame_bus = frame_bus
+        self.vision = vision
+        icons = [templates.get(path) for path in Config.DIRECTION_ICONS]
+        self.icon_height = max(icon.shape[0] for icon in icons)
+        self.segment_width = max(icon.shape[1] for icon in icons) * Config.DIRECTION_SEGMENT_ICONS
+        self.min_spacing = min(icon.shape[1] for icon in icons) // 2
+        self.attempts: List[SolveAttempt] = []  # 最近一次秒杀的各次尝试
+    
+    def _strip(self, roi: Optional[Tuple[int, int, int, int]]) -> Tuple[int, int, int, int]:
+        """图标横条的屏幕区域 (x, y, width, height)，没有学习到的横条时使用窗口上半部分"""
+        x, y, width, height = self.config.window_size
+        if roi is None:
+            return (x, y, width, height // 2)
+        return (x + roi[0], y + roi[1], roi[2], roi[3])
+    
+    def _learn_strip(self, strip: Tuple[int, int, int, int], icons: List[Tuple[Tuple[int, int], str, float]]) -> None:
+        """根据识别到的图标记录横条的纵向范围"""
+        margin = Config.UI_ROI_MARGIN
+        top = max(0, strip[1] - self.config.window_size[1] + min(pos[1] for pos, _, _ in icons) - margin)
+        bottom = strip[1] - self.config.window_size[1] + max(pos[1] for pos, _, _ in icons) + self.icon_height + margin
+        if self.config.ui_rois is None:
+            self.config.ui_rois = {}
+        self.config.ui_rois[self.STRIP] = (0, top, self.config.window_size[2], bottom - top)
+        logging.info(f"学习到方向图标横条: {self.config.ui_rois[self.STRIP]}")
+        CalibrationStore.update(self.config, 'ui_rois')
+    
+    def _decode(self, frame: Frame, strip: Tuple[int, int, int, int], 
+                on_icon: Optional[Callable[[str], None]] = None) -> List[Tuple[Tuple[int, int], str, float]]:
+        """从左到右分段识别横条内的图标，每识别完一段按顺序回调 on_icon"""
+        img = frame.crop(strip)
+        starts = iter(range(0, img.shape[1], self.segment_width))
+        # 使用识别进程池时同时提交多段，点击与右侧各段的识别重叠
+        lookahead = 1 if isinstance(self.vision, VisionJobs) else Config.VISION_WORKERS
+        pending: List[Future] = []
+        icons = []
+        while True:
+            for x0 in starts:
+                pending.append(self.vision.submit('direction_icons', img, x0, x0 + self.segment_width))
+                if len(pending) >= lookahead:
+                    break
+            if not pending:
+                return icons
+            for pos, name, score in pending.pop(0).result():
+                # 跨段的同一个图标只保留第一次识别结果
+                if icons and pos[0] - icons[-1][0][0] < self.min_spacing:
+                    continue
+                icons.append((pos, name, score))
+                if on_icon is not None:
+                    on_icon(name)
+    
+    def _fresh_frame(self, after: float, timeout: float) -> Optional[Frame]:
+        """等待截图时间晚于 after 的一帧"""
+        deadline = time.monotonic() + timeout
+        frame = self.frame_bus.latest
+        while frame.timestamp < after:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            frame = self.frame_bus.wait_for(frame.seq, timeout=remaining) or frame
+        return frame
+    
+    def solve(self, is_active: Callable[[], bool]) -> bool:
+        """在延迟预算内识别并输入方向序列
+        
+        Args:
+            is_active: 是否仍处于秒杀界面，界面已切换时停止重试
+            
+        Returns:
+            是否确认序列已全部输入
+        """
+        budget = self.config.instant_kill_budget or Config.INSTANT_KILL_BUDGET
+        deadline = time.monotonic() + budget
+        learned = True
+        frame = self.frame_bus.latest
+        attempt: Optional[SolveAttempt] = None
+        self.attempts = []
+        previous: Optional[List[str]] = None  # 上一次尝试识别并点击的图标
+        while is_active():
+            start = time.perf_counter()
+            roi = (self.config.ui_rois or {}).get(self.STRIP) if learned else None
+            strip = self._strip(roi)
+            first_click = [-1.0]
+            done: List[Event] = []  # 各次点击执行完的事件，同一优先级的点击按提交顺序执行
+            
+            def click(name: str) -> None:
+                if first_click[0] < 0:
+                    first_click[0] = time.perf_counter() - start
+                done.append(Event())
+                MouseController.click(self.config.direction_icon_positions[name], done=done[-1])
+            
+            # 第一次尝试边识别边点击，重试时先和上一次的识别结果比较再点击
+            icons = self._decode(frame, strip, click if previous is None else None)
+            decoded = time.perf_counter() - start
+            if not icons:
+                if attempt is not None:
+                    attempt.verified = True
+                    logging.info(f"秒杀方向序列已完成，共尝试 {len(self.attempts)} 次")
+                    return True
+                if roi is not None:
+                    # 学习到的横条内没有图标，改为搜索窗口上半部分
+                    learned = False
+                    continue
+            else:
+                for pos, name, score in icons:
+                    logging.info(f"{name}, 位置: {pos}, 匹配度: {score:.3f}")
+                if roi is None:
+                    self._learn_strip(strip, icons)
+                    learned = True
+                names = [name for _, name, _ in icons]
+                if previous is not None:
+                    if len(names) > len(previous) or names != previous[len(previous) - len(names):]:
+                        logging.warning(f"重新识别的方向序列 {names} 不是上一次识别结果 {previous} 的后缀，停止输入")
+                        return False
+                    for name in names:
+                        click(name)
+                previous = names
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if icons:
+                # 等待最后一次点击执行完，再等界面刷新后检查
+                completed = time.perf_counter() - start if done[-1].wait(remaining) else -1.0
+                attempt = SolveAttempt(len(icons), first_click[0], decoded, completed)
+                self.attempts.append(attempt)
+                if Metrics.enabled:
+                    Metrics.record('instant_kill_attempt', time.perf_counter() - start)
+                logging.info(f"秒杀第 {len(self.attempts)} 次尝试: {attempt.icons} 个图标，"
+                             f"首次点击 {attempt.first_click * 1000:.1f} ms，识别 {attempt.decoded * 1000:.1f} ms，"
+                             f"点击完成 {attempt.completed * 1000:.1f} ms")
+                after = time.time() + Config.INSTANT_KILL_SETTLE
+            else:
+                # 还没有识别到图标，等下一帧
+                after = frame.timestamp + 1e-6
+            frame = self._fresh_frame(after, deadline - time.monotonic())
+            if frame is None:
+                break
+        
+        if is_active():
+            logging.warning(f"秒杀方向序列在 {budget:.1f} 秒内未确认完成，共尝试 {len(self.attempts)} 次")
+        return False
 
 
 class FishingActionExecutor:
     """负责执行具体的钓鱼动作的类"""
     
-    def __init__(self, config: GameConfig):
+    def __init__(self, config: GameConfig, 
+                 templates: TemplateRegistry, 
+                 frame_bus: FrameBus,
+                 vision: Optional['VisionJobs | VisionWorkerPool'] = None):
         self.config = config
+        self.templates = templates
+        self.frame_bus = frame_bus
+        self.vision = VisionJobs(templates) if vision is None else vision
         self.fishing_click_time = 0
         self.rod_retrieve_time = 0
+        self.pressure_checks = 0  # 钓鱼时检查压力条的次数
+        self.pressure_deviations = 0  # 其中压力条变色的次数
+        self._pressure_lock = Lock()  # 计数在动作线程中更新，由 TimingTuner 在统计线程中读取
+        self._probes: Optional[ProbeSampler] = None
+        self._solver: Optional[DirectionSequenceSolver] = None
+    
+    def _probe_sampler(self) -> ProbeSampler:
+        """钓鱼界面的压力条和拉杆探针，位置或参考颜色重新标定后重建"""
+        probes = (
+            ColorProbe('pressure', tuple(self.config.pressure_indicator_pos), tuple(self.config.low_pressure_color)),
+            ColorProbe('rod', tuple(self.config.rod_position), tuple(self.config.original_rod_color)),
+        )
+        if self._probes is None or tuple(self._probes.probes) != probes:
+            self._probes = ProbeSampler(probes)
+        return self._probes
+    
+    @property
+    def click_interval(self) -> float:
+        """钓鱼时点击的间隔(秒)"""
+        return self.config.fishing_click_interval or Config.FISHING_CLICK_INTERVAL
+    
+    @property
+    def catch_fish_interval(self) -> float:
+        """捕鱼时点击的间隔(秒)，为钓鱼时点击间隔的三倍"""
+        return self.click_interval * 3
+    
+    @property
+    def retrieve_interval(self) -> float:
+        """钓鱼时收杆的间隔(秒)"""
+        return self.config.rod_retrieve_interval or Config.ROD_RETRIEVE_INTERVAL
+    
+    @property
+    def pressure_backoff(self) -> float:
+        """压力条变色后暂停点击的时间(秒)"""
+        return self.click_interval * (self.config.pressure_backoff or Config.PRESSURE_BACKOFF)
+    
+    def pressure_counts(self) -> Tuple[int, int]:
+        """(检查压力条的次数, 其中压力条变色的次数)，两个计数取自同一时刻"""
+        with self._pressure_lock:
+            return self.pressure_checks, self.pressure_deviations
+    
+    def _distance(self, pixels: int) -> int:
+        """按模板比例换算拖动距离，距离是在截取模板时的窗口大小下确定的"""
+        return round(pixels * (self.config.template_scale or 1.0))
     
     def handle_default_state(self) -> None:
         """处理默认状态"""
@@ -363,7 +588,7 @@ class FishingActionExecutor:
         MouseController.press_mouse_move(
             self.config.start_fishing_pos[0],
             self.config.start_fishing_pos[1],
-            0, -100
+            0, self._distance(-100)
         )
     
     def handle_no_bait_state(self) -> None:
@@ -372,49 +597,66 @@ class FishingActionExecutor:
     
     def handle_catch_fish_state(self) -> None:
         """处理捕鱼状态"""
-        click_interval = Config.FISHING_CLICK_INTERVAL * 3
         current_time = time.time()
-        if current_time - self.fishing_click_time >= click_interval:
-            MouseController.click(self.config.start_fishing_pos)
+        if current_time - self.fishing_click_time >= self.catch_fish_interval:
+            MouseController.click(self.config.start_fishing_pos, InputPriority.ROUTINE, 
+                                  Config.INPUT_MAX_AGE, coalesce=True)
             self.fishing_click_time = current_time
     
     def handle_ongoing_fishing(self) -> None:
-        """处理持续钓鱼状态"""
+        """处理持续钓鱼状态(轮询方式)"""
         current_time = time.time()
-        click_interval = Config.FISHING_CLICK_INTERVAL
-        pressure_check_interval = click_interval * 3
 
         # 检查收杆
-        if current_time - self.rod_retrieve_time > Config.ROD_RETRIEVE_INTERVAL:
+        if current_time - self.rod_retrieve_time > self.retrieve_interval:
             self.handle_rod_retrieve()
 
         # 检查点击操作
-        if current_time - self.fishing_click_time >= click_interval:
-            current_pressure_color = pyautogui.pixel(*self.config.pressure_indicator_pos)
-            # 压力条颜色改变, 增加点击保护间隔
-            if current_pressure_color != self.config.low_pressure_color:
-                self.fishing_click_time = current_time + pressure_check_interval
-            # 压力条颜色未改变, 点击收杆
-            else:
-                MouseController.click(self.config.start_fishing_pos) 
-                self.fishing_click_time = current_time
+        if current_time - self.fishing_click_time >= self.click_interval:
+            self.handle_fishing_click()
 
         # 拉竿检查
-        current_rod_color = pyautogui.pixel(*self.config.rod_position)
-        if current_rod_color != self.config.original_rod_color:
+        self.check_rod_movement()
+    
+    def handle_fishing_click(self) -> float:
+        """检查压力条并点击收线
+        
+        Returns:
+            距离下一次点击检查的时间(秒)
+        """
+        current_time = time.time()
+        click_interval = self.click_interval
+        pressure_check_interval = self.pressure_backoff
+        # 压力检查使用状态机所用的同一帧
+        deviated = self._probe_sampler().is_deviated(self.frame_bus.latest, 'pressure')
+        with self._pressure_lock:
+            self.pressure_checks += 1
+            self.pressure_deviations += deviated
+        # 压力条颜色改变, 增加点击保护间隔
+        if deviated:
+            self.fishing_click_time = current_time + pressure_check_interval
+            return pressure_check_interval + click_interval
+        # 压力条颜色未改变, 点击收杆
+        MouseController.click(self.config.start_fishing_pos, InputPriority.ROUTINE, 
+                              Config.INPUT_MAX_AGE, coalesce=True)
+        self.fishing_click_time = current_time
+        return click_interval
+    
+    def check_rod_movement(self) -> None:
+        """检查拉杆颜色，变化时拉杆"""
+        if self._probe_sampler().is_deviated(self.frame_bus.latest, 'rod'):
             self.handle_rod_movement()
     
     def handle_rod_movement(self) -> None:
-        """处理拉杆移动"""
-        MouseController.press_mouse_move(
-            self.config.rod_position[0],
-            self.config.rod_position[1],
-            100, 0
-        )
-        MouseController.press_mouse_move(
-            self.config.rod_position[0],
-            self.config.rod_position[1],
-            -100, 0
+        """处理拉杆移动，左右各拉一次作为一条命令，未执行完时重复的拉杆被合并"""
+        x, y = self.config.rod_position
+        distance = self._distance(100)
+        MouseController.submit(
+            'rod_movement',
+            MouseController.drag_steps(x, y, distance, 0) + MouseController.drag_steps(x, y, -distance, 0),
+            InputPriority.ROD,
+            Config.INPUT_MAX_AGE,
+            ('rod_movement', (x, y))
         )
     
     def handle_rod_retrieve(self) -> None:
@@ -422,7 +664,8 @@ class FishingActionExecutor:
         MouseController.press_mouse_move(
             self.config.start_fishing_pos[0],
             self.config.start_fishing_pos[1],
-            0, -75
+            0, self._distance(-75),
+            priority=InputPriority.ROD
         )
         self.rod_retrieve_time = time.time()
     
@@ -430,106 +673,548 @@ class FishingActionExecutor:
         """处理结束钓鱼状态"""
         MouseController.click(self.config.retry_button_center)
     
-    def handle_direction_sequence(self) -> None:
-        """处理方向序列"""
-        top_half_size = (
-            self.config.window_size[0],
-            self.config.window_size[1],
-            self.config.window_size[2],
-            (self.config.window_size[3] + self.config.window_size[1]) // 2
-        )
-        top_half_img = ImageProcessor.get_screenshot(top_half_size)
-        
-        all_icons_dict = {}
-        for dir_icon_path in Config.DIRECTION_ICONS:
-            dir_icon = cv2.imread(str(dir_icon_path))
-            res = cv2.matchTemplate(top_half_img, dir_icon, cv2.TM_CCOEFF_NORMED)
-            res_loc = np.where(res >= 0.8)
-            if len(res_loc[0]) > 0:
-                points = list(zip(*res_loc[::-1]))
-                classified_points = self._classify_positions(points)
-                for point in classified_points:
-                    all_icons_dict[point] = dir_icon_path.stem
-        
-        # 按x坐标排序
-        all_icons_list = sorted(all_icons_dict.items(), key=lambda x: x[0][0])
-        for pos, name in all_icons_list:
-            logging.info(f"{name}, 位置: {pos}")
-            click_pos = self.config.direction_icon_positions[name]
-            MouseController.click(click_pos)
+    def handle_direction_sequence(self, is_active: Callable[[], bool]) -> bool:
+        """处理方向序列，is_active 返回False时停止重试，返回是否确认已全部输入"""
+        if self._solver is None:
+            self._solver = DirectionSequenceSolver(self.config, self.templates, self.frame_bus, self.vision)
+        return self._solver.solve(is_active)
+
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    """界面模板的匹配结果，分数达到阈值时为真"""
+    score: float  # 最大匹配分数
+    loc: Tuple[int, int]  # 最大分数处模板左上角在截图中的坐标
+    threshold: float  # 该模板的匹配阈值
     
-    @staticmethod
-    def _classify_positions(point_list: list) -> list:
-        """对识别出来的所有位置进行分类"""
-        result_points = []
-        for i in range(len(point_list)):
-            point_set = set()
-            if point_list[i] is None:
-                continue
-            point_set.add(point_list[i])
-            for j in range(i + 1, len(point_list)):
-                if point_list[j] is None:
-                    continue
-                if (abs(point_list[i][0] - point_list[j][0]) < 10 and 
-                    abs(point_list[i][1] - point_list[j][1]) < 10):
-                    point_set.add(point_list[j])
-                    point_list[j] = None
-            if len(point_set) > 1:
-                average_x = int(sum([x[0] for x in point_set]) / len(point_set))
-                average_y = int(sum([x[1] for x in point_set]) / len(point_set))
-                result_points.append((average_x, average_y))
-        return result_points
+    def __bool__(self) -> bool:
+        return self.score >= self.threshold
+    
+    @property
+    def strong(self) -> bool:
+        """分数远高于阈值，单帧即可确认"""
+        return self.score >= self.threshold + (1 - self.threshold) * Config.MATCH_STRONG_RATIO
+    
+    @property
+    def absent(self) -> bool:
+        """分数远低于阈值，单帧即可确认界面已消失"""
+        return self.score < self.threshold * (1 - Config.MATCH_STRONG_RATIO)
 
 
 class FishingUIRecognizer:
-    """负责UI识别的类"""
+    """负责UI识别的类
+    
+    每个界面检查优先在搜索区域内匹配，搜索区域来自配置中声明的提示或首次匹配成功后的学习结果，
+    声明了提示的模板位置不固定(如秒杀方向图标)，不进行学习。
+    搜索区域未命中或还没有搜索区域时按 Config.ROI_FALLBACK_INTERVAL 的间隔做全图搜索，以应对界面元素位置变化，
+    间隔内没有搜索区域的模板沿用上一次全图搜索的结果。
+    各界面检查返回 TemplateMatch，阈值优先使用配置中由录制会话学习的阈值。
+    """
+    
+    def __init__(self, templates: TemplateRegistry, 
+                 config: Optional[GameConfig] = None,
+                 vision: Optional['VisionJobs | VisionWorkerPool'] = None):
+        self.templates = templates
+        self.config = config
+        self.vision = VisionJobs(templates) if vision is None else vision
+        # 学习到的搜索区域，传入配置时保存到配置文件中
+        if config is None:
+            self.rois: Dict[str, Tuple[int, int, int, int]] = {}
+        else:
+            if config.ui_rois is None:
+                config.ui_rois = {}
+            self.rois = config.ui_rois
+        # 模板名 -> (上一次全图搜索的时间, 匹配结果)
+        self._last_full_search: Dict[str, Tuple[float, TemplateMatch]] = {}
+    
+    def _get_roi(self, path: Path, img: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """获取模板的搜索区域，优先使用学习到的区域，其次使用配置的提示区域"""
+        roi = self.rois.get(path.stem)
+        if roi is not None:
+            return roi
+        hint = Config.UI_ROI_HINTS.get(path)
+        if hint is None:
+            return None
+        height, width = img.shape[:2]
+        return (
+            int(hint[0] * width), int(hint[1] * height),
+            int(hint[2] * width), int(hint[3] * height)
+        )
+    
+    def _learn_roi(self, template: Template, loc: Tuple[int, int]) -> None:
+        """根据匹配位置记录搜索区域并保存"""
+        margin = Config.UI_ROI_MARGIN
+        roi = (
+            loc[0] - margin, loc[1] - margin,
+            template.shape[1] + margin * 2, template.shape[0] + margin * 2
+        )
+        self.rois[template.name] = roi
+        logging.info(f"学习到 {template.name} 的搜索区域: {roi}")
+        if self.config is not None:
+            CalibrationStore.update(self.config, 'ui_rois')
+    
+    def threshold(self, path: Path) -> float:
+        """模板的匹配阈值"""
+        learned = self.config.template_thresholds if self.config is not None else None
+        return (learned or {}).get(path.stem, Config.MATCH_THRESHOLD)
+    
+    def _check_template(self, img: np.ndarray, path: Path, threshold: Optional[float] = None) -> TemplateMatch:
+        """在搜索区域内匹配模板，未命中或没有搜索区域时按间隔退回全图搜索"""
+        template = self.templates.get(path)
+        threshold = self.threshold(path) if threshold is None else threshold
+        learnable = path not in Config.UI_ROI_HINTS
+        roi = self._get_roi(path, img)
+        match = None
+        if roi is not None:
+            match = TemplateMatch(*self.vision.submit('find', img, path, roi, threshold, False).result(), threshold)
+            if match:
+                if learnable and template.name not in self.rois:
+                    self._learn_roi(template, match.loc)
+                return match
+        
+        current_time = time.time()
+        last_time, last_match = self._last_full_search.get(template.name, (0.0, None))
+        if current_time - last_time < Config.ROI_FALLBACK_INTERVAL:
+            # 没有搜索区域时上一次全图搜索一定未命中，命中时已经学习到搜索区域
+            return match if match is not None else last_match
+        
+        match = TemplateMatch(*self.vision.submit('find', img, path, None, threshold, True).result(), threshold)
+        self._last_full_search[template.name] = (current_time, match)
+        if match and learnable:
+            self._learn_roi(template, match.loc)
+        return match
+    
+    def state_roi(self, img: np.ndarray, state: FishState) -> Optional[Tuple[int, int, int, int]]:
+        """指定状态的界面所在的搜索区域，未知时返回None"""
+        return self._get_roi(STATE_TEMPLATES[state], img)
+    
+    @Metrics.timed()
+    def confirm_state_ui(self, img: np.ndarray, state: FishState, loc: Tuple[int, int]) -> TemplateMatch:
+        """在状态分类的粗匹配峰值附近的小窗口内确认指定状态的界面
+        
+        Args:
+            img: 当前屏幕截图
+            state: 待确认的状态
+            loc: 粗匹配峰值处模板左上角的坐标 (x, y)
+        """
+        path = STATE_TEMPLATES[state]
+        template = self.templates.get(path)
+        threshold = self.threshold(path)
+        margin = Config.CLASSIFY_CONFIRM_MARGIN
+        roi = (loc[0] - margin, loc[1] - margin, template.shape[1] + margin * 2, template.shape[0] + margin * 2)
+        match = TemplateMatch(*self.vision.submit('find', img, path, roi, threshold, False).result(), threshold)
+        if match and path not in Config.UI_ROI_HINTS and template.name not in self.rois:
+            self._learn_roi(template, match.loc)
+        return match
     
-    def check_start_fishing_ui(self, img: np.ndarray) -> bool:
+    @Metrics.timed()
+    def check_start_fishing_ui(self, img: np.ndarray) -> TemplateMatch:
         """检查开始钓鱼界面"""
-        start_button = cv2.imread(str(Config.START_FISH_BUTTON))
-        return ImageProcessor.is_match_template(img, start_button)
+        return self._check_template(img, Config.START_FISH_BUTTON)
     
-    def check_cast_rod_ui(self, img: np.ndarray) -> bool:
+    @Metrics.timed()
+    def check_cast_rod_ui(self, img: np.ndarray) -> TemplateMatch:
         """检查抛竿界面"""
-        huaner = cv2.imread(str(Config.BAIT_IMAGE))
-        return ImageProcessor.is_match_template(img, huaner)
+        return self._check_template(img, Config.BAIT_IMAGE)
     
-    def check_no_bait_ui(self, img: np.ndarray) -> bool:
+    @Metrics.timed()
+    def check_no_bait_ui(self, img: np.ndarray) -> TemplateMatch:
         """检查鱼饵不足界面"""
-        use_button = cv2.imread(str(Config.USE_BUTTON))
-        return ImageProcessor.is_match_template(img, use_button)
+        return self._check_template(img, Config.USE_BUTTON)
     
-    def check_catch_fish_ui(self, img: np.ndarray) -> bool:
+    @Metrics.timed()
+    def check_catch_fish_ui(self, img: np.ndarray) -> TemplateMatch:
         """检查捕鱼界面"""
-        time_icon = cv2.imread(str(Config.TIME_IMAGE))
-        return ImageProcessor.is_match_template(img, time_icon)
+        return self._check_template(img, Config.TIME_IMAGE)
     
-    def check_fishing_ui(self, img: np.ndarray) -> bool:
+    @Metrics.timed()
+    def check_fishing_ui(self, img: np.ndarray) -> TemplateMatch:
         """检查钓鱼界面"""
-        pressure_img = cv2.imread(str(Config.PRESSURE_IMAGE))
-        return ImageProcessor.is_match_template(img, pressure_img)
+        return self._check_template(img, Config.PRESSURE_IMAGE)
     
-    def check_instant_kill_ui(self, img: np.ndarray) -> bool:
+    @Metrics.timed()
+    def check_instant_kill_ui(self, img: np.ndarray) -> TemplateMatch:
         """检查秒杀界面"""
-        up_button = cv2.imread(str(Config.UP_IMAGE))
-        return ImageProcessor.is_match_template(img, up_button)
+        return self._check_template(img, Config.UP_IMAGE)
     
-    def check_end_fishing_ui(self, img: np.ndarray) -> bool:
+    @Metrics.timed()
+    def check_end_fishing_ui(self, img: np.ndarray) -> TemplateMatch:
         """检查结束钓鱼界面"""
-        retry_button = cv2.imread(str(Config.RETRY_BUTTON))
-        return ImageProcessor.is_match_template(img, retry_button)
+        return self._check_template(img, Config.RETRY_BUTTON)
+
+
+class ThresholdLearner:
+    """由录制的会话学习各界面模板的匹配阈值
+    
+    录制时的状态变化给每一帧标上所处的状态，对每个状态的界面模板，在整张截图上匹配，
+    所处状态的帧作为正样本，其它帧作为负样本，阈值取负样本最高分数与正样本最低分数的中点；
+    没有正样本时取负样本最高分数加 Config.THRESHOLD_LEARN_MARGIN，且不低于默认阈值。
+    状态切换前后 Config.THRESHOLD_LEARN_GUARD 秒(加上该转换的发布延迟)内界面可能还没有切换完，
+    这些帧不作为切换涉及的两个状态的样本。
+    """
+    
+    @staticmethod
+    def label_frames(session: RecordedSession) -> List[Tuple[Dict[str, Any], FishState]]:
+        """按录制的状态变化为每一帧标上所处的状态，没有状态变化记录时返回空列表"""
+        if not session.states:
+            return []
+        labels = []
+        index = 0
+        state = FishState[session.states[0]['from']]
+        for frame in session.frames:
+            while index < len(session.states) and session.states[index]['seq'] <= frame['seq']:
+                state = FishState[session.states[index]['to']]
+                index += 1
+            labels.append((frame, state))
+        return labels
+    
+    @staticmethod
+    def _near_transition(session: RecordedSession, frame: Dict[str, Any], state: FishState) -> bool:
+        """帧是否在涉及该状态的切换前后"""
+        for record in session.states:
+            if state.name not in (record['from'], record['to']):
+                continue
+            delay = FishingStateManager.TRANSITION_DELAYS.get((FishState[record['from']], FishState[record['to']]), 0)
+            if abs(frame['t'] - record['t']) <= Config.THRESHOLD_LEARN_GUARD + delay:
+                return True
+        return False
+    
+    @staticmethod
+    def collect(session: RecordedSession, 
+                templates: TemplateRegistry) -> Dict[FishState, Tuple[List[float], List[float]]]:
+        """统计各状态界面模板的 (正样本分数, 负样本分数)"""
+        samples = {state: ([], []) for state in STATE_TEMPLATES}
+        for frame, label in ThresholdLearner.label_frames(session):
+            img = cv2.imread(str(session.path / frame['file']))
+            if img is None:
+                continue
+            for state, path in STATE_TEMPLATES.items():
+                if ThresholdLearner._near_transition(session, frame, state):
+                    continue
+                score, _ = PyramidMatcher.find(img, templates.get(path).color)
+                samples[state][0 if label == state else 1].append(score)
+        return samples
+    
+    @staticmethod
+    def threshold(positives: List[float], negatives: List[float]) -> Optional[float]:
+        """由样本分数计算阈值，没有样本或正负样本分数重叠时返回None"""
+        low, high = Config.THRESHOLD_LEARN_RANGE
+        negative = max(negatives, default=-1.0)
+        if positives:
+            positive = min(positives)
+            if positive <= negative:
+                return None
+            threshold = (positive + negative) / 2
+        elif negatives:
+            threshold = max(Config.MATCH_THRESHOLD, negative + Config.THRESHOLD_LEARN_MARGIN)
+        else:
+            return None
+        return float(min(high, max(low, threshold)))
+    
+    @staticmethod
+    def learn(session: RecordedSession, templates: TemplateRegistry) -> Dict[str, float]:
+        """学习各界面模板的阈值，返回 {模板名称: 阈值}，无法确定的模板不包含在内"""
+        thresholds = {}
+        for state, (positives, negatives) in ThresholdLearner.collect(session, templates).items():
+            name = STATE_TEMPLATES[state].stem
+            threshold = ThresholdLearner.threshold(positives, negatives)
+            summary = f"{name}: 正样本 {len(positives)} 帧"
+            if positives:
+                summary += f"，最低分数 {min(positives):.3f}"
+            summary += f"，负样本 {len(negatives)} 帧"
+            if negatives:
+                summary += f"，最高分数 {max(negatives):.3f}"
+            logging.info(f"{summary}，阈值: {'无法确定' if threshold is None else f'{threshold:.3f}'}")
+            if threshold is not None:
+                thresholds[name] = threshold
+        return thresholds
+
+
+class TimerWheel:
+    """哈希时间轮
+    
+    定时器按到期刻度散列到固定数量的槽位中，添加和取消都是O(1)，
+    每次推进只检查经过的刻度对应的槽位。只在动作线程中使用，不加锁。
+    """
+    
+    def __init__(self, tick: float = Config.TIMER_TICK, slots: int = Config.TIMER_SLOTS):
+        self.tick = tick
+        self._slots: List[Dict[Hashable, Tuple[int, Callable[[], None]]]] = [{} for _ in range(slots)]
+        self._timers: Dict[Hashable, int] = {}  # 定时器键 -> 到期刻度
+        self._current = int(time.monotonic() / tick)
+    
+    def schedule(self, delay: float, key: Hashable, callback: Callable[[], None]) -> None:
+        """在 delay 秒后执行回调，相同键的旧定时器会被替换"""
+        self.cancel(key)
+        due = max(math.ceil((time.monotonic() + delay) / self.tick), self._current + 1)
+        self._slots[due % len(self._slots)][key] = (due, callback)
+        self._timers[key] = due
+    
+    def cancel(self, key: Hashable) -> None:
+        """取消定时器"""
+        due = self._timers.pop(key, None)
+        if due is not None:
+            self._slots[due % len(self._slots)].pop(key, None)
+    
+    def next_deadline(self) -> Optional[float]:
+        """最近一个定时器的到期时间(time.monotonic)，没有定时器时返回None"""
+        if not self._timers:
+            return None
+        return min(self._timers.values()) * self.tick
+    
+    def expire(self) -> List[Callable[[], None]]:
+        """推进到当前时刻，返回所有到期的回调"""
+        now_tick = int(time.monotonic() / self.tick)
+        # 间隔超过一圈时每个槽位只需检查一次
+        start_tick = max(self._current + 1, now_tick - len(self._slots) + 1)
+        fired = []
+        for tick in range(start_tick, now_tick + 1):
+            slot = self._slots[tick % len(self._slots)]
+            for key, (due, callback) in list(slot.items()):
+                if due <= now_tick:
+                    del slot[key]
+                    del self._timers[key]
+                    fired.append(callback)
+        self._current = max(self._current, now_tick)
+        return fired
+
+
+class CaptureScheduler:
+    """按页面状态调节截图频率
+    
+    每个状态有目标帧率和可选的延迟预算：截图间隔取目标帧率对应的间隔，且不超过延迟预算减去近期的识别耗时，
+    保证界面变化后在预算时间内被识别。状态切换后的 Config.CAPTURE_BURST_DURATION 秒内以最高帧率截图，尽快确认新状态。
+    """
+    
+    def __init__(self, rates: Optional[Dict[str, float]] = None, budgets: Optional[Dict[str, float]] = None):
+        self.rates = {**Config.CAPTURE_RATES, **(rates or {})}
+        self.budgets = {**Config.CAPTURE_LATENCY_BUDGETS, **(budgets or {})}
+        self.burst_until = 0.0
+        self.processing_time = 0.0  # 识别一帧耗时的指数移动平均
+    
+    def on_state_change(self) -> None:
+        """状态切换后进入高帧率确认阶段"""
+        self.burst_until = time.monotonic() + Config.CAPTURE_BURST_DURATION
+    
+    def record_processing(self, seconds: float) -> None:
+        """记录一帧的识别耗时"""
+        self.processing_time += 0.2 * (seconds - self.processing_time)
+    
+    def interval(self, state: FishState) -> float:
+        """当前状态下距离下一次截图的间隔(秒)"""
+        if time.monotonic() < self.burst_until:
+            return Config.CAPTURE_INTERVAL
+        rate = self.rates.get(state.name)
+        interval = 1 / rate if rate else Config.CAPTURE_INTERVAL
+        budget = self.budgets.get(state.name)
+        if budget is not None:
+            interval = min(interval, budget - self.processing_time)
+        return max(Config.CAPTURE_INTERVAL, interval)
+
+
+class TimingTuner:
+    """钓鱼节奏参数的在线调整
+    
+    按 Config.TUNING_RANGES 的顺序每次调整一个参数(坐标轮换的爬山法)，先以当前参数钓
+    Config.TUNING_TRIAL_CYCLES 个周期作为基准，再把一个参数加或减一个步长试用同样多的周期，
+    平均钓鱼时间缩短超过 Config.TUNING_MIN_GAIN 时采用并保存到标定中，继续向同一方向调整，
+    否则恢复原值，换个方向或换下一个参数。试用期间有周期没有上鱼，或压力条变色的检查比例超过
+    Config.TUNING_MAX_PRESSURE_RATIO 时，视为压力失控，立即放弃试用的参数。
+    所有参数在两个方向上都连续没有改进时停止调整。补充鱼饵的周期和参数改变前开始的周期不计入。
+    """
+    
+    DEFAULTS = {
+        'fishing_click_interval': Config.FISHING_CLICK_INTERVAL,
+        'rod_retrieve_interval': Config.ROD_RETRIEVE_INTERVAL,
+        'pressure_backoff': Config.PRESSURE_BACKOFF,
+    }
+    
+    def __init__(self, config: GameConfig, executor: FishingActionExecutor):
+        self.config = config
+        self.executor = executor
+        self.names = list(Config.TUNING_RANGES)
+        self.base = {name: getattr(config, name) or self.DEFAULTS[name] for name in self.names}
+        self.base_cost: Optional[float] = None  # 当前参数的平均钓鱼时间(秒)，还没有测量时为None
+        self.index = 0  # 正在调整的参数
+        self.direction = 1  # 调整方向
+        self.trial: Optional[Tuple[str, float]] = None  # 正在试用的 (参数, 值)
+        self.samples: List[float] = []  # 当前参数或试用参数下各周期的钓鱼时间
+        self.rejects = 0  # 连续没有改进的次数
+        self.converged = False
+        self.since = time.time()  # 只统计该时间之后开始的周期
+        self._pressure = executor.pressure_counts()
+        self._lock = Lock()
+    
+    def _pressure_ratio(self) -> float:
+        """上一个周期结束以来压力条变色的检查比例"""
+        pressure = self.executor.pressure_counts()
+        checks = pressure[0] - self._pressure[0]
+        deviations = pressure[1] - self._pressure[1]
+        self._pressure = pressure
+        return deviations / checks if checks else 0.0
+    
+    def on_cycle(self, cycle: FishingCycle) -> None:
+        """一个钓鱼周期结束，由 SessionStats 调用"""
+        with self._lock:
+            pressure_ratio = self._pressure_ratio()
+            if self.converged or cycle.outcome == 'refill' or cycle.started < self.since:
+                return
+            stable = cycle.outcome == 'caught' and pressure_ratio <= Config.TUNING_MAX_PRESSURE_RATIO
+            if not stable:
+                logging.info(f"{self.config.window_title} 钓鱼周期不稳定: {cycle.outcome}，"
+                             f"压力过高比例 {pressure_ratio:.2f}")
+                if self.trial is not None:
+                    self._finish_trial(accepted=False)
+                return
+            self.samples.append(cycle.fishing)
+            if len(self.samples) < Config.TUNING_TRIAL_CYCLES:
+                return
+            cost = sum(self.samples) / len(self.samples)
+            if self.trial is None:
+                self.base_cost = cost
+                logging.info(f"{self.config.window_title} 当前节奏参数 {self.base}，平均钓鱼时间 {cost:.1f} s")
+                self._next_trial()
+            else:
+                self._finish_trial(accepted=cost < self.base_cost * (1 - Config.TUNING_MIN_GAIN), cost=cost)
+    
+    def _next_trial(self) -> None:
+        """试用下一组参数，在边界上无法再调整的方向直接跳过"""
+        while self.rejects < 2 * len(self.names):
+            name = self.names[self.index]
+            low, high, step = Config.TUNING_RANGES[name]
+            value = round(min(high, max(low, self.base[name] + self.direction * step)), 6)
+            if value != self.base[name]:
+                self._apply(name, value)
+                self.trial = (name, value)
+                return
+            self._turn()
+        self.converged = True
+        self._apply(None, None)
+        logging.info(f"{self.config.window_title} 节奏参数调整完成: {self.base}")
+    
+    def _finish_trial(self, accepted: bool, cost: Optional[float] = None) -> None:
+        """结束试用，采用时保存并继续向同一方向调整，否则恢复原值后换方向或参数"""
+        name, value = self.trial
+        self.trial = None
+        if accepted:
+            logging.info(f"{self.config.window_title} 采用 {name}={value:g}，"
+                         f"平均钓鱼时间 {self.base_cost:.1f} s -> {cost:.1f} s")
+            self.base[name] = value
+            self.base_cost = cost
+            self.rejects = 0
+            setattr(self.config, name, value)
+            CalibrationStore.update(self.config, name)
+        else:
+            logging.info(f"{self.config.window_title} 放弃 {name}={value:g}")
+            self._turn()
+        self._next_trial()
+    
+    def _turn(self) -> None:
+        """换个方向，两个方向都试过后换下一个参数"""
+        self.rejects += 1
+        if self.direction > 0:
+            self.direction = -1
+        else:
+            self.direction = 1
+            self.index = (self.index + 1) % len(self.names)
+    
+    def _apply(self, name: Optional[str], value: Optional[float]) -> None:
+        """使用基准参数，name 不为None时把其中一个参数换成试用值，重新开始统计"""
+        for key in self.names:
+            setattr(self.config, key, value if key == name else self.base[key])
+        if name == 'fishing_click_interval':
+            MouseController.limit_pause(value)
+        self.samples = []
+        self.since = time.time()
+
+
+class GameEventType(Enum):
+    """状态线程发给动作线程的事件类型"""
+    STATE_CHANGED = auto()  # 页面状态变化
+    NEW_FRAME = auto()      # 有新的截图
+    EXIT = auto()           # 退出
+
+
+@dataclass(frozen=True)
+class GameEvent:
+    """状态线程发给动作线程的事件"""
+    type: GameEventType
+    state: FishState  # 事件发出时的页面状态
+    frame_seq: int  # 事件对应的帧序号
+    version: int = 0  # 事件发出时的状态版本，见 StateSnapshot.version
 
 
 class FishingGame:
-    """钓鱼游戏主类"""
+    """钓鱼游戏主类，负责一个模拟器窗口"""
     
-    def __init__(self):
-        self.config = self._load_config()
-        self.position_detector = FishingPositionDetector(self.config)
-        self.action_executor = FishingActionExecutor(self.config)
+    def __init__(self, config: Optional[GameConfig] = None, 
+                 templates: Optional[TemplateRegistry] = None,
+                 vision_pool: Optional['VisionWorkerPool'] = None,
+                 frame_source: Optional[FrameSource] = None,
+                 recorder: Optional[SessionRecorder] = None,
+                 restore_state: bool = True):
+        self.config = self._load_config() if config is None else config
+        # 位置标定从标定存储中读取
+        CalibrationStore.load(self.config)
+        # 多实例时共享同一个模板注册表
+        templates = TemplateRegistry() if templates is None else templates
+        # 使用识别进程池时帧缓冲区分配在共享内存中
+        allocator = None if vision_pool is None else vision_pool.allocate
+        release = None if vision_pool is None else vision_pool.release
+        if frame_source is None:
+            frame_source = FrameSource.create(self.config.frame_source, self.config.window_size)
+        self.frame_source = frame_source
+        self.frame_bus = FrameBus(self.frame_source, self.config.window_size, allocator, release)
+        # 录制时每帧截图都写入会话
+        self.recorder = recorder
+        if recorder is not None:
+            recorder.record_header(self.config)
+            self.frame_bus.listeners.append(recorder.record_frame)
+        
+        current_frame = self.frame_bus.capture()
+        # 窗口与截取模板时大小不同时，模板按窗口内容的比例缩放
+        if self.config.template_scale is None:
+            self._calibrate_scale(current_frame.image, templates)
+        self.templates = templates.scaled(self.config.template_scale or 1.0)
+        if vision_pool is None:
+            self.vision = VisionJobs(self.templates)
+        else:
+            self.vision = vision_pool.scaled(self.templates.scale)
+        self.position_detector = FishingPositionDetector(self.config, self.templates, self.frame_bus, self.vision)
+        self.action_executor = FishingActionExecutor(self.config, self.templates, self.frame_bus, self.vision)
 
-        current_img = ImageProcessor.get_screenshot(self.config.window_size)
-        self.state_manager = FishingStateManager(current_img)
+        # 重启时先确认上次保存的状态
+        last_state = ConfigManager.load_state(self.config) if restore_state else None
+        self.state_manager = FishingStateManager(current_frame.image, self.templates, self.config, 
+                                                 self.vision, last_state, current_frame.seq)
+        # 动作线程已执行过一次性动作的状态，每个状态版本只执行一次
+        self.handled: Optional[StateSnapshot] = None
+        # 尚未写入状态快照的状态，在本状态的定时动作之后写入
+        self._unsaved_state: Optional[FishState] = None
+        self.stats = SessionStats(self.config)
+        # 调整后的点击间隔可能比默认值短，鼠标操作后的等待时间随之缩短
+        MouseController.limit_pause(self.action_executor.click_interval)
+        if self.config.auto_tune:
+            self.stats.listeners.append(TimingTuner(self.config, self.action_executor).on_cycle)
+        
+        # 状态线程通过事件队列唤醒动作线程，各状态的定时动作由时间轮驱动
+        self.events: queue.Queue[GameEvent] = queue.Queue()
+        # 截图频率随状态调整
+        self.capture_scheduler = CaptureScheduler(self.config.capture_rates, self.config.capture_latency_budgets)
+        self.timers = TimerWheel()
+        self._frame_event_pending = False
+        self.should_exit = False
+    
+    def _calibrate_scale(self, img: np.ndarray, templates: TemplateRegistry) -> None:
+        """搜索窗口内容相对模板的比例，匹配可靠时保存，并由其它分辨率的标定换算位置"""
+        scale, score = ScaleCalibrator.estimate(img, templates)
+        self.config.template_scale = scale
+        if score < Config.SCALE_SEARCH_THRESHOLD:
+            # 当前界面没有可靠匹配的模板，本次按窗口宽度估计，下次启动重新搜索
+            logging.warning(f"未能确定模板比例，按窗口宽度估计为 {scale:.3f}")
+            return
+        CalibrationStore.update(self.config, 'template_scale')
+        CalibrationStore.derive(self.config)
     
     def _load_config(self) -> GameConfig:
         """加载游戏配置"""
@@ -544,80 +1229,218 @@ class FishingGame:
             ConfigManager.write_yaml(config_dict)
         
         # 设置窗口大小
-        config_dict['window_size'] = Config.WINDOW_SIZE
+        for key in ConfigManager.RUNTIME_OPTIONS:
+            config_dict.pop(key, None)
+        config_dict['window_size'] = tuple(config_dict.get('window_size') or Config.WINDOW_SIZE)
         
         return GameConfig(**config_dict)
     
+    def stop(self) -> None:
+        """请求退出"""
+        self.should_exit = True
+    
+    def process_frame(self, frame: Frame) -> None:
+        """识别一帧截图，并把状态变化和新帧事件发给动作线程"""
+        old = self.state_manager.snapshot
+        Metrics.set_state(old.state)
+        start = time.perf_counter()
+        self.state_manager.update_state(frame.image, frame.seq)
+        self.capture_scheduler.record_processing(time.perf_counter() - start)
+        
+        snapshot = self.state_manager.snapshot
+        if snapshot.version != old.version:
+            self.stats.on_state(old, snapshot)
+            self.capture_scheduler.on_state_change()
+            self.frame_bus.wake()
+            if self.recorder is not None:
+                self.recorder.record_state(old.state, snapshot.state, frame.seq)
+            self.events.put(GameEvent(GameEventType.STATE_CHANGED, snapshot.state, frame.seq, snapshot.version))
+        elif not self._frame_event_pending:
+            # 动作线程未处理的新帧事件只保留一个
+            self._frame_event_pending = True
+            self.events.put(GameEvent(GameEventType.NEW_FRAME, snapshot.state, frame.seq, snapshot.version))
+    
+    def finish_recognition(self) -> None:
+        """识别结束，通知动作线程退出"""
+        old = self.state_manager.snapshot
+        snapshot = self.state_manager.publish(FishState.EXIT, self.frame_bus.latest.seq)
+        self.stats.on_state(old, snapshot)
+        self.events.put(GameEvent(GameEventType.EXIT, FishState.EXIT, snapshot.frame_seq, snapshot.version))
+    
+    def capture_interval(self) -> float:
+        """按当前状态决定的截图间隔，有等待发布的状态转换时在截止时间截图，有待确认的状态转换时以最高帧率截图"""
+        interval = self.capture_scheduler.interval(self.state_manager.current_state)
+        pending = self.state_manager.pending
+        if pending is not None:
+            return min(interval, max(0.0, pending[1] - time.time()))
+        if self.state_manager.voter.undecided:
+            return Config.CAPTURE_INTERVAL
+        return interval
+    
     def check_current_UI(self) -> None:
         """检查当前游戏界面状态"""
-        # 设置全局退出标志
-        self.should_exit = False
-        
-        # 添加热键监听器
-        keyboard.add_hotkey('esc', lambda: setattr(self, 'should_exit', True))
+        # 唯一的截图线程，状态机和动作线程都从帧总线读取
+        capture_thread = Thread(target=self.frame_bus.run, args=(lambda: self.should_exit, self.capture_interval))
+        capture_thread.start()
         
+        last_seq = self.frame_bus.latest.seq
         while not self.should_exit:
-            current_img = ImageProcessor.get_screenshot(self.config.window_size)
-            self.state_manager.update_state(current_img)
+            frame = self.frame_bus.wait_for(last_seq, timeout=0.5)
+            if frame is None:
+                continue
+            last_seq = frame.seq
+            self.process_frame(frame)
         
-        # 清理热键监听器
-        keyboard.remove_hotkey('esc')
-        self.state_manager.current_state = FishState.EXIT
+        capture_thread.join()
+        self.finish_recognition()
     
-    def _handle_state(self) -> None:
-        """处理当前状态"""
-        match self.state_manager.current_state:
-            case FishState.START_FISHING if self.state_manager.first_start_fishing:
+    def _handle_state(self, snapshot: StateSnapshot) -> None:
+        """处理状态的一次性动作"""
+        match snapshot.state:
+            case FishState.START_FISHING:
                 if not self.config.start_fishing_pos:
                     self.position_detector.detect_start_fishing_pos()
                 self.action_executor.handle_default_state()
-                self.state_manager.first_start_fishing = False
             
-            case FishState.CAST_ROD if self.state_manager.first_cast_rod:
+            case FishState.CAST_ROD:
                 self.action_executor.handle_cast_rod_state()
-                self.state_manager.first_cast_rod = False
-                self.state_manager.first_retry = True
             
-            case FishState.NO_BAIT if self.state_manager.first_no_bait:
+            case FishState.NO_BAIT:
                 if not self.config.use_bait_button_pos:
                     self.position_detector.detect_use_button_pos()
                 self.action_executor.handle_no_bait_state()
-                self.state_manager.first_no_bait = False
-                self.state_manager.first_cast_rod = True
-            
-            case FishState.CATCH_FISH:
-                self.action_executor.handle_catch_fish_state()
             
-            case FishState.FISHING:
-                if not self.config.rod_position or not self.config.pressure_indicator_pos:
-                    self.position_detector.detect_fishing_positions()
-                self.action_executor.handle_ongoing_fishing()
-            
-            case FishState.END_FISHING if self.state_manager.first_retry:
+            case FishState.END_FISHING:
                 if not self.config.retry_button_center:
                     self.position_detector.detect_retry_button_pos()
                 self.action_executor.handle_end_fishing_state()
-                self.state_manager.reset_state_flags()
-                self.state_manager.first_retry = False
             
-            case FishState.INSTANT_KILL if self.state_manager.first_instant_kill:
+            case FishState.INSTANT_KILL:
                 if not self.config.direction_icon_positions:
                     self.position_detector.detect_direction_icons()
-                self.action_executor.handle_direction_sequence()
-                self.state_manager.first_instant_kill = False
+                # 识别线程发布了新的状态后停止重试
+                self.action_executor.handle_direction_sequence(
+                    lambda: self.state_manager.snapshot.version == snapshot.version and not self.should_exit)
+    
+    def _enter_state(self, snapshot: StateSnapshot) -> None:
+        """进入新状态: 取消上一状态的定时动作，执行一次性动作并安排本状态的定时动作"""
+        if self.handled is not None and self.handled.version == snapshot.version:
+            return
+        self.handled = snapshot
+        for key in ('catch_fish_click', 'fishing_click', 'rod_retrieve'):
+            self.timers.cancel(key)
+        self._handle_state(snapshot)
+        
+        match snapshot.state:
+            case FishState.CATCH_FISH:
+                self.timers.schedule(0, 'catch_fish_click', self._catch_fish_tick)
+            
+            case FishState.FISHING:
+                if not self.config.rod_position or not self.config.pressure_indicator_pos:
+                    self.position_detector.detect_fishing_positions()
+                retrieve_delay = (self.action_executor.rod_retrieve_time 
+                                  + self.action_executor.retrieve_interval - time.time())
+                self.timers.schedule(0, 'fishing_click', self._fishing_click_tick)
+                self.timers.schedule(max(0, retrieve_delay), 'rod_retrieve', self._rod_retrieve_tick)
+        
+        # 状态快照只在重启时使用，写文件安排在本状态的首次定时动作之后，不推迟点击
+        self._unsaved_state = snapshot.state
+        self.timers.schedule(0, 'save_state', self._save_state_tick)
+    
+    def _save_state_tick(self) -> None:
+        """写入状态快照，状态连续变化时只写入最新的状态"""
+        if self._unsaved_state is not None:
+            ConfigManager.save_state(self.config, self._unsaved_state)
+            self._unsaved_state = None
+    
+    def _catch_fish_tick(self) -> None:
+        """捕鱼状态下按间隔点击"""
+        self.action_executor.handle_catch_fish_state()
+        self.timers.schedule(self.action_executor.catch_fish_interval, 'catch_fish_click', self._catch_fish_tick)
+    
+    def _fishing_click_tick(self) -> None:
+        """钓鱼状态下按间隔检查压力并点击"""
+        delay = self.action_executor.handle_fishing_click()
+        self.timers.schedule(delay, 'fishing_click', self._fishing_click_tick)
+    
+    def _rod_retrieve_tick(self) -> None:
+        """钓鱼状态下按间隔收杆"""
+        self.action_executor.handle_rod_retrieve()
+        self.timers.schedule(self.action_executor.retrieve_interval, 'rod_retrieve', self._rod_retrieve_tick)
+    
+    def _flush_stats_tick(self) -> None:
+        """定期写入钓鱼统计和位置标定"""
+        self.stats.flush()
+        CalibrationStore.flush()
+        self.timers.schedule(Config.STATS_FLUSH_INTERVAL, 'stats_flush', self._flush_stats_tick)
+    
+    def _handle_event(self, event: GameEvent) -> None:
+        """处理状态线程发来的事件"""
+        snapshot = self.state_manager.snapshot
+        match event.type:
+            case GameEventType.STATE_CHANGED:
+                # 之后已发布新的状态时，跳过已过期的状态
+                if event.version == snapshot.version:
+                    self._enter_state(snapshot)
+            case GameEventType.NEW_FRAME:
+                self._frame_event_pending = False
+                if event.version == snapshot.version and snapshot.state == FishState.FISHING:
+                    self.action_executor.check_rod_movement()
+    
+    def _wait_event(self) -> Optional[GameEvent]:
+        """阻塞等待事件，最迟在下一个定时器到期时返回"""
+        deadline = self.timers.next_deadline()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def run_actions(self) -> None:
+        """动作线程主循环，直到收到退出事件"""
+        self._enter_state(self.state_manager.snapshot)
+        self.timers.schedule(Config.STATS_FLUSH_INTERVAL, 'stats_flush', self._flush_stats_tick)
+        while True:
+            event = self._wait_event()
+            if event is not None and event.type == GameEventType.EXIT:
+                break
+            Metrics.set_state(self.state_manager.current_state)
+            # 先处理事件，状态变化时上一状态的定时动作会被取消
+            if event is not None:
+                self._handle_event(event)
+            for callback in self.timers.expire():
+                callback()
+        
+        self._save_state_tick()
+        self.stats.flush()
+        CalibrationStore.flush()
+        self.frame_source.close()
+        # 识别线程已经结束，释放帧缓冲区，使用识别进程池时共享内存随之释放
+        self.frame_bus.close()
 
-    def run(self) -> None:
-        """运行游戏主循环"""
+    def run(self, exit_hotkey: bool = True) -> None:
+        """运行游戏主循环
+        
+        Args:
+            exit_hotkey: 是否注册 esc 退出热键，无界面回放时不注册
+        """
         try:
-            pyautogui.PAUSE = Config.FISHING_CLICK_INTERVAL / 2
             WindowManager.handle_window(self.config)
+            if exit_hotkey:
+                import keyboard
+                # 添加热键监听器
+                keyboard.add_hotkey('esc', self.stop)
+                keyboard.add_hotkey(Config.METRICS_HOTKEY, Metrics.toggle)
             state_check_thread = Thread(target=self.check_current_UI)
             state_check_thread.start()
             
-            while self.state_manager.current_state != FishState.EXIT:
-                self._handle_state()
+            self.run_actions()
             
-            ConfigManager.write_yaml(self.config.__dict__)
+            state_check_thread.join()
+            if exit_hotkey:
+                # 清理热键监听器
+                keyboard.remove_hotkey('esc')
+                keyboard.remove_hotkey(Config.METRICS_HOTKEY)
             logging.info("游戏结束")
             
         except Exception as e:
@@ -625,14 +1448,191 @@ class FishingGame:
             raise
 
 
+class FishingSupervisor:
+    """多实例调度器，在一个进程中驱动多个模拟器窗口
+    
+    所有实例共享模板注册表和识别线程池。一个采集线程按轮转顺序为各实例截图，
+    上一帧仍在识别的实例本轮跳过，识别任务提交到线程池执行；采集线程睡眠到最近的截图时间，
+    有识别任务完成或请求退出时提前唤醒。每个实例有自己的动作线程，
+    鼠标操作由 MouseController 的输入线程按优先级串行执行。
+    """
+    
+    def __init__(self, configs: List[GameConfig], 
+                 templates: Optional[TemplateRegistry] = None,
+                 vision_pool: Optional['VisionWorkerPool'] = None,
+                 frame_sources: Optional[List[FrameSource]] = None,
+                 restore_state: bool = True):
+        self.templates = TemplateRegistry() if templates is None else templates
+        # 识别线程池执行各实例的状态识别，配置了识别进程池时匹配计算再交给工作进程
+        self.recognition_pool = ThreadPoolExecutor(max_workers=Config.VISION_WORKERS, thread_name_prefix='vision')
+        # 未指定截图来源时按各实例配置的 frame_source 创建
+        frame_sources = [None] * len(configs) if frame_sources is None else frame_sources
+        self.sessions = [FishingGame(config, self.templates, vision_pool, source, restore_state=restore_state) 
+                         for config, source in zip(configs, frame_sources)]
+        self.should_exit = False
+        self._wakeup = Event()  # 识别任务完成或请求退出时唤醒采集线程
+    
+    @staticmethod
+    def load_configs() -> List[GameConfig]:
+        """读取配置文件中的多实例配置
+        
+        配置文件中的 instances 可以是实例列表，每项包含 window_title 和可选的 window_size，
+        未指定 window_size 时使用窗口当前的位置和大小；也可以是字符串 auto，
+        自动发现所有标题以 window_title 开头的窗口。没有配置多实例时返回空列表。
+        """
+        if not Config.CONFIG_FILE.exists():
+            return []
+        config_dict = ConfigManager.read_yaml() or {}
+        instances = config_dict.get('instances')
+        if not instances:
+            return []
+        
+        if instances == 'auto':
+            discovered = WindowManager.discover_windows(config_dict.get('window_title', Config.WINDOW_TITLE))
+            instances = [{'window_title': title, 'window_size': size} for title, size in discovered]
+        
+        configs = []
+        for instance in instances:
+            title = instance['window_title']
+            window_size = instance.get('window_size')
+            if window_size is None:
+                hwnd = WindowManager.find_window(title)
+                if not hwnd:
+                    raise ValueError(f"未找到标题为 {title} 的窗口")
+                left, top, right, bottom = WindowManager.get_window_rect(hwnd)
+                window_size = (left, top, right - left, bottom - top)
+            
+            # 各实例的位置标定单独保存
+            path = ConfigManager.instance_config_path(title)
+            saved = ConfigManager.read_yaml(path) if path.exists() else {}
+            saved.update(window_title=title, window_size=tuple(window_size), config_path=str(path))
+            # 自动调整可以按实例开启，未指定时沿用顶层的设置
+            saved.setdefault('auto_tune', instance.get('auto_tune', config_dict.get('auto_tune', False)))
+            configs.append(GameConfig(**saved))
+        logging.info(f"共配置 {len(configs)} 个实例: {[c.window_title for c in configs]}")
+        return configs
+    
+    def stop(self) -> None:
+        """请求所有实例退出"""
+        self.should_exit = True
+        for session in self.sessions:
+            session.stop()
+        self._wakeup.set()
+    
+    def _capture_loop(self) -> None:
+        """按轮转顺序为各实例截图并提交识别任务"""
+        in_flight: List[Optional[Future]] = [None] * len(self.sessions)
+        # 各实例按自己当前状态的截图频率决定下一次截图时间
+        next_capture = [0.0] * len(self.sessions)
+        start_index = 0
+        while not self.should_exit:
+            # 先清除再检查，检查期间完成的识别任务会让下面的等待立即返回
+            self._wakeup.clear()
+            for offset in range(len(self.sessions)):
+                index = (start_index + offset) % len(self.sessions)
+                session = self.sessions[index]
+                future = in_flight[index]
+                if future is not None:
+                    if not future.done():
+                        continue
+                    if future.exception() is not None:
+                        logging.error(f"实例 {session.config.window_title} 识别出错: {future.exception()}")
+                    in_flight[index] = None
+                    # 识别后状态可能已切换，按新状态重新安排截图时间
+                    next_capture[index] = session.frame_bus.latest.timestamp + session.capture_interval()
+                if time.time() < next_capture[index]:
+                    continue
+                frame = session.frame_bus.capture()
+                in_flight[index] = self.recognition_pool.submit(session.process_frame, frame)
+                in_flight[index].add_done_callback(lambda _: self._wakeup.set())
+            # 每轮换一个实例先截图，避免总是同一个实例排在最后
+            start_index = (start_index + 1) % len(self.sessions)
+            # 睡眠到没有识别任务的实例中最近的截图时间，所有实例都在识别时等待任务完成
+            deadlines = [next_capture[index] for index in range(len(self.sessions)) if in_flight[index] is None]
+            self._wakeup.wait(max(0.0, min(deadlines) - time.time()) if deadlines else None)
+        
+        for future in in_flight:
+            if future is not None:
+                future.exception()
+        for session in self.sessions:
+            session.finish_recognition()
+    
+    def run(self, exit_hotkey: bool = True) -> None:
+        """运行所有实例
+        
+        Args:
+            exit_hotkey: 是否注册 esc 退出热键，无界面运行时不注册
+        """
+        try:
+            for session in self.sessions:
+                WindowManager.handle_window(session.config)
+            if exit_hotkey:
+                import keyboard
+                keyboard.add_hotkey('esc', self.stop)
+                keyboard.add_hotkey(Config.METRICS_HOTKEY, Metrics.toggle)
+            
+            action_threads = [Thread(target=session.run_actions) for session in self.sessions]
+            for thread in action_threads:
+                thread.start()
+            self._capture_loop()
+            for thread in action_threads:
+                thread.join()
+            
+            if exit_hotkey:
+                keyboard.remove_hotkey('esc')
+                keyboard.remove_hotkey(Config.METRICS_HOTKEY)
+            self.recognition_pool.shutdown()
+            logging.info("所有实例已结束")
+            
+        except Exception as e:
+            logging.error(f"多实例运行出错: {str(e)}")
+            raise
+
+
 def main():
     """主函数"""
+    Config.init()
+    vision_pool = None
+    recorder = None
+    exporter = None
     try:
-        game = FishingGame()
-        game.run()
+        options = (ConfigManager.read_yaml() or {}) if Config.CONFIG_FILE.exists() else {}
+        # 配置 metrics: true 时从启动开始统计耗时，运行中可以按热键开关
+        if options.get('metrics'):
+            Metrics.enable()
+        exporter = MetricsExporter(port=options.get('metrics_port'))
+        exporter.start()
+        # 配置 input_backend 选择鼠标输入方式，默认 pyautogui
+        input_backend = InputBackend.create(options.get('input_backend', 'pyautogui'))
+        MouseController.use(input_backend)
+        templates = TemplateRegistry()
+        # 配置 vision_pool: process 时使用多进程识别
+        if options.get('vision_pool') == 'process':
+            from vision_pool import VisionWorkerPool
+            vision_pool = VisionWorkerPool(templates)
+        
+        configs = FishingSupervisor.load_configs()
+        if configs:
+            if options.get('record_session'):
+                logging.warning("多实例时不支持录制会话，已忽略 record_session")
+            FishingSupervisor(configs, templates, vision_pool).run()
+        else:
+            # 配置 record_session: <目录> 时录制截图、鼠标操作和状态变化
+            if options.get('record_session'):
+                recorder = SessionRecorder(Path(options['record_session']))
+                MouseController.use(RecordingInputBackend(input_backend, recorder))
+            game = FishingGame(templates=templates, vision_pool=vision_pool, recorder=recorder)
+            game.run()
     except Exception as e:
         logging.error(f"程序运行出错: {str(e)}")
         raise
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        if recorder is not None:
+            recorder.close()
+        if vision_pool is not None:
+            vision_pool.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,281 @@
+"""耗时统计
+
+Metrics 按状态记录各项检查和鼠标操作的耗时直方图，MetricsExporter 通过 HTTP 导出。
+"""
+import os
+import json
+import math
+import functools
+import time
+from threading import Thread, Condition, Lock, local
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any, Callable, TYPE_CHECKING
+from setting import Config
+from common import FishState
+import logging
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+class LatencyHistogram:
+    """HDR 风格的耗时直方图
+    
+    以微秒为单位，小于128微秒的值每微秒一个桶，更大的值按二进制数量级划分，每个数量级64个桶，
+    相对误差不超过1/64。记录是O(1)的，占用内存固定。
+    """
+    
+    SUB_BITS = 7
+    SUB_COUNT = 1 << SUB_BITS
+    HALF_COUNT = SUB_COUNT // 2
+    MAX_SHIFT = 32  # 可记录的最大值约为 2^39 微秒
+    
+    def __init__(self):
+        self.counts = [0] * (self.SUB_COUNT + self.MAX_SHIFT * self.HALF_COUNT)
+        self.count = 0
+        self.total = 0  # 微秒
+        self.max = 0  # 微秒
+        self._lock = Lock()
+    
+    @classmethod
+    def _index(cls, micros: int) -> int:
+        """数值所在的桶"""
+        if micros < cls.SUB_COUNT:
+            return micros
+        shift = micros.bit_length() - cls.SUB_BITS
+        return cls.SUB_COUNT + (shift - 1) * cls.HALF_COUNT + (micros >> shift) - cls.HALF_COUNT
+    
+    @classmethod
+    def _value(cls, index: int) -> int:
+        """桶中数值的中点"""
+        if index < cls.SUB_COUNT:
+            return index
+        shift, offset = divmod(index - cls.SUB_COUNT, cls.HALF_COUNT)
+        shift += 1
+        return ((offset + cls.HALF_COUNT) << shift) + (1 << (shift - 1))
+    
+    def record(self, seconds: float) -> None:
+        """记录一次耗时"""
+        micros = max(0, int(seconds * 1_000_000))
+        index = min(self._index(micros), len(self.counts) - 1)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += micros
+            if micros > self.max:
+                self.max = micros
+    
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """累加另一个直方图"""
+        with other._lock:
+            counts, count, total, maximum = list(other.counts), other.count, other.total, other.max
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.count += count
+            self.total += total
+            self.max = max(self.max, maximum)
+    
+    def percentile(self, q: float) -> float:
+        """耗时的分位数(秒)，q 取 0~100"""
+        if self.count == 0:
+            return 0.0
+        target = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= target:
+                return min(self._value(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+    
+    def summary(self) -> Dict[str, float]:
+        """次数、平均值、分位数和最大值，耗时单位为毫秒"""
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count / 1000, 3),
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p90_ms': round(self.percentile(90) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'p999_ms': round(self.percentile(99.9) * 1000, 3),
+            'max_ms': round(self.max / 1000, 3),
+        }
+
+
+class Metrics:
+    """热路径耗时统计
+    
+    按操作和所处的 FishState 分别记录耗时直方图。关闭时被 timed 装饰的函数只多一次标志检查，
+    可以在运行时随时开关。所处状态按线程记录，由状态线程和动作线程在处理前通过 set_state 设置。
+    """
+    
+    enabled = False
+    _histograms: Dict[Tuple[str, Optional[FishState]], LatencyHistogram] = {}
+    _lock = Lock()
+    _context = local()
+    
+    @staticmethod
+    def enable() -> None:
+        """开启统计"""
+        Metrics.enabled = True
+        logging.info("已开启耗时统计")
+    
+    @staticmethod
+    def disable() -> None:
+        """关闭统计，已记录的数据保留"""
+        Metrics.enabled = False
+        logging.info("已关闭耗时统计")
+    
+    @staticmethod
+    def toggle() -> None:
+        """切换统计开关"""
+        if Metrics.enabled:
+            Metrics.disable()
+        else:
+            Metrics.enable()
+    
+    @staticmethod
+    def set_state(state: Optional[FishState]) -> None:
+        """设置当前线程所处的状态，之后的耗时记录在该状态下"""
+        Metrics._context.state = state
+    
+    @staticmethod
+    def current_state() -> Optional[FishState]:
+        """当前线程所处的状态"""
+        return getattr(Metrics._context, 'state', None)
+    
+    @staticmethod
+    def record(operation: str, seconds: float) -> None:
+        """记录一次操作耗时"""
+        key = (operation, Metrics.current_state())
+        histogram = Metrics._histograms.get(key)
+        if histogram is None:
+            with Metrics._lock:
+                histogram = Metrics._histograms.setdefault(key, LatencyHistogram())
+        histogram.record(seconds)
+    
+    @staticmethod
+    def timed(operation: Optional[str] = None) -> Callable[[Callable], Callable]:
+        """装饰器，统计函数耗时，operation 默认为函数名"""
+        def decorator(func: Callable) -> Callable:
+            name = operation or func.__name__
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not Metrics.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    Metrics.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+    
+    @staticmethod
+    def snapshot() -> Dict[str, Any]:
+        """导出各操作的汇总统计和按状态划分的统计"""
+        with Metrics._lock:
+            items = list(Metrics._histograms.items())
+        operations: Dict[str, Dict[str, Any]] = {}
+        totals: Dict[str, LatencyHistogram] = {}
+        for (operation, state), histogram in sorted(items, key=lambda item: (item[0][0], str(item[0][1]))):
+            entry = operations.setdefault(operation, {'states': {}})
+            entry['states'][state.name if state is not None else 'NONE'] = histogram.summary()
+            totals.setdefault(operation, LatencyHistogram()).merge(histogram)
+        for operation, histogram in totals.items():
+            operations[operation]['all'] = histogram.summary()
+        return {'time': time.time(), 'enabled': Metrics.enabled, 'operations': operations}
+    
+    @staticmethod
+    def reset() -> None:
+        """清空已记录的数据"""
+        with Metrics._lock:
+            Metrics._histograms = {}
+
+
+class MetricsExporter:
+    """定期把耗时统计写入文件，可选地在本机端口提供 HTTP 查询
+    
+    GET /metrics 返回 JSON 格式的统计，GET /metrics/enable 和 /metrics/disable 在运行时开关统计。
+    """
+    
+    def __init__(self, path: Path = Config.METRICS_FILE, 
+                 port: Optional[int] = None, 
+                 interval: float = Config.METRICS_EXPORT_INTERVAL):
+        self.path = Path(path)
+        self.port = port
+        self.interval = interval
+        self._stopped = Condition()
+        self._should_stop = False
+        self._thread: Optional[Thread] = None
+        self._server: Optional['ThreadingHTTPServer'] = None
+    
+    def _make_handler(self) -> type:
+        """创建 HTTP 请求处理类"""
+        from http.server import BaseHTTPRequestHandler
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                match self.path:
+                    case '/metrics/enable':
+                        Metrics.enable()
+                    case '/metrics/disable':
+                        Metrics.disable()
+                    case '/metrics':
+                        pass
+                    case _:
+                        self.send_error(404)
+                        return
+                body = json.dumps(Metrics.snapshot(), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format: str, *args) -> None:
+                # 不把每次请求写入日志
+                pass
+        return Handler
+    
+    def start(self) -> None:
+        """启动定期导出线程和 HTTP 服务"""
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        if self.port is not None:
+            from http.server import ThreadingHTTPServer
+            self._server = ThreadingHTTPServer(('127.0.0.1', self.port), self._make_handler())
+            Thread(target=self._server.serve_forever, daemon=True).start()
+            logging.info(f"耗时统计: http://127.0.0.1:{self.port}/metrics")
+    
+    def write(self) -> None:
+        """把当前统计写入文件，先写临时文件再替换"""
+        snapshot = Metrics.snapshot()
+        if not snapshot['operations']:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix('.tmp')
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(temp, self.path)
+    
+    def _run(self) -> None:
+        """定期导出"""
+        with self._stopped:
+            while not self._should_stop:
+                self._stopped.wait(self.interval)
+                if Metrics.enabled:
+                    self.write()
+    
+    def stop(self) -> None:
+        """停止导出，并写入最后一次统计"""
+        with self._stopped:
+            self._should_stop = True
+            self._stopped.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self.write()
@@ -0,0 +1,223 @@
+"""录制会话回放
+
+在无界面环境下把录制的会话重新送入状态机、界面识别和动作执行，窗口和鼠标使用假的后端，
+统计识别的每秒帧数、各项检查的耗时分位数和状态切换延迟，并与录制时的状态和操作对比。
+
+录制: 在 config.yaml 中设置 record_session: <会话目录> 后正常运行 main.py。
+
+用法:
+    python replay.py <会话目录> [--speed S]
+
+speed 为回放倍速，为0时不按录制时间等待，每一帧识别完成后立即送入下一帧，不跳帧。
+"""
+import argparse
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Event, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from calibration import CalibrationStore
+from capture import FakeWindowBackend, RecordedSession, ReplayFrameSource, WindowManager
+from inputs import MouseController, RecordingInputBackend
+from main import FishingGame, GameEvent, GameEventType
+from setting import Config
+from stats import SessionStats, load as load_stats
+
+
+class LockstepFrameSource(ReplayFrameSource):
+    """逐帧回放时，状态线程处理完上一帧后才送入下一帧"""
+
+    def __init__(self, path: Path, window_size: Tuple[int, int, int, int]):
+        super().__init__(path, window_size, speed=0)
+        self.ready = Event()
+        self.ready.set()
+
+    def grab(self, region, out=None):
+        while not self.ready.wait(0.1):
+            if self.finished:
+                break
+        self.ready.clear()
+        return super().grab(region, out)
+
+
+@dataclass
+class ReplayReport:
+    """回放结果"""
+    duration: float = 0.0  # 回放耗时(秒)
+    update_latencies: List[float] = field(default_factory=list)  # 每帧 update_state 耗时(秒)
+    check_latencies: Dict[str, List[float]] = field(default_factory=dict)  # 各项检查的耗时(秒)
+    transition_latencies: List[Tuple[str, float]] = field(default_factory=list)  # (新状态, 截图到动作线程开始处理的延迟)
+    states: List[str] = field(default_factory=list)  # 回放时的状态变化
+    recorded_states: List[str] = field(default_factory=list)  # 录制时的状态变化
+    actions: Counter = field(default_factory=Counter)  # 回放时各类鼠标操作的次数
+    recorded_actions: Counter = field(default_factory=Counter)  # 录制时各类鼠标操作的次数
+    skipped_frames: int = 0  # 画面未变化而跳过识别的帧数
+    first_action: Optional[float] = None  # 从创建游戏实例到第一次鼠标操作的时间(秒)
+    cycles: List[Dict] = field(default_factory=list)  # 回放时记录的钓鱼周期
+
+    @property
+    def frames(self) -> int:
+        return len(self.update_latencies)
+
+
+def percentiles(values: List[float]) -> str:
+    """格式化耗时的分位数(毫秒)"""
+    if not values:
+        return "无数据"
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+    return f"p50 {p50:.2f} ms, p90 {p90:.2f} ms, p99 {p99:.2f} ms, max {max(values) * 1000:.2f} ms (n={len(values)})"
+
+
+def _timed(func: Callable, samples: List[float]) -> Callable:
+    """包装函数，把每次调用的耗时追加到 samples"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+
+def _instrument(game: FishingGame, report: ReplayReport) -> None:
+    """在游戏实例上挂载计时"""
+    state_manager = game.state_manager
+    recognizer = state_manager.ui_recognizer
+    state_manager.update_state = _timed(state_manager.update_state, report.update_latencies)
+    state_manager._classify = _timed(state_manager._classify, report.check_latencies.setdefault('classify', []))
+
+    check_template = recognizer._check_template
+
+    def timed_check(img, path, *args, **kwargs):
+        samples = report.check_latencies.setdefault(Path(path).stem, [])
+        return _timed(check_template, samples)(img, path, *args, **kwargs)
+    recognizer._check_template = timed_check
+
+    # 记录每帧的截图时间，用于计算状态切换延迟
+    frame_times: Dict[int, float] = {}
+    game.frame_bus.listeners.append(lambda frame: frame_times.__setitem__(frame.seq, frame.timestamp))
+    handle_event = game._handle_event
+
+    def timed_handle_event(event: GameEvent) -> None:
+        if event.type == GameEventType.STATE_CHANGED and event.frame_seq in frame_times:
+            report.states.append(event.state.name)
+            report.transition_latencies.append((event.state.name, time.time() - frame_times[event.frame_seq]))
+        handle_event(event)
+    game._handle_event = timed_handle_event
+
+
+def replay_session(path: Path, speed: float = 1.0) -> ReplayReport:
+    """回放会话并返回统计结果
+
+    Args:
+        path: 会话目录
+        speed: 回放倍速，为0时逐帧回放，每一帧识别完成后立即送入下一帧
+    """
+    session = RecordedSession.load(path)
+    config = session.game_config()
+    # 位置标定、状态快照和钓鱼统计写入临时目录，不覆盖实际的数据
+    workdir = tempfile.TemporaryDirectory()
+    config.config_path = str(Path(workdir.name) / 'replay_config.yaml')
+    CalibrationStore.use(Path(workdir.name) / 'calibration')
+    SessionStats.use(Path(workdir.name) / 'stats.sqlite')
+
+    WindowManager.use(FakeWindowBackend({config.window_title: config.window_size}))
+    input_backend = RecordingInputBackend()
+    MouseController.use(input_backend)
+
+    report = ReplayReport()
+    report.recorded_states = [record['to'] for record in session.states]
+    report.recorded_actions = Counter(record['action'] for record in session.actions)
+
+    if speed > 0:
+        source = ReplayFrameSource(Path(path), config.window_size, speed)
+    else:
+        source = LockstepFrameSource(Path(path), config.window_size)
+    created = time.time()
+    # 每次回放都从会话开头识别，不沿用上次回放结束时的状态
+    game = FishingGame(config, frame_source=source, restore_state=False)
+    _instrument(game, report)
+    if isinstance(source, LockstepFrameSource):
+        # 状态线程开始等待下一帧时才允许截取下一帧
+        wait_for = game.frame_bus.wait_for
+
+        def lockstep_wait_for(after_seq: int, timeout=None):
+            if after_seq >= game.frame_bus.latest.seq:
+                source.ready.set()
+            return wait_for(after_seq, timeout)
+        game.frame_bus.wait_for = lockstep_wait_for
+    processed = [0]  # 已识别的最新帧序号
+    process_frame = game.process_frame
+
+    def tracked_process_frame(frame) -> None:
+        process_frame(frame)
+        processed[0] = frame.seq
+    game.process_frame = tracked_process_frame
+
+    start = time.perf_counter()
+    thread = Thread(target=game.run, kwargs={'exit_hotkey': False})
+    thread.start()
+    while not source.finished and thread.is_alive():
+        time.sleep(0.05)
+    # 等待最后一帧识别完成
+    latest = game.frame_bus.latest
+    last_seq = latest.seq if latest is not None else 0
+    while thread.is_alive() and processed[0] < last_seq:
+        time.sleep(0.05)
+    game.stop()
+    thread.join()
+    MouseController.flush()
+    report.duration = time.perf_counter() - start
+    report.actions = Counter(action for _, action, _ in input_backend.actions)
+    if input_backend.actions:
+        report.first_action = input_backend.actions[0][0] - created
+    report.skipped_frames = game.state_manager.skipped_frames
+    if SessionStats.path.exists():
+        report.cycles = load_stats(SessionStats.path).get(config.window_title, {}).get('cycles', [])
+    workdir.cleanup()
+    return report
+
+
+def print_report(report: ReplayReport) -> None:
+    """输出回放统计"""
+    print(f"回放 {report.frames} 帧，耗时 {report.duration:.2f} s，识别 {report.frames / report.duration:.1f} fps")
+    if report.update_latencies:
+        print(f"识别能力上限: {len(report.update_latencies) / sum(report.update_latencies):.1f} fps")
+    print(f"update_state: {percentiles(report.update_latencies)}")
+    print(f"画面未变化跳过识别: {report.skipped_frames} 帧")
+    if report.first_action is not None:
+        print(f"启动到第一次鼠标操作: {report.first_action * 1000:.1f} ms")
+    for name, samples in sorted(report.check_latencies.items()):
+        print(f"  {name}: {percentiles(samples)}")
+
+    print(f"状态切换延迟: {percentiles([latency for _, latency in report.transition_latencies])}")
+    for state, latency in report.transition_latencies:
+        print(f"  -> {state}: {latency * 1000:.1f} ms")
+
+    print(f"录制时状态变化: {' -> '.join(report.recorded_states) or '无'}")
+    print(f"回放时状态变化: {' -> '.join(report.states) or '无'}")
+    if report.states != report.recorded_states:
+        print("警告: 回放时的状态变化与录制时不一致")
+    print(f"录制时鼠标操作: {dict(report.recorded_actions)}")
+    print(f"回放时鼠标操作: {dict(report.actions)}")
+    for cycle in report.cycles:
+        print(f"钓鱼周期: {cycle['outcome']}，耗时 {cycle['duration']:.1f} s，钓鱼 {cycle['fishing']:.1f} s")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="录制会话回放")
+    parser.add_argument("session", help="会话目录")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，为0时逐帧回放")
+    args = parser.parse_args()
+    Config.init()
+    print_report(replay_session(Path(args.session), args.speed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 import os
 import sys
+import json
+import hashlib
 import logging
 from enum import Enum
 from pathlib import Path
@@ -9,18 +11,118 @@ class Config:
     """配置类，管理所有配置项"""
     
     # 窗口配置
-    WINDOW_SIZE: Final[tuple[int, int, int, int]] = (163, 33, 1602, 946)
+    WINDOW_SIZE: Final[tuple[int, int, int, int]] = (163, 33, 1602, 946) # config.yaml 中没有指定 window_size 时使用的窗口位置和大小
     WINDOW_TITLE: Final[str] = "雷电模拟器"
     
     # 游戏配置
     ROD_RETRIEVE_INTERVAL: Final[int] = 14 # 钓鱼时收杆的间隔
     FISHING_CLICK_INTERVAL: Final[float] = 0.08 # 钓鱼时点击的间隔
+    PRESSURE_BACKOFF: Final[float] = 3 # 压力条变色后暂停点击的时间，为点击间隔的倍数
+    FISHING_READY_DELAY: Final[float] = 2 # 识别到钓鱼界面后，等待挥杆等界面元素重置再切换到钓鱼状态的时间(秒)
+    
+    # 输入配置
+    INPUT_PAUSE: Final[float] = FISHING_CLICK_INTERVAL / 2 # 每次鼠标操作后的等待时间(秒)
+    INPUT_MAX_AGE: Final[float] = 0.3 # 常规点击和拉杆修正在输入队列中等待超过该时间后丢弃(秒)
+    
+    # 像素探针配置
+    PROBE_RADIUS: Final[int] = 1 # 探针采样小块的半径，小块边长为 2*半径+1 像素
+    PROBE_TOLERANCE: Final[float] = 12 # 探针颜色与参考颜色各通道的最大差值不超过该值时视为未变化
+    PROBE_HYSTERESIS: Final[float] = 6 # 判定为变化需要再超出的差值，避免在阈值附近反复切换
+    
+    # 截图配置
+    CAPTURE_INTERVAL: Final[float] = 0.02 # 采集线程两次截图的最小间隔(秒)
+    FRAME_BUS_SLOTS: Final[int] = 4 # 帧总线环形缓冲区的初始槽位数，被读取方持有的槽位不会被覆盖
+    CAPTURE_RATES: Final[dict[str, float]] = { # 各状态的目标截图帧率，未列出的状态按 CAPTURE_INTERVAL 截图
+        'START_FISHING': 5,
+        'CAST_ROD': 4,
+        'NO_BAIT': 2,
+        'CATCH_FISH': 10,
+        'FISHING': 50,
+        'INSTANT_KILL': 50,
+        'END_FISHING': 4,
+    }
+    CAPTURE_LATENCY_BUDGETS: Final[dict[str, float]] = { # 各状态界面变化到识别完成的最大延迟(秒)，截图间隔会相应缩短
+        'FISHING': 0.05,
+        'INSTANT_KILL': 0.05,
+    }
+    CAPTURE_BURST_DURATION: Final[float] = 0.3 # 状态切换后以最高帧率截图确认新状态的时长(秒)
+    
+    # 秒杀配置
+    INSTANT_KILL_BUDGET: Final[float] = 3.0 # 秒杀方向序列求解的延迟预算(秒)，超过后不再重试
+    INSTANT_KILL_SETTLE: Final[float] = 0.15 # 点击全部执行后等待界面刷新再检查的时间(秒)
+    DIRECTION_SEGMENT_ICONS: Final[int] = 2 # 方向序列按列分段识别，每段的宽度为图标宽度的倍数
+    DIRECTION_PREFILTER_THRESHOLD: Final[float] = 0.6 # 灰度批量匹配的候选阈值，候选再用彩色匹配按 0.8 确认
+    
+    # 多实例配置
+    VISION_WORKERS: Final[int] = max(1, (os.cpu_count() or 2) // 2) # 多实例共享的识别线程数
+    VISION_WORKER_SEGMENTS: Final[int] = 32 # 识别工作进程保持连接的共享内存数，超过时关闭最久未使用的连接
+    
+    # 调度配置
+    TIMER_TICK: Final[float] = 0.01 # 时间轮的刻度(秒)
+    TIMER_SLOTS: Final[int] = 512 # 时间轮的槽位数
+    
+    # 模板匹配配置
+    UI_ROI_MARGIN: Final[int] = 40 # 学习到的搜索区域向外扩展的边距(像素)
+    ROI_FALLBACK_INTERVAL: Final[float] = 1.0 # 搜索区域未命中或没有搜索区域时，两次全图搜索的最小间隔(秒)
+    PYRAMID_SCALE: Final[float] = 0.25 # 金字塔粗匹配的缩放比例
+    PYRAMID_DRIFT_SCALES: Final[tuple[float, ...]] = (1.0, 0.95, 1.05) # 粗匹配时尝试的模板缩放比例，容忍窗口大小的轻微变化
+    PYRAMID_COARSE_THRESHOLD: Final[float] = 0.5 # 粗匹配候选峰值的最低分数，各缩放比例的最高峰不受限制
+    PYRAMID_PHASE_THRESHOLD: Final[float] = 0.7 # 模板在缩小网格各偏移下的最低粗匹配分数，低于时增大粗匹配比例
+    PYRAMID_MAX_CANDIDATES: Final[int] = 3 # 精确匹配的候选峰值数量上限
+    PYRAMID_MIN_SIZE: Final[int] = 8 # 缩小后模板的最小边长(像素)，小于该值时退回单尺度匹配
+    CLASSIFY_MIN_SCORE: Final[float] = 0.85 # 状态分类的最低相对分数，低于时不做原始分辨率确认
+    CLASSIFY_CONFIRM_MARGIN: Final[int] = 8 # 在粗匹配峰值附近确认界面时的窗口边距(像素)
+    TEMPLATE_RESOLUTION: Final[tuple[int, int]] = (1602, 946) # 截取模板图像时的窗口大小 (width, height)
+    SCALE_SEARCH_RANGE: Final[tuple[float, float, int]] = (0.85, 1.15, 13) # 模板比例粗搜索相对按窗口宽度估计值的范围和步数
+    SCALE_REFINE_RANGE: Final[tuple[float, float, int]] = (0.97, 1.03, 13) # 模板比例精搜索相对粗搜索结果的范围和步数
+    SCALE_SEARCH_THRESHOLD: Final[float] = 0.7 # 模板比例搜索的最低匹配分数，低于该值时不保存搜索结果
+    STATE_RECOVERY_TIMEOUT: Final[float] = 30 # 状态长时间未变化且当前界面不符时，重新识别状态的等待时间(秒)
+    
+    # 状态确认配置
+    MATCH_THRESHOLD: Final[float] = 0.8 # 界面模板的默认匹配阈值，位置标定中学习到的各模板阈值优先
+    MATCH_STRONG_RATIO: Final[float] = 0.5 # 分数超过阈值到1之间的该比例时为强匹配，低于阈值的该比例以下时为确定不匹配
+    STATE_CONFIRMATION: Final[tuple[int, int]] = (2, 3) # 非强匹配时，最近M帧中有N帧识别到新界面才切换状态 (N, M)
+    STATE_CONFIRMATIONS: Final[dict[str, tuple[int, int]]] = { # 按目标状态覆盖 STATE_CONFIRMATION
+        'INSTANT_KILL': (3, 4), # 钓鱼时方向图标容易短暂误匹配
+    }
+    THRESHOLD_LEARN_RANGE: Final[tuple[float, float]] = (0.6, 0.95) # 由录制会话学习的匹配阈值的取值范围
+    THRESHOLD_LEARN_MARGIN: Final[float] = 0.05 # 没有正样本时，学习的阈值高出负样本最高分数的量
+    THRESHOLD_LEARN_GUARD: Final[float] = 0.5 # 状态切换前后该时间内的帧不作为样本(秒)，界面可能还没切换完
+    
+    # 画面变化检测配置
+    FRAME_DIFF_TILE: Final[int] = 16 # 画面签名每个分块的边长(像素)
+    FRAME_DIFF_THRESHOLD: Final[float] = 4 # 分块均值的变化不超过该值时视为画面未变化
+    FRAME_RECHECK_INTERVAL: Final[float] = 1.0 # 画面未变化时，两次强制完整识别的最大间隔(秒)
+    
+    # 耗时统计配置
+    METRICS_EXPORT_INTERVAL: Final[float] = 10 # 耗时统计写入文件的间隔(秒)
+    METRICS_HOTKEY: Final[str] = 'f8' # 运行时开关耗时统计的热键
+    
+    # 钓鱼统计配置
+    STATS_FLUSH_INTERVAL: Final[float] = 60 # 钓鱼统计写入数据库的间隔(秒)
+    STATS_BUFFER_SIZE: Final[int] = 1024 # 等待写入的统计记录上限，超出时丢弃最早的记录
+    STATS_CYCLE_TIMEOUT: Final[float] = 300 # 一次钓鱼周期超过该时间仍未回到抛竿时记为超时(秒)
+    
+    # 节奏自动调整配置
+    TUNING_RANGES: Final[dict[str, tuple[float, float, float]]] = { # 自动调整的参数的 (最小值, 最大值, 步长)，按此顺序轮流调整
+        'fishing_click_interval': (0.04, 0.16, 0.01),
+        'rod_retrieve_interval': (6, 20, 1),
+        'pressure_backoff': (1, 5, 0.5),
+    }
+    TUNING_TRIAL_CYCLES: Final[int] = 5 # 每组参数试用的上鱼周期数
+    TUNING_MIN_GAIN: Final[float] = 0.03 # 平均钓鱼时间至少缩短该比例才采用新的参数
+    TUNING_MAX_PRESSURE_RATIO: Final[float] = 0.5 # 一个周期中压力过高的检查超过该比例时视为压力失控，放弃试用的参数
     
     # 路径配置
     BASE_DIR: Final[Path] = Path(__file__).parent.absolute()
     GENERATE_DIR: Final[Path] = BASE_DIR / "generate"
     CONFIG_FILE: Final[Path] = GENERATE_DIR / "config.yaml"
+    INSTANCE_CONFIG_DIR: Final[Path] = GENERATE_DIR / "instances" # 多实例时各实例的配置文件目录
+    CALIBRATION_DIR: Final[Path] = GENERATE_DIR / "calibration" # 按窗口标题和分辨率保存的位置标定
     LOG_FILE: Final[Path] = GENERATE_DIR / "log.txt"
+    METRICS_FILE: Final[Path] = GENERATE_DIR / "metrics.json" # 耗时统计导出文件
+    STATS_FILE: Final[Path] = GENERATE_DIR / "stats.sqlite" # 钓鱼统计数据库
+    RESOURCE_MANIFEST: Final[Path] = GENERATE_DIR / "resources.json" # 资源文件的大小、修改时间和哈希清单
     
     # 根据是否打包成exe选择不同的资源路径
     if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
@@ -53,6 +155,40 @@ class Config:
         WIND_IMAGE, FIRE_IMAGE, RAY_IMAGE, ELECTRICITY_IMAGE
     ]
     
+    # 预先声明的搜索区域提示，归一化坐标 (x, y, width, height)，相对于窗口
+    UI_ROI_HINTS: Final[dict[Path, tuple[float, float, float, float]]] = {
+        UP_IMAGE: (0.0, 0.0, 1.0, 0.5),  # 秒杀方向图标位于窗口上半部分
+    }
+    
+    # 启动时需要预加载的模板图像列表
+    TEMPLATE_FILES: Final[list[Path]] = [
+        START_FISH_BUTTON,
+        UP_IMAGE,
+        LEFT_IMAGE,
+        DOWN_IMAGE,
+        RIGHT_IMAGE,
+        WIND_IMAGE,
+        FIRE_IMAGE,
+        RAY_IMAGE,
+        ELECTRICITY_IMAGE,
+        BAIT_IMAGE,
+        USE_BUTTON,
+        TIME_IMAGE,
+        BUY_BUTTON,
+        PUSH_ROD_BUTTON,
+        PRESSURE_IMAGE,
+        RETRY_BUTTON
+    ]
+    
+    # 资源文件的整体摘要，由 verify_resources 计算，资源更新后变化
+    resource_digest: str = ''
+    
+    @classmethod
+    def init(cls) -> None:
+        """初始化日志并验证资源文件，程序入口在使用其它模块前调用一次"""
+        cls.setup_logging()
+        cls.verify_resources()
+    
     @classmethod
     def setup_logging(cls) -> None:
         """配置日志系统"""
@@ -80,34 +216,40 @@ class Config:
         logging.info("开始记录日志")
     
     @classmethod
-    def verify_resources(cls) -> None:
-        """验证必要的资源文件是否存在"""
-        required_files = [
-            cls.START_FISH_BUTTON,
-            cls.UP_IMAGE,
-            cls.LEFT_IMAGE,
-            cls.DOWN_IMAGE,
-            cls.RIGHT_IMAGE,
-            cls.WIND_IMAGE,
-            cls.FIRE_IMAGE,
-            cls.RAY_IMAGE,
-            cls.ELECTRICITY_IMAGE,
-            cls.BAIT_IMAGE,
-            cls.USE_BUTTON,
-            cls.TIME_IMAGE,
-            cls.BUY_BUTTON,
-            cls.PUSH_ROD_BUTTON,
-            cls.PRESSURE_IMAGE,
-            cls.RETRY_BUTTON
-        ]
+    def verify_resources(cls) -> str:
+        """验证必要的资源文件是否存在，并返回资源摘要
+        
+        文件大小和修改时间与清单中一致时沿用清单中的哈希，只有变化的文件才重新读取计算。
+        """
+        try:
+            manifest = json.loads(cls.RESOURCE_MANIFEST.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            manifest = {}
         
-        missing_files = [str(f) for f in required_files if not f.exists()]
+        missing_files = []
+        entries = {}
+        for path in cls.TEMPLATE_FILES:
+            try:
+                stat = path.stat()
+            except OSError:
+                missing_files.append(str(path))
+                continue
+            entry = manifest.get(path.name)
+            if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+                entry = {
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'sha1': hashlib.sha1(path.read_bytes()).hexdigest(),
+                }
+            entries[path.name] = entry
         if missing_files:
             raise FileNotFoundError(
                 f"以下必要的资源文件缺失：\n{chr(10).join(missing_files)}"
             )
-
-
-# 初始化配置
-Config.setup_logging()
-Config.verify_resources()
+        
+        if entries != manifest:
+            cls.GENERATE_DIR.mkdir(exist_ok=True)
+            cls.RESOURCE_MANIFEST.write_text(json.dumps(entries, indent=2), encoding='utf-8')
+        cls.resource_digest = hashlib.sha1(
+            ''.join(entries[name]['sha1'] for name in sorted(entries)).encode()).hexdigest()
+        return cls.resource_digest
@@ -0,0 +1,572 @@
+"""无界面的钓鱼模拟器
+
+用 images 中的界面素材合成游戏画面，按 FishState 的状态图模拟一局局钓鱼：开始钓鱼、抛竿、
+鱼饵不足、等待上钩、钓鱼(压力条、拉杆)、秒杀方向序列和结算。模拟器响应 MouseController
+发出的鼠标操作，不需要模拟器窗口和截图，用于在没有游戏的环境下对识别吞吐量、多实例扩展和反应延迟做压力测试。
+多个模拟窗口在虚拟屏幕上并排放置，鼠标操作按坐标分发给对应的窗口，多实例时使用 FishingSupervisor 驱动。
+
+用法:
+    python simulator.py [--instances N] [--duration S] [--speed X] [--size WxH] [--bait N] [--vision-pool]
+
+speed 为游戏节奏倍速，缩短等待上钩的时间、鱼的体力和拉杆事件的间隔，机器人的点击节奏不变。
+各素材的位置按随机数种子在几个像素内随机偏移，不同的种子覆盖素材相对缩小采样网格的不同偏移。
+界面出现后长时间没有得到正确操作记为识别失败，有识别失败时以非零状态退出。
+"""
+import argparse
+import math
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from calibration import CalibrationStore
+from capture import FakeWindowBackend, FrameSource, WindowManager
+from common import FishState, GameConfig
+from inputs import InputBackend, MouseController
+from main import FishingGame, FishingSupervisor
+from replay import percentiles
+from setting import Config
+from stats import SessionStats
+from vision import TemplateRegistry
+from vision_pool import VisionWorkerPool
+
+
+class FishingSimulator:
+    """一个模拟的游戏窗口
+
+    画面由素材按窗口大小缩放后贴在固定的背景上，画面内容变化时才重新合成。
+    时间相关的状态(压力衰减、上钩、拉杆事件)在截图和鼠标操作时按经过的时间推进，
+    截图线程和输入线程都会访问，所有方法持有 _lock。
+    """
+
+    BITE_DELAY = (1.0, 4.0)  # 抛竿后鱼上钩的等待时间范围(秒)，除以 speed
+    FISH_STAMINA = 60  # 钓上一条鱼需要的收线量，除以 speed
+    REEL_PER_CLICK = 1.0  # 每次点击的收线量
+    REEL_PER_RETRIEVE = 6.0  # 每次收杆的收线量
+    PRESSURE_PER_CLICK = 0.05  # 每次点击增加的压力，压力为1时断线
+    PRESSURE_PER_RETRIEVE = 0.15  # 每次收杆增加的压力
+    PRESSURE_DECAY = 0.5  # 每秒降低的压力
+    PRESSURE_HIGH = 0.7  # 压力超过该值时压力条变色
+    ROD_PULL_RATE = 0.1  # 每秒发生拉杆事件的概率，乘以 speed
+    ROD_PULL_PRESSURE = 0.3  # 拉杆事件未处理时每秒增加的压力，期间点击不收线
+    ROD_PULL_GRACE = 3.0  # 进入钓鱼界面后该时间内不发生拉杆事件(秒)，机器人在此期间记录拉杆和压力条的参考颜色
+    INSTANT_KILL_CHANCE = 0.3  # 收线过半时进入秒杀的概率
+    INSTANT_KILL_ICONS = (4, 6)  # 秒杀方向序列的图标数范围
+    INSTANT_KILL_TIMEOUT = 6.0  # 秒杀未在该时间内完成时鱼逃走(秒)
+    BAIT_PER_REFILL = 10  # 每次使用鱼饵补充的数量
+    DRAG_MIN = 40  # 拖动距离超过该值(按窗口缩放)才视为抛竿、收杆或拉杆
+    MARK_RADIUS = 5  # 压力条和拉杆变色区域的半径(按窗口缩放)
+    OFFSET_RANGE = 6  # 各素材位置的随机偏移范围(像素)，每个模拟窗口按随机数种子确定
+    MISS_TIMEOUT = 5.0  # 事件出现后超过该时间还没有正确操作时记为识别失败(秒)
+    PRESSURE_COLOR = (0, 0, 255)  # 压力过高时压力条的颜色 BGR
+    ROD_PULL_COLOR = (0, 200, 255)  # 拉杆事件时拉杆按钮的颜色 BGR
+
+    # 各界面素材的中心位置，相对窗口的比例
+    LAYOUT: Dict[Path, Tuple[float, float]] = {
+        Config.START_FISH_BUTTON: (0.85, 0.80),
+        Config.BAIT_IMAGE: (0.85, 0.80),
+        Config.USE_BUTTON: (0.5, 0.6),
+        Config.TIME_IMAGE: (0.5, 0.12),
+        Config.PRESSURE_IMAGE: (0.5, 0.1),
+        Config.PUSH_ROD_BUTTON: (0.15, 0.85),
+        Config.RETRY_BUTTON: (0.5, 0.85),
+    }
+    STRIP_Y = 0.22  # 秒杀方向序列横条的中心高度
+    BUTTONS_Y = 0.78  # 秒杀方向按钮的中心高度
+
+    def __init__(self, window_size: Tuple[int, int, int, int], speed: float = 1.0,
+                 bait: int = BAIT_PER_REFILL, seed: int = 0):
+        self.window_size = window_size
+        self.speed = speed
+        self.scale = window_size[2] / Config.WINDOW_SIZE[2]
+        self.random = random.Random(seed)
+        self._lock = Lock()
+
+        width, height = window_size[2], window_size[3]
+        self.images = {path: self._load(path) for path in (*self.LAYOUT, *Config.DIRECTION_ICONS)}
+        self.offsets = {path: (self.random.randint(-self.OFFSET_RANGE, self.OFFSET_RANGE),
+                               self.random.randint(-self.OFFSET_RANGE, self.OFFSET_RANGE))
+                        for path in self.images}
+        self.rects = {path: self._rect(path, self.LAYOUT[path]) for path in self.LAYOUT}
+        self.buttons = {path: self._rect(path, ((i + 0.5) / len(Config.DIRECTION_ICONS) * 0.8 + 0.1, self.BUTTONS_Y))
+                        for i, path in enumerate(Config.DIRECTION_ICONS)}
+        # 水面一样的平滑背景
+        rng = np.random.default_rng(seed)
+        noise = rng.integers(40, 120, size=(12, 20, 3), dtype=np.uint8)
+        self.background = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+
+        self.state = FishState.START_FISHING
+        self.shown_at = time.monotonic()  # 当前界面出现的时间
+        self.bait = bait
+        self.pressure = 0.0
+        self.reel = 0.0
+        self.stamina = self.FISH_STAMINA / speed
+        self.bite_at: Optional[float] = None  # 鱼上钩的时间
+        self.pull_since: Optional[float] = None  # 未处理的拉杆事件开始的时间
+        self.sequence: List[Path] = []  # 秒杀方向序列
+        self.entered = 0  # 已正确输入的图标数
+        self.instant_kill_checked = False  # 本条鱼是否已判断过秒杀
+
+        self.cycles: List[Dict] = []  # 完成的钓鱼周期 {'outcome', 'duration', 'fishing'}
+        self.reactions: Dict[str, List[float]] = {}  # 各事件从出现到机器人做出正确操作的时间(秒)
+        self.wrong_inputs = 0  # 秒杀时点错的次数
+        self.misses: Dict[str, int] = {}  # 各事件超过 MISS_TIMEOUT 没有正确操作的次数
+        self._missed = set()  # 已记为识别失败的 (事件, 出现时间)
+        self._cycle_start: Optional[float] = None
+        self._outcome: Optional[str] = None  # 当前周期的结果: caught 或 escaped，没有钓鱼时为None
+        self._fishing_time = 0.0  # 当前周期在钓鱼和秒杀界面的时间(秒)
+        self._fishing_since: Optional[float] = None
+        self._waiting: Dict[str, float] = {self.state.name: self.shown_at}  # 等待机器人反应的事件及其出现时间
+        self._drag: Optional[Tuple[int, int]] = None  # 按下鼠标的位置，窗口坐标
+        self._cursor = (0, 0)
+        self._last = time.monotonic()
+        self._frame: Optional[np.ndarray] = None
+        self._frame_key = None
+
+    def _load(self, path: Path) -> np.ndarray:
+        """读取素材并按窗口大小缩放"""
+        image = cv2.imread(str(path))
+        if self.scale == 1.0:
+            return image
+        return cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def _rect(self, path: Path, center: Tuple[float, float]) -> Tuple[int, int, int, int]:
+        """素材的中心放在窗口中的相对位置并加上随机偏移后占据的区域 (x, y, width, height)，窗口坐标"""
+        height, width = self.images[path].shape[:2]
+        dx, dy = self.offsets[path]
+        return (round(center[0] * self.window_size[2] - width / 2) + dx,
+                round(center[1] * self.window_size[3] - height / 2) + dy, width, height)
+
+    @staticmethod
+    def _inside(rect: Tuple[int, int, int, int], pos: Tuple[int, int]) -> bool:
+        return rect[0] <= pos[0] < rect[0] + rect[2] and rect[1] <= pos[1] < rect[1] + rect[3]
+
+    def contains(self, x: int, y: int) -> bool:
+        """屏幕坐标是否在窗口内"""
+        return self._inside(self.window_size, (x, y))
+
+    def _local(self, x: int, y: int) -> Tuple[int, int]:
+        return (x - self.window_size[0], y - self.window_size[1])
+
+    def _strip_rects(self) -> List[Tuple[int, int, int, int]]:
+        """秒杀方向序列中各图标的区域，图标输入后原位置留空"""
+        slot = max(self.images[path].shape[1] for path in Config.DIRECTION_ICONS) * 1.6
+        left = (self.window_size[2] - slot * len(self.sequence)) / 2
+        return [self._rect(path, ((left + slot * (i + 0.5)) / self.window_size[2], self.STRIP_Y))
+                for i, path in enumerate(self.sequence)]
+
+    def _show(self, state: FishState, now: float) -> None:
+        """切换界面"""
+        self.state = state
+        self.shown_at = now
+        if state in (FishState.START_FISHING, FishState.CAST_ROD, FishState.NO_BAIT, FishState.END_FISHING):
+            self._waiting[state.name] = now
+        if state == FishState.CAST_ROD:
+            if self._cycle_start is not None:
+                self._close_cycle(now)
+            self._cycle_start = now
+
+    def _close_cycle(self, now: float) -> None:
+        """结束当前周期，结果在周期中确定，只经过鱼饵不足界面时为补充鱼饵"""
+        outcome = self._outcome or 'refill'
+        self.cycles.append({'outcome': outcome, 'duration': now - self._cycle_start,
+                            'fishing': self._fishing_time})
+        self._outcome = None
+        self._fishing_time = 0.0
+
+    def _react(self, name: str, now: float) -> None:
+        """机器人对等待中的事件做出了正确操作"""
+        since = self._waiting.pop(name, None)
+        if since is not None:
+            self.reactions.setdefault(name, []).append(now - since)
+
+    def _finish_fish(self, outcome: str, now: float) -> None:
+        """钓鱼结束，进入结算界面"""
+        self._outcome = outcome
+        self._fishing_time += now - self._fishing_since
+        self._waiting.pop('rod', None)
+        self._show(FishState.END_FISHING, now)
+
+    def _advance(self, now: float) -> None:
+        """推进与时间相关的状态，需持有锁"""
+        dt = now - self._last
+        self._last = now
+        for name, since in self._waiting.items():
+            if now - since > self.MISS_TIMEOUT and (name, since) not in self._missed:
+                self._missed.add((name, since))
+                self.misses[name] = self.misses.get(name, 0) + 1
+        match self.state:
+            case FishState.CATCH_FISH:
+                if self.bite_at is not None and now >= self.bite_at and 'hook' not in self._waiting:
+                    self._waiting['hook'] = self.bite_at
+            case FishState.FISHING:
+                if self.pull_since is not None:
+                    self.pressure += self.ROD_PULL_PRESSURE * dt
+                elif (now - self.shown_at > self.ROD_PULL_GRACE
+                      and self.random.random() < 1 - math.exp(-self.ROD_PULL_RATE * self.speed * dt)):
+                    self.pull_since = now
+                    self._waiting['rod'] = now
+                self.pressure = max(0.0, self.pressure - self.PRESSURE_DECAY * dt)
+                if self.pressure >= 1.0:
+                    self._finish_fish('escaped', now)
+            case FishState.INSTANT_KILL:
+                if now - self.shown_at > self.INSTANT_KILL_TIMEOUT:
+                    self._waiting.pop(FishState.INSTANT_KILL.name, None)
+                    self._finish_fish('escaped', now)
+
+    def _reel(self, amount: float, pressure: float, now: float) -> None:
+        """收线并增加压力，收线过半时可能进入秒杀，收满时上鱼"""
+        self.pressure += pressure
+        if self.pull_since is None:
+            self.reel += amount
+        if self.pressure >= 1.0:
+            self._finish_fish('escaped', now)
+        elif self.reel >= self.stamina:
+            self._finish_fish('caught', now)
+        elif self.reel >= self.stamina / 2 and not self.instant_kill_checked:
+            self.instant_kill_checked = True
+            if self.random.random() < self.INSTANT_KILL_CHANCE:
+                icons = list(Config.DIRECTION_ICONS)
+                count = self.random.randint(*self.INSTANT_KILL_ICONS)
+                # 秒杀界面按向上图标识别，序列中至少有一个
+                self.sequence = [Config.UP_IMAGE] + [self.random.choice(icons) for _ in range(count - 1)]
+                self.random.shuffle(self.sequence)
+                self.entered = 0
+                self.pull_since = None
+                self._waiting.pop('rod', None)
+                self._show(FishState.INSTANT_KILL, now)
+                self._waiting[FishState.INSTANT_KILL.name] = now
+
+    def click(self, x: int, y: int) -> None:
+        """点击屏幕坐标"""
+        pos = self._local(x, y)
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            action = self._inside(self.rects[Config.START_FISH_BUTTON], pos)
+            match self.state:
+                case FishState.START_FISHING if action:
+                    self._react(self.state.name, now)
+                    self._show(FishState.CAST_ROD, now)
+                case FishState.NO_BAIT if self._inside(self.rects[Config.USE_BUTTON], pos):
+                    self._react(self.state.name, now)
+                    self.bait += self.BAIT_PER_REFILL
+                    self._show(FishState.CAST_ROD, now)
+                case FishState.END_FISHING if self._inside(self.rects[Config.RETRY_BUTTON], pos):
+                    self._react(self.state.name, now)
+                    self._show(FishState.CAST_ROD, now)
+                case FishState.CATCH_FISH if action and self.bite_at is not None and now >= self.bite_at:
+                    self._react('hook', now)
+                    self.pressure = self.reel = 0.0
+                    self.pull_since = None
+                    self.instant_kill_checked = False
+                    self._fishing_since = now
+                    self._show(FishState.FISHING, now)
+                case FishState.FISHING if action:
+                    self._reel(self.REEL_PER_CLICK, self.PRESSURE_PER_CLICK, now)
+                case FishState.INSTANT_KILL:
+                    self._input_direction(pos, now)
+
+    def _input_direction(self, pos: Tuple[int, int], now: float) -> None:
+        """秒杀时点击方向按钮，按顺序输入全部图标后上鱼"""
+        for path, rect in self.buttons.items():
+            if not self._inside(rect, pos):
+                continue
+            if path != self.sequence[self.entered]:
+                self.wrong_inputs += 1
+                return
+            self._react(FishState.INSTANT_KILL.name, now)
+            self.entered += 1
+            if self.entered == len(self.sequence):
+                self.reactions.setdefault('INSTANT_KILL_DONE', []).append(now - self.shown_at)
+                self._finish_fish('caught', now)
+            return
+
+    def mouse_down(self, x: int, y: int) -> None:
+        with self._lock:
+            self._drag = self._cursor = self._local(x, y)
+
+    def move_to(self, x: int, y: int) -> None:
+        with self._lock:
+            self._cursor = self._local(x, y)
+
+    def mouse_up(self) -> None:
+        """松开鼠标，按拖动的起点和方向判断抛竿、收杆或拉杆"""
+        now = time.monotonic()
+        with self._lock:
+            if self._drag is None:
+                return
+            start, self._drag = self._drag, None
+            dx, dy = self._cursor[0] - start[0], self._cursor[1] - start[1]
+            self._advance(now)
+            distance = self.DRAG_MIN * self.scale
+            upward = dy <= -distance and self._inside(self.rects[Config.START_FISH_BUTTON], start)
+            match self.state:
+                case FishState.CAST_ROD if upward:
+                    self._react(self.state.name, now)
+                    if self.bait <= 0:
+                        self._show(FishState.NO_BAIT, now)
+                        return
+                    self.bait -= 1
+                    self.bite_at = now + self.random.uniform(*self.BITE_DELAY) / self.speed
+                    self._show(FishState.CATCH_FISH, now)
+                case FishState.FISHING if upward:
+                    self._reel(self.REEL_PER_RETRIEVE, self.PRESSURE_PER_RETRIEVE, now)
+                case FishState.FISHING if (abs(dx) >= distance
+                                           and self._inside(self.rects[Config.PUSH_ROD_BUTTON], start)):
+                    if self.pull_since is not None:
+                        self.pull_since = None
+                        self._react('rod', now)
+
+    def _paste(self, frame: np.ndarray, path: Path, rect: Tuple[int, int, int, int]) -> None:
+        x, y, width, height = rect
+        frame[y:y + height, x:x + width] = self.images[path]
+
+    def _mark(self, frame: np.ndarray, center: Tuple[int, int], color: Tuple[int, int, int]) -> None:
+        """在指定位置画一块纯色，模拟压力条和拉杆按钮变色"""
+        radius = max(2, round(self.MARK_RADIUS * self.scale))
+        frame[center[1] - radius:center[1] + radius + 1, center[0] - radius:center[0] + radius + 1] = color
+
+    def render(self) -> np.ndarray:
+        """当前画面，返回的图像在画面变化前被复用，调用方不能修改"""
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            high = self.pressure >= self.PRESSURE_HIGH
+            key = (self.state, high, self.pull_since is not None, self.entered, tuple(self.sequence))
+            if key == self._frame_key:
+                return self._frame
+            frame = self.background.copy()
+            match self.state:
+                case FishState.START_FISHING:
+                    self._paste(frame, Config.START_FISH_BUTTON, self.rects[Config.START_FISH_BUTTON])
+                case FishState.CAST_ROD:
+                    self._paste(frame, Config.BAIT_IMAGE, self.rects[Config.BAIT_IMAGE])
+                case FishState.NO_BAIT:
+                    self._paste(frame, Config.USE_BUTTON, self.rects[Config.USE_BUTTON])
+                case FishState.CATCH_FISH:
+                    self._paste(frame, Config.TIME_IMAGE, self.rects[Config.TIME_IMAGE])
+                case FishState.FISHING:
+                    x, y, width, height = self.rects[Config.PRESSURE_IMAGE]
+                    self._paste(frame, Config.PRESSURE_IMAGE, (x, y, width, height))
+                    if high:
+                        self._mark(frame, (x + int(width * 0.25), y + int(height * 0.5)), self.PRESSURE_COLOR)
+                    x, y, width, height = self.rects[Config.PUSH_ROD_BUTTON]
+                    self._paste(frame, Config.PUSH_ROD_BUTTON, (x, y, width, height))
+                    if self.pull_since is not None:
+                        self._mark(frame, (x + width // 2, y + height // 2), self.ROD_PULL_COLOR)
+                case FishState.INSTANT_KILL:
+                    for i, (path, rect) in enumerate(zip(self.sequence, self._strip_rects())):
+                        if i >= self.entered:
+                            self._paste(frame, path, rect)
+                    for path, rect in self.buttons.items():
+                        self._paste(frame, path, rect)
+                case FishState.END_FISHING:
+                    self._paste(frame, Config.RETRY_BUTTON, self.rects[Config.RETRY_BUTTON])
+            self._frame, self._frame_key = frame, key
+            return frame
+
+    def render_state(self, state: FishState) -> np.ndarray:
+        """某个界面的画面，用于不经过截图的识别基准测试"""
+        with self._lock:
+            self.state = state
+            if state == FishState.INSTANT_KILL and not self.sequence:
+                self.sequence = list(Config.DIRECTION_ICONS[:self.INSTANT_KILL_ICONS[0]])
+                self.shown_at = time.monotonic()
+        return self.render().copy()
+
+
+class SimulatorFrameSource(FrameSource):
+    """从模拟器截图"""
+
+    def __init__(self, simulator: FishingSimulator):
+        super().__init__()
+        self.simulator = simulator
+
+    def grab(self, region: Tuple[int, int, int, int], out: Optional[np.ndarray] = None) -> np.ndarray:
+        x = region[0] - self.simulator.window_size[0]
+        y = region[1] - self.simulator.window_size[1]
+        view = self.simulator.render()[y:y + region[3], x:x + region[2]]
+        buffer = self._get_buffer(view.shape[0], view.shape[1], out)
+        np.copyto(buffer, view)
+        return buffer
+
+
+class SimulatorInputBackend(InputBackend):
+    """把鼠标操作按屏幕坐标分发给对应的模拟窗口，拖动的后续操作发给按下鼠标的窗口"""
+
+    def __init__(self, simulators: List[FishingSimulator], pause: float = Config.INPUT_PAUSE):
+        self.simulators = simulators
+        self.pause = pause
+        self._owner: Optional[FishingSimulator] = None
+
+    def _find(self, x: int, y: int) -> Optional[FishingSimulator]:
+        return next((simulator for simulator in self.simulators if simulator.contains(x, y)), None)
+
+    def mouse_down(self, x: int, y: int, button: str = 'left') -> None:
+        self._owner = self._find(x, y)
+        if self._owner is not None:
+            self._owner.mouse_down(x, y)
+        time.sleep(self.pause)
+
+    def move_to(self, x: int, y: int, duration: float = 0.0) -> None:
+        if self._owner is not None:
+            self._owner.move_to(x, y)
+        time.sleep(self.pause)
+
+    def mouse_up(self, button: str = 'left') -> None:
+        if self._owner is not None:
+            self._owner.mouse_up()
+            self._owner = None
+        time.sleep(self.pause)
+
+    def click(self, position: Tuple[int, int]) -> None:
+        simulator = self._find(*position)
+        if simulator is not None:
+            simulator.click(*position)
+        time.sleep(self.pause)
+
+
+@dataclass
+class SimulationReport:
+    """一个模拟窗口的运行结果"""
+    title: str
+    duration: float = 0.0  # 运行时间(秒)
+    update_latencies: List[float] = field(default_factory=list)  # 每帧 process_frame 耗时(秒)
+    cycles: List[Dict] = field(default_factory=list)  # 模拟器记录的钓鱼周期
+    reactions: Dict[str, List[float]] = field(default_factory=dict)  # 各事件的反应时间(秒)
+    wrong_inputs: int = 0  # 秒杀时点错的次数
+    misses: Dict[str, int] = field(default_factory=dict)  # 各事件识别失败的次数
+
+    @property
+    def frames(self) -> int:
+        return len(self.update_latencies)
+
+
+def _layout(instances: int, size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+    """各模拟窗口在虚拟屏幕上的位置，横向并排"""
+    return [(i * (size[0] + 10), 0, size[0], size[1]) for i in range(instances)]
+
+
+def run_simulation(instances: int = 1, duration: float = 60, speed: float = 1.0,
+                   size: Tuple[int, int] = Config.WINDOW_SIZE[2:], bait: int = FishingSimulator.BAIT_PER_REFILL,
+                   vision_pool: bool = False, seed: int = 0) -> List[SimulationReport]:
+    """运行模拟，返回各实例的结果
+
+    Args:
+        instances: 模拟窗口数，多于一个时由 FishingSupervisor 驱动
+        duration: 运行时间(秒)
+        speed: 游戏节奏倍速
+        size: 窗口大小 (width, height)
+        bait: 开始时的鱼饵数
+        vision_pool: 是否使用多进程识别
+        seed: 随机数种子，各实例依次加一
+    """
+    # 位置标定、状态快照和钓鱼统计写入临时目录，不覆盖实际的数据
+    workdir = tempfile.TemporaryDirectory()
+    CalibrationStore.use(Path(workdir.name) / 'calibration')
+    SessionStats.use(Path(workdir.name) / 'stats.sqlite')
+
+    windows = _layout(instances, size)
+    simulators = [FishingSimulator(window, speed, bait, seed + i) for i, window in enumerate(windows)]
+    configs = [GameConfig(window_title=f'sim{i}', window_size=window,
+                          config_path=str(Path(workdir.name) / f'sim{i}.yaml'))
+               for i, window in enumerate(windows)]
+    sources = [SimulatorFrameSource(simulator) for simulator in simulators]
+    WindowManager.use(FakeWindowBackend({config.window_title: config.window_size for config in configs}))
+    MouseController.use(SimulatorInputBackend(simulators))
+
+    templates = TemplateRegistry()
+    pool = VisionWorkerPool(templates) if vision_pool else None
+    try:
+        if instances == 1:
+            runner = FishingGame(configs[0], templates, pool, sources[0], restore_state=False)
+            games = [runner]
+            thread = Thread(target=runner.run, kwargs={'exit_hotkey': False})
+        else:
+            runner = FishingSupervisor(configs, templates, pool, sources, restore_state=False)
+            games = runner.sessions
+            thread = Thread(target=runner.run, kwargs={'exit_hotkey': False})
+
+        reports = [SimulationReport(config.window_title) for config in configs]
+        for game, report in zip(games, reports):
+            process_frame = game.process_frame
+
+            def timed_process_frame(frame, process_frame=process_frame, samples=report.update_latencies):
+                start = time.perf_counter()
+                process_frame(frame)
+                samples.append(time.perf_counter() - start)
+            game.process_frame = timed_process_frame
+
+        start = time.perf_counter()
+        thread.start()
+        time.sleep(duration)
+        runner.stop()
+        thread.join()
+        MouseController.flush()
+        elapsed = time.perf_counter() - start
+    finally:
+        if pool is not None:
+            pool.close()
+        workdir.cleanup()
+
+    for simulator, report in zip(simulators, reports):
+        report.duration = elapsed
+        report.cycles = list(simulator.cycles)
+        report.reactions = {name: list(samples) for name, samples in simulator.reactions.items()}
+        report.wrong_inputs = simulator.wrong_inputs
+        report.misses = dict(simulator.misses)
+    return reports
+
+
+def print_report(reports: List[SimulationReport]) -> None:
+    """输出模拟结果"""
+    for report in reports:
+        outcomes = {'caught': 0, 'escaped': 0, 'refill': 0}
+        for cycle in report.cycles:
+            outcomes[cycle['outcome']] += 1
+        print(f"实例 {report.title}: 识别 {report.frames} 帧，{report.frames / report.duration:.1f} fps")
+        print(f"  process_frame: {percentiles(report.update_latencies)}")
+        print(f"  钓鱼周期: {len(report.cycles)} 次，上鱼 {outcomes['caught']}，逃走 {outcomes['escaped']}，"
+              f"补充鱼饵 {outcomes['refill']}，每小时上鱼 {outcomes['caught'] / report.duration * 3600:.1f}")
+        if report.wrong_inputs:
+            print(f"  秒杀点错: {report.wrong_inputs} 次")
+        misses = ', '.join(f"{name} {count}" for name, count in sorted(report.misses.items()))
+        print(f"  识别失败: {sum(report.misses.values())} 次" + (f" ({misses})" if misses else ""))
+        for name, samples in sorted(report.reactions.items()):
+            print(f"  反应时间 {name}: {percentiles(samples)}")
+    if len(reports) > 1:
+        total = sum(report.frames for report in reports) / reports[0].duration
+        print(f"{len(reports)} 个实例共识别 {total:.1f} fps")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="无界面的钓鱼模拟器")
+    parser.add_argument("--instances", type=int, default=1, help="并行的模拟窗口数")
+    parser.add_argument("--duration", type=float, default=60, help="运行时间(秒)")
+    parser.add_argument("--speed", type=float, default=1.0, help="游戏节奏倍速")
+    parser.add_argument("--size", default=f"{Config.WINDOW_SIZE[2]}x{Config.WINDOW_SIZE[3]}",
+                        help="模拟窗口大小，例如 1280x756")
+    parser.add_argument("--bait", type=int, default=FishingSimulator.BAIT_PER_REFILL, help="开始时的鱼饵数")
+    parser.add_argument("--vision-pool", action="store_true", help="使用多进程识别")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    args = parser.parse_args()
+    Config.init()
+    size = tuple(int(v) for v in args.size.lower().split('x'))
+    reports = run_simulation(args.instances, args.duration, args.speed, size, args.bait,
+                             args.vision_pool, args.seed)
+    print_report(reports)
+    if any(report.misses for report in reports):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
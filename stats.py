@@ -0,0 +1,271 @@
+"""钓鱼统计的记录和汇总
+
+SessionStats 在运行时记录状态停留时间和钓鱼周期并写入 generate/stats.sqlite。
+命令行读取这些统计，按实例输出每小时上鱼数、钓鱼周期耗时、
+上鱼/超时/补充鱼饵次数和各状态的停留时间，并按收杆间隔和点击间隔分组比较每小时上鱼数，用于调整这两个参数。
+
+用法:
+    python stats.py [--db 数据库路径] [--instance 窗口标题] [--hours H]
+
+hours 只统计最近 H 小时的记录，状态停留时间按整点小时汇总，范围按小时取整。
+"""
+import argparse
+import logging
+import math
+import sqlite3
+import time
+from collections import deque
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from common import FishState, GameConfig, StateSnapshot
+from setting import Config
+
+
+@dataclass(frozen=True)
+class FishingCycle:
+    """一个钓鱼周期，从进入抛竿到下一次进入抛竿"""
+    started: float  # 进入抛竿的时间
+    duration: float  # 周期耗时(秒)
+    outcome: str  # caught(上鱼)、refill(补充鱼饵) 或 timeout(超时)
+    fishing: float  # 在钓鱼和秒杀状态的时间(秒)
+    refills: int  # 补充鱼饵的次数
+    rod_retrieve_interval: float  # 周期结束时的收杆间隔(秒)
+    fishing_click_interval: float  # 周期结束时的点击间隔(秒)
+
+
+class SessionStats:
+    """钓鱼统计
+    
+    按识别线程发布的状态变化统计各状态的停留时间和进入次数，以及每个钓鱼周期：
+    从进入抛竿到下一次进入抛竿，期间到达结算界面为上鱼，只经过鱼饵不足界面为补充鱼饵，
+    其它情况(例如状态恢复回到抛竿、超过 Config.STATS_CYCLE_TIMEOUT)为超时。
+    记录先放在有界的环形缓冲区中，由动作线程定期写入 SQLite 数据库，
+    各状态的停留时间按小时汇总累加，周期逐条保存并附带当时的收杆和点击间隔，用于比较不同参数下的每小时上鱼数。
+    周期结束时还会在锁外依次调用 listeners 中的回调，例如 TimingTuner。
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state_time (
+            instance TEXT NOT NULL, hour INTEGER NOT NULL, state TEXT NOT NULL,
+            seconds REAL NOT NULL, entries INTEGER NOT NULL,
+            PRIMARY KEY (instance, hour, state)
+        );
+        CREATE TABLE IF NOT EXISTS cycles (
+            instance TEXT NOT NULL, started REAL NOT NULL, duration REAL NOT NULL, outcome TEXT NOT NULL,
+            fishing REAL NOT NULL, refills INTEGER NOT NULL,
+            rod_retrieve_interval REAL NOT NULL, fishing_click_interval REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS cycles_started ON cycles (started);
+    """
+    
+    path: Path = Config.STATS_FILE
+    
+    @staticmethod
+    def use(path: Path) -> None:
+        """更换数据库文件，回放时使用临时文件，不影响实际的统计"""
+        SessionStats.path = Path(path)
+    
+    def __init__(self, config: GameConfig):
+        self.config = config
+        self.instance = config.window_title
+        self.listeners: List[Callable[[FishingCycle], None]] = []  # 周期结束时的回调
+        self.buffer: deque = deque(maxlen=Config.STATS_BUFFER_SIZE)  # ('state' | 'cycle', 记录)
+        self._lock = Lock()
+        self._cycle_start: Optional[float] = None  # 当前周期进入抛竿的时间，还没有进入抛竿时为None
+        self._visited: set = set()  # 当前周期经过的状态
+        self._fishing = 0.0  # 当前周期在钓鱼和秒杀状态的时间(秒)
+        self._refills = 0  # 当前周期补充鱼饵的次数
+    
+    def on_state(self, old: StateSnapshot, new: StateSnapshot) -> None:
+        """记录一次状态变化，在识别线程中调用"""
+        seconds = max(0.0, new.entered_at - old.entered_at)
+        cycle = None
+        with self._lock:
+            self.buffer.append(('state', (self.instance, int(old.entered_at // 3600), old.state.name, seconds)))
+            if old.state in (FishState.FISHING, FishState.INSTANT_KILL):
+                self._fishing += seconds
+            if new.state == FishState.NO_BAIT:
+                self._refills += 1
+            if new.state == FishState.EXIT:
+                # 退出时未完成的周期不计入
+                self._cycle_start = None
+            elif new.state == FishState.CAST_ROD:
+                if self._cycle_start is not None:
+                    cycle = self._close_cycle(new.entered_at)
+                self._start_cycle(new.entered_at)
+            else:
+                self._visited.add(new.state)
+        if cycle is not None:
+            self._notify(cycle)
+    
+    def _start_cycle(self, now: float) -> None:
+        self._cycle_start = now
+        self._visited = set()
+        self._fishing = 0.0
+        self._refills = 0
+    
+    def _close_cycle(self, now: float) -> FishingCycle:
+        """结束当前周期，需持有锁"""
+        duration = now - self._cycle_start
+        if FishState.END_FISHING in self._visited and duration <= Config.STATS_CYCLE_TIMEOUT:
+            outcome = 'caught'
+        elif FishState.NO_BAIT in self._visited and FishState.FISHING not in self._visited:
+            outcome = 'refill'
+        else:
+            outcome = 'timeout'
+        cycle = FishingCycle(self._cycle_start, duration, outcome, self._fishing, self._refills,
+                             self.config.rod_retrieve_interval or Config.ROD_RETRIEVE_INTERVAL,
+                             self.config.fishing_click_interval or Config.FISHING_CLICK_INTERVAL)
+        self.buffer.append(('cycle', (self.instance, *astuple(cycle))))
+        self._cycle_start = None
+        return cycle
+    
+    def _notify(self, cycle: FishingCycle) -> None:
+        """调用周期结束的回调，回调出错不影响统计"""
+        for listener in self.listeners:
+            try:
+                listener(cycle)
+            except Exception as e:
+                logging.error(f"钓鱼周期回调出错: {e}")
+    
+    def flush(self) -> None:
+        """把缓冲区中的记录写入数据库，当前周期超时时记为超时，在动作线程中调用"""
+        import sqlite3
+        cycle = None
+        with self._lock:
+            if self._cycle_start is not None and time.time() - self._cycle_start > Config.STATS_CYCLE_TIMEOUT:
+                cycle = self._close_cycle(time.time())
+            records = [self.buffer.popleft() for _ in range(len(self.buffer))]
+        if cycle is not None:
+            self._notify(cycle)
+        if not records:
+            return
+        
+        state_time: Dict[Tuple[str, int, str], List[float]] = {}  # 同一小时同一状态的记录先合并
+        cycles = []
+        for kind, record in records:
+            if kind == 'cycle':
+                cycles.append(record)
+            else:
+                total = state_time.setdefault(record[:3], [0.0, 0])
+                total[0] += record[3]
+                total[1] += 1
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5)
+            try:
+                with db:
+                    db.executescript(self.SCHEMA)
+                    db.executemany(
+                        "INSERT INTO state_time VALUES (?, ?, ?, ?, ?) ON CONFLICT (instance, hour, state) DO UPDATE "
+                        "SET seconds = seconds + excluded.seconds, entries = entries + excluded.entries",
+                        [(*key, seconds, entries) for key, (seconds, entries) in state_time.items()])
+                    db.executemany("INSERT INTO cycles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", cycles)
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            logging.error(f"钓鱼统计写入 {self.path} 失败: {e}")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法计算分位数，q 取 0 到 100"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def load(path: Path, instance: Optional[str] = None,
+         hours: Optional[float] = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """读取统计记录，返回 {实例: {'cycles': [周期], 'states': [状态停留时间]}}"""
+    since = 0.0 if hours is None else time.time() - hours * 3600
+    where, args = "WHERE {column} >= ?", [since]
+    if instance is not None:
+        where += " AND instance = ?"
+        args.append(instance)
+
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    db.row_factory = sqlite3.Row
+    try:
+        cycles = db.execute(f"SELECT * FROM cycles {where.format(column='started')} ORDER BY started",
+                            args).fetchall()
+        states = db.execute(f"SELECT * FROM state_time {where.format(column='hour')}",
+                            [int(since // 3600), *args[1:]]).fetchall()
+    finally:
+        db.close()
+
+    result: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for row in cycles:
+        result.setdefault(row['instance'], {'cycles': [], 'states': []})['cycles'].append(dict(row))
+    for row in states:
+        result.setdefault(row['instance'], {'cycles': [], 'states': []})['states'].append(dict(row))
+    return result
+
+
+def print_instance(name: str, cycles: List[Dict[str, Any]], states: List[Dict[str, Any]]) -> None:
+    """输出一个实例的统计"""
+    print(f"实例 {name}")
+    state_time: Dict[str, List[float]] = {}
+    for row in states:
+        total = state_time.setdefault(row['state'], [0.0, 0])
+        total[0] += row['seconds']
+        total[1] += row['entries']
+    active = sum(seconds for seconds, _ in state_time.values())
+    print(f"  运行时间: {active / 3600:.2f} h")
+
+    outcomes = {'caught': 0, 'timeout': 0, 'refill': 0}
+    for cycle in cycles:
+        outcomes[cycle['outcome']] = outcomes.get(cycle['outcome'], 0) + 1
+    fishing_cycles = outcomes['caught'] + outcomes['timeout']
+    print(f"  钓鱼周期: {len(cycles)} 次，上鱼 {outcomes['caught']}，超时 {outcomes['timeout']}，"
+          f"补充鱼饵 {outcomes['refill']}")
+    if fishing_cycles:
+        print(f"  成功率: {outcomes['caught'] / fishing_cycles * 100:.1f}%")
+    if active > 0:
+        print(f"  每小时上鱼: {outcomes['caught'] / active * 3600:.1f}")
+    caught = [cycle for cycle in cycles if cycle['outcome'] == 'caught']
+    if caught:
+        durations = [cycle['duration'] for cycle in caught]
+        print(f"  上鱼周期耗时: p50 {percentile(durations, 50):.1f} s，p90 {percentile(durations, 90):.1f} s，"
+              f"平均钓鱼时间 {sum(cycle['fishing'] for cycle in caught) / len(caught):.1f} s")
+
+    if state_time:
+        print("  各状态停留时间:")
+        for state, (seconds, entries) in sorted(state_time.items(), key=lambda item: item[1][0], reverse=True):
+            share = seconds / active * 100 if active > 0 else 0.0
+            print(f"    {state:<14} {seconds:>9.1f} s {share:>5.1f}%  进入 {entries} 次，平均 {seconds / entries:.1f} s")
+
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for cycle in cycles:
+        groups.setdefault((cycle['rod_retrieve_interval'], cycle['fishing_click_interval']), []).append(cycle)
+    if groups:
+        print("  按参数分组 (收杆间隔, 点击间隔):")
+        for (retrieve, click), group in sorted(groups.items()):
+            duration = sum(cycle['duration'] for cycle in group)
+            catches = sum(cycle['outcome'] == 'caught' for cycle in group)
+            rate = catches / duration * 3600 if duration > 0 else 0.0
+            print(f"    {retrieve:g} s, {click:g} s: 周期 {len(group)} 次，上鱼 {catches}，每小时上鱼 {rate:.1f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="钓鱼统计汇总")
+    parser.add_argument("--db", default=str(Config.STATS_FILE), help="统计数据库路径")
+    parser.add_argument("--instance", help="只统计指定窗口标题的实例")
+    parser.add_argument("--hours", type=float, help="只统计最近的小时数")
+    args = parser.parse_args()
+
+    path = Path(args.db)
+    if not path.exists():
+        print(f"统计数据库 {path} 不存在，运行 main.py 后生成")
+        return
+    data = load(path, args.instance, args.hours)
+    if not data:
+        print("没有符合条件的统计记录")
+    for name, records in sorted(data.items()):
+        print_instance(name, records['cycles'], records['states'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""位置标定存储的读写往返和原子写入"""
+import json
+import os
+
+import pytest
+
+from calibration import CalibrationStore
+from common import GameConfig
+
+TITLE = 'MuMu模拟器12'
+
+
+@pytest.fixture
+def store(tmp_path):
+    """使用临时目录的标定存储，结束后恢复原来的目录"""
+    directory = CalibrationStore.directory
+    CalibrationStore.use(tmp_path)
+    yield tmp_path
+    CalibrationStore._dirty.clear()
+    CalibrationStore.use(directory)
+
+
+def calibrated(x: int, y: int) -> GameConfig:
+    """窗口在 (x, y) 处且已标定的配置"""
+    return GameConfig(
+        TITLE, (x, y, 1280, 720),
+        start_fishing_pos=(x + 1100, y + 650),
+        rod_position=(x + 1150, y + 600),
+        direction_icon_positions={'up': (x + 500, y + 200), 'left': (x + 560, y + 200)},
+        ui_rois={'use_button': (900, 600, 200, 80)},
+        template_scale=0.75,
+        template_thresholds={'use_button': 0.82},
+    )
+
+
+FIELDS = ('start_fishing_pos', 'rod_position', 'direction_icon_positions',
+          'ui_rois', 'template_scale', 'template_thresholds')
+
+
+def test_round_trip_follows_window_origin(store):
+    CalibrationStore.update(calibrated(100, 50), *FIELDS)
+    CalibrationStore.flush()
+    # 窗口移动后，保存的相对坐标换算到新的窗口位置
+    config = GameConfig(TITLE, (300, 200, 1280, 720))
+    CalibrationStore._cache.clear()
+    CalibrationStore.load(config)
+    expected = calibrated(300, 200)
+    for name in FIELDS:
+        assert getattr(config, name) == getattr(expected, name), name
+
+
+def test_unknown_resolution_is_not_loaded(store):
+    CalibrationStore.update(calibrated(0, 0), *FIELDS)
+    CalibrationStore.flush()
+    config = GameConfig(TITLE, (0, 0, 1920, 1080))
+    CalibrationStore.load(config)
+    assert config.start_fishing_pos is None and config.template_scale is None
+
+
+def test_update_is_written_only_on_flush(store):
+    config = calibrated(0, 0)
+    path = CalibrationStore.path(TITLE, (1280, 720))
+    CalibrationStore.update(config, *FIELDS)
+    assert not path.exists()
+    CalibrationStore.flush()
+    assert json.loads(path.read_text(encoding='utf-8'))['fields']['rod_position'] == [1150, 600]
+    # 值没有变化时不再写入
+    mtime = path.stat().st_mtime_ns
+    CalibrationStore.update(config, *FIELDS)
+    assert not CalibrationStore._dirty
+    CalibrationStore.flush()
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_failed_flush_keeps_previous_file(store, monkeypatch):
+    config = calibrated(0, 0)
+    path = CalibrationStore.path(TITLE, (1280, 720))
+    CalibrationStore.update(config, *FIELDS)
+    CalibrationStore.flush()
+    before = path.read_bytes()
+    
+    def interrupted(src, dst):
+        raise OSError('interrupted')
+    
+    config.rod_position = (10, 10)
+    CalibrationStore.update(config, 'rod_position')
+    monkeypatch.setattr(os, 'replace', interrupted)
+    with pytest.raises(OSError):
+        CalibrationStore.flush()
+    # 替换前中断，原文件完整，仍然可以读取
+    assert path.read_bytes() == before
+    assert CalibrationStore.read(path)['fields']['rod_position'] == (1150, 600)
+    monkeypatch.undo()
+    CalibrationStore.flush()
+    assert CalibrationStore.read(path)['fields']['rod_position'] == (10, 10)
+
+
+def test_corrupt_file_is_treated_as_uncalibrated(store):
+    path = CalibrationStore.path(TITLE, (1280, 720))
+    path.write_text('{"window_title": ', encoding='utf-8')
+    assert CalibrationStore.read(path) is None
+    path.write_text(json.dumps({'window_title': TITLE, 'resolution': [1280, 720],
+                                'fields': {'__import__': 1}}), encoding='utf-8')
+    assert CalibrationStore.read(path) is None
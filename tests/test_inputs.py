@@ -0,0 +1,105 @@
+"""输入分发器的合并和过期丢弃"""
+import time
+from threading import Event
+
+import pytest
+
+from inputs import InputCommand, InputDispatcher, InputPriority, RecordingInputBackend
+
+
+class BlockingBackend(RecordingInputBackend):
+    """可以让输入线程停在一条命令上的记录后端"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = Event()
+        self.release = Event()
+
+    def block(self) -> None:
+        self.started.set()
+        self.release.wait(5)
+
+
+def command(*positions, priority=InputPriority.SEQUENCE, **kwargs) -> InputCommand:
+    """依次点击各位置的命令"""
+    steps = tuple(('click', (position,)) for position in positions)
+    return InputCommand('click', steps, priority, time.monotonic(), **kwargs)
+
+
+@pytest.fixture
+def dispatcher():
+    """输入线程停在一条阻塞命令上，之后提交的命令都在队列中等待"""
+    backend = BlockingBackend()
+    dispatcher = InputDispatcher(backend)
+    dispatcher.submit(InputCommand('block', (('block', ()),), InputPriority.ROD, time.monotonic()))
+    assert backend.started.wait(5)
+    yield dispatcher
+    backend.release.set()
+    assert dispatcher.flush(5)
+
+
+def clicks(dispatcher):
+    return [args for _, action, args in dispatcher.backend.actions if action == 'click']
+
+
+def test_same_key_is_coalesced_while_pending(dispatcher):
+    first, second = Event(), Event()
+    assert dispatcher.submit(command((1, 1), coalesce_key='rod', done=first))
+    assert not dispatcher.submit(command((2, 2), coalesce_key='rod', done=second))
+    assert dispatcher.submit(command((3, 3), coalesce_key='other'))
+    assert dispatcher.coalesced == 1
+    assert not first.is_set() and not second.is_set()
+    dispatcher.backend.release.set()
+    assert dispatcher.flush(5)
+    # 被合并的命令不执行，它的 done 与合并到的命令一起设置
+    assert clicks(dispatcher) == [(1, 1), (3, 3)]
+    assert first.is_set() and second.is_set()
+
+
+def test_coalesced_submit_refreshes_created(dispatcher):
+    stale = command((1, 1), coalesce_key='rod', max_age=0.5)
+    stale.created -= 1
+    dispatcher.submit(stale)
+    assert not dispatcher.submit(command((2, 2), coalesce_key='rod', max_age=0.5))
+    dispatcher.backend.release.set()
+    assert dispatcher.flush(5)
+    assert dispatcher.dropped == 0
+    assert clicks(dispatcher) == [(1, 1)]
+
+
+def test_key_can_be_submitted_again_after_execution():
+    dispatcher = InputDispatcher(RecordingInputBackend())
+    assert dispatcher.submit(command((1, 1), coalesce_key='rod'))
+    assert dispatcher.flush(5)
+    assert dispatcher.submit(command((2, 2), coalesce_key='rod'))
+    assert dispatcher.flush(5)
+    assert clicks(dispatcher) == [(1, 1), (2, 2)]
+    assert dispatcher.coalesced == 0
+
+
+def test_stale_command_is_dropped(dispatcher):
+    done, merged = Event(), Event()
+    stale = command((9, 9), coalesce_key='rod', max_age=0.05, done=done)
+    dispatcher.submit(stale)
+    dispatcher.submit(command((8, 8), coalesce_key='rod', done=merged))
+    dispatcher.submit(command((1, 1), max_age=60))
+    dispatcher.submit(command((2, 2)))
+    time.sleep(0.1)
+    dispatcher.backend.release.set()
+    assert dispatcher.flush(5)
+    assert dispatcher.dropped == 1
+    assert clicks(dispatcher) == [(1, 1), (2, 2)]
+    # 丢弃的命令同样设置 done，并允许再次提交相同合并键的命令
+    assert done.is_set() and merged.is_set()
+    assert dispatcher.submit(command((3, 3), coalesce_key='rod'))
+
+
+def test_priority_order(dispatcher):
+    dispatcher.submit(command((3, 3), priority=InputPriority.ROUTINE))
+    dispatcher.submit(command((2, 2), priority=InputPriority.SEQUENCE))
+    dispatcher.submit(command((1, 1), priority=InputPriority.ROD))
+    dispatcher.submit(command((4, 4), priority=InputPriority.ROUTINE))
+    dispatcher.backend.release.set()
+    assert dispatcher.flush(5)
+    assert clicks(dispatcher) == [(1, 1), (2, 2), (3, 3), (4, 4)]
+    assert dispatcher.executed == 5
@@ -0,0 +1,62 @@
+"""耗时直方图的分位数精度和合并"""
+import math
+import random
+
+import pytest
+
+from metrics import LatencyHistogram
+
+
+def exact_percentile(values, q):
+    """与 LatencyHistogram.percentile 相同定义的精确分位数"""
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * q / 100)) - 1]
+
+
+def histogram(values) -> LatencyHistogram:
+    hist = LatencyHistogram()
+    for micros in values:
+        hist.record(micros / 1_000_000)
+    return hist
+
+
+QUANTILES = (0, 1, 25, 50, 90, 99, 99.9, 100)
+
+
+def test_small_values_are_exact():
+    values = list(range(128)) * 3
+    hist = histogram(values)
+    for q in QUANTILES:
+        assert round(hist.percentile(q) * 1_000_000) == exact_percentile(values, q), q
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_quantiles_within_relative_error(seed):
+    rng = random.Random(seed)
+    # 对数分布覆盖微秒到秒的多个数量级
+    values = [int(10 ** rng.uniform(1, 7)) for _ in range(5000)]
+    hist = histogram(values)
+    for q in QUANTILES:
+        expected = exact_percentile(values, q)
+        actual = hist.percentile(q) * 1_000_000
+        assert abs(actual - expected) <= expected / 64 + 1e-6, (q, actual, expected)
+    assert hist.count == len(values)
+    assert hist.max == max(values)
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().percentile(50) == 0.0
+    assert LatencyHistogram().summary() == {'count': 0}
+
+
+def test_merge_equals_combined_recording():
+    rng = random.Random(7)
+    first = [int(10 ** rng.uniform(1, 6)) for _ in range(1000)]
+    second = [int(10 ** rng.uniform(3, 7)) for _ in range(1000)]
+    merged = histogram(first)
+    merged.merge(histogram(second))
+    combined = histogram(first + second)
+    assert merged.counts == combined.counts
+    assert (merged.count, merged.total, merged.max) == (combined.count, combined.total, combined.max)
+    for q in QUANTILES:
+        assert merged.percentile(q) == combined.percentile(q)
@@ -0,0 +1,48 @@
+"""方向图标峰值提取与旧版本逐点比较聚类的一致性"""
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmark import baseline_classify_positions, make_dense_response
+from common import FishState
+from setting import Config
+from simulator import FishingSimulator
+from vision import ImageProcessor
+
+
+def instant_kill_frames():
+    """模拟器合成的秒杀画面和实际的游戏截图"""
+    frames = []
+    for seed in range(4):
+        simulator = FishingSimulator(Config.WINDOW_SIZE, seed=seed)
+        rng = random.Random(seed)
+        simulator.sequence = [rng.choice(Config.DIRECTION_ICONS) for _ in range(rng.randint(4, 8))]
+        frames.append(simulator.render_state(FishState.INSTANT_KILL))
+    frames.append(cv2.imread(str(Config.IMAGE_DIR / 'description_images' / 'diaoyu.png')))
+    return frames
+
+
+@pytest.mark.parametrize('frame', instant_kill_frames())
+def test_peaks_match_baseline_on_frames(frame):
+    top_half = frame[:frame.shape[0] // 2]
+    for path in Config.DIRECTION_ICONS:
+        res = cv2.matchTemplate(top_half, cv2.imread(str(path)), cv2.TM_CCOEFF_NORMED)
+        expected = baseline_classify_positions(list(zip(*np.where(res >= 0.8)[::-1])))
+        peaks = ImageProcessor.extract_peaks(res, 0.8)
+        assert [pos for pos, _ in peaks] == expected
+
+
+def test_peak_score_is_cluster_maximum():
+    res = np.zeros((40, 60), dtype=np.float32)
+    res[10:13, 20:23] = 0.85
+    res[11, 21] = 0.97
+    res[30, 50] = 0.9  # 只有一个点，被丢弃
+    assert ImageProcessor.extract_peaks(res, 0.8) == [((21, 11), pytest.approx(0.97))]
+
+
+def test_one_peak_per_instance_on_dense_response():
+    peaks = ImageProcessor.extract_peaks(make_dense_response(15), 0.8)
+    assert len(peaks) == 8
+    assert [pos[0] for pos, _ in peaks] == sorted(pos[0] for pos, _ in peaks)
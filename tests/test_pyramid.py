@@ -0,0 +1,42 @@
+"""金字塔模板匹配在缩小网格各偏移下的识别和未匹配时的搜索范围"""
+import pytest
+
+from setting import Config
+from simulator import FishingSimulator
+from vision import ImageProcessor, PyramidMatcher, TemplateRegistry
+
+TEMPLATES = [Config.USE_BUTTON, Config.RETRY_BUTTON, *Config.DIRECTION_ICONS[:2]]
+
+
+@pytest.fixture(scope='module')
+def background():
+    return FishingSimulator(Config.WINDOW_SIZE).background
+
+
+@pytest.mark.parametrize('path', TEMPLATES, ids=lambda path: path.stem)
+def test_template_off_coarse_grid_is_found(background, path):
+    template = TemplateRegistry().get(path).color
+    step = round(1 / Config.PYRAMID_SCALE)
+    for dy in range(step):
+        for dx in range(step):
+            x, y = 600 + dx, 500 + dy
+            frame = background.copy()
+            frame[y:y + template.shape[0], x:x + template.shape[1]] = template
+            score, loc = PyramidMatcher.find(frame, template, 0.8)
+            assert score >= 0.8 and loc == (x, y), (dx, dy, score, loc)
+
+
+@pytest.mark.parametrize('path', TEMPLATES, ids=lambda path: path.stem)
+def test_negative_check_does_not_search_full_frame(background, path, monkeypatch):
+    template = TemplateRegistry().get(path).color
+    rois = []
+    find_template = ImageProcessor.find_template
+
+    def record(img, template, roi=None):
+        rois.append(roi)
+        return find_template(img, template, roi)
+
+    monkeypatch.setattr(ImageProcessor, 'find_template', staticmethod(record))
+    score, _ = PyramidMatcher.find(background, template, 0.8)
+    assert score < 0.8
+    assert rois and None not in rois
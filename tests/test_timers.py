@@ -0,0 +1,88 @@
+"""时间轮定时器的到期、替换和取消"""
+import time
+
+import pytest
+
+from main import TimerWheel
+
+TICK = 0.25  # 二进制可精确表示，刻度计算没有舍入误差
+SLOTS = 8
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+def fire(wheel):
+    return sorted(callback() for callback in wheel.expire())
+
+
+def test_timer_fires_after_delay(clock):
+    wheel = TimerWheel(TICK, SLOTS)
+    wheel.schedule(1.0, 'a', lambda: 'a')
+    assert wheel.next_deadline() == 1001.0
+    clock[0] += 0.75
+    assert fire(wheel) == []
+    clock[0] += 0.25
+    assert fire(wheel) == ['a']
+    assert wheel.next_deadline() is None
+    assert fire(wheel) == []
+
+
+def test_same_key_replaces_timer(clock):
+    wheel = TimerWheel(TICK, SLOTS)
+    wheel.schedule(0.5, 'a', lambda: 'old')
+    wheel.schedule(1.5, 'a', lambda: 'new')
+    assert wheel.next_deadline() == 1001.5
+    clock[0] += 1.0
+    assert fire(wheel) == []
+    clock[0] += 0.5
+    assert fire(wheel) == ['new']
+
+
+def test_cancel_removes_timer(clock):
+    wheel = TimerWheel(TICK, SLOTS)
+    wheel.schedule(0.5, 'a', lambda: 'a')
+    wheel.schedule(0.75, 'b', lambda: 'b')
+    wheel.cancel('a')
+    wheel.cancel('missing')
+    assert wheel.next_deadline() == 1000.75
+    clock[0] += 1.0
+    assert fire(wheel) == ['b']
+
+
+def test_zero_delay_fires_on_next_tick(clock):
+    wheel = TimerWheel(TICK, SLOTS)
+    wheel.schedule(0, 'now', lambda: 'now')
+    assert fire(wheel) == []
+    clock[0] += TICK
+    assert fire(wheel) == ['now']
+
+
+def test_timer_beyond_one_revolution(clock):
+    wheel = TimerWheel(TICK, SLOTS)
+    delay = TICK * SLOTS * 2 + 0.5
+    wheel.schedule(delay, 'late', lambda: 'late')
+    wheel.schedule(0.5, 'same_slot', lambda: 'same_slot')
+    # 逐个刻度推进，经过到期刻度所在的槽位时不能提前触发
+    fired = []
+    for _ in range(int(delay / TICK) - 1):
+        clock[0] += TICK
+        fired += fire(wheel)
+    assert fired == ['same_slot']
+    clock[0] += TICK
+    assert fire(wheel) == ['late']
+
+
+def test_long_gap_fires_every_due_timer(clock):
+    wheel = TimerWheel(TICK, SLOTS)
+    for i in range(12):
+        wheel.schedule(TICK * (i + 1), i, lambda i=i: i)
+    wheel.schedule(100.0, 'later', lambda: 'later')
+    clock[0] += 10
+    assert fire(wheel) == list(range(12))
+    assert wheel.next_deadline() == 1100.0
@@ -0,0 +1,110 @@
+"""像素探针的容差和回差，批量模板匹配与 cv2.matchTemplate 的一致性"""
+import cv2
+import numpy as np
+import pytest
+
+from capture import Frame
+from common import FishState
+from setting import Config
+from simulator import FishingSimulator
+from vision import ColorProbe, MultiTemplateMatcher, ProbeSampler, TemplateRegistry
+
+REFERENCE = (200, 40, 40)  # RGB
+TOLERANCE = 20
+HYSTERESIS = 10
+
+
+class ProbeFrames:
+    """依次生成纯色的帧，帧序号递增"""
+    
+    def __init__(self):
+        self.seq = 0
+    
+    def __call__(self, offset: int) -> Frame:
+        self.seq += 1
+        image = np.empty((40, 40, 3), dtype=np.uint8)
+        image[:] = (REFERENCE[2], REFERENCE[1], REFERENCE[0] - offset)  # BGR
+        return Frame(self.seq, 0.0, image, (100, 100))
+
+
+@pytest.fixture
+def sampler():
+    return ProbeSampler([ColorProbe('rod', (120, 120), REFERENCE)], 2, TOLERANCE, HYSTERESIS)
+
+
+def test_probe_deviates_only_beyond_tolerance_plus_hysteresis(sampler):
+    frames = ProbeFrames()
+    for offset in (0, TOLERANCE, TOLERANCE + 1, TOLERANCE + HYSTERESIS):
+        assert not sampler.is_deviated(frames(offset), 'rod'), offset
+    assert sampler.is_deviated(frames(TOLERANCE + HYSTERESIS + 1), 'rod')
+
+
+def test_probe_recovers_only_within_tolerance(sampler):
+    frames = ProbeFrames()
+    assert sampler.is_deviated(frames(TOLERANCE + HYSTERESIS + 1), 'rod')
+    # 回差区间内保持偏离状态
+    for offset in (TOLERANCE + HYSTERESIS, TOLERANCE + 1):
+        assert sampler.is_deviated(frames(offset), 'rod'), offset
+    assert not sampler.is_deviated(frames(TOLERANCE), 'rod')
+    assert not sampler.is_deviated(frames(TOLERANCE + 1), 'rod')
+
+
+def test_probe_samples_each_frame_once(sampler):
+    frames = ProbeFrames()
+    frame = frames(TOLERANCE + HYSTERESIS + 1)
+    assert sampler.is_deviated(frame, 'rod')
+    frame.image[:] = (REFERENCE[2], REFERENCE[1], REFERENCE[0])
+    assert sampler.is_deviated(frame, 'rod')
+
+
+def test_probe_averages_patch(sampler):
+    image = np.zeros((40, 40, 3), dtype=np.uint8)
+    image[:] = (REFERENCE[2], REFERENCE[1], REFERENCE[0])
+    # 小块中单个像素的噪声被均值平滑
+    image[20, 20] = (255, 255, 255)
+    assert not sampler.is_deviated(Frame(1, 0.0, image, (100, 100)), 'rod')
+
+
+@pytest.fixture(scope='module')
+def frames():
+    """模拟器各状态的灰度画面"""
+    simulator = FishingSimulator(Config.WINDOW_SIZE, seed=1)
+    return [cv2.cvtColor(simulator.render_state(state), cv2.COLOR_BGR2GRAY)
+            for state in (FishState.NO_BAIT, FishState.INSTANT_KILL, FishState.END_FISHING)]
+
+
+@pytest.fixture(scope='module')
+def templates():
+    registry = TemplateRegistry()
+    paths = [Config.USE_BUTTON, Config.RETRY_BUTTON, *Config.DIRECTION_ICONS[:2]]
+    return {path.stem: registry.get(path).gray for path in paths}
+
+
+def test_batched_scores_match_cv2(frames, templates):
+    matcher = MultiTemplateMatcher(templates)
+    for frame in frames:
+        results = matcher.match(frame)
+        assert set(results) == set(templates)
+        for key, template in templates.items():
+            expected = cv2.matchTemplate(frame, template, cv2.TM_CCOEFF_NORMED)
+            assert results[key].shape == expected.shape
+            np.testing.assert_allclose(results[key], expected, atol=1e-3)
+            # 识别到的位置一致，低分时多个位置分数接近，不比较
+            if cv2.minMaxLoc(expected)[1] >= Config.MATCH_THRESHOLD:
+                assert cv2.minMaxLoc(results[key])[3] == cv2.minMaxLoc(expected)[3]
+
+
+def test_batched_match_selects_keys_and_skips_large_templates(frames, templates):
+    matcher = MultiTemplateMatcher(templates)
+    crop = frames[0][:60, :80]
+    results = matcher.match(crop, keys=list(templates)[:2])
+    fits = [key for key in list(templates)[:2]
+            if templates[key].shape[0] <= 60 and templates[key].shape[1] <= 80]
+    assert list(results) == fits
+
+
+def test_batched_match_accepts_color_templates(frames):
+    template = frames[1][300:340, 500:560].copy()
+    color = cv2.cvtColor(template, cv2.COLOR_GRAY2BGR)
+    results = MultiTemplateMatcher({'patch': color}).match(frames[1])
+    assert cv2.minMaxLoc(results['patch'])[3] == (500, 300)
@@ -0,0 +1,80 @@
+"""状态转换的 N-of-M 多帧确认"""
+import pytest
+
+from common import FishState
+from main import TransitionVoter
+from setting import Config
+
+STATE = FishState.CATCH_FISH
+OTHER = FishState.NO_BAIT
+
+
+@pytest.fixture(params=[(1, 1), (2, 3), (3, 5)], ids=lambda nm: f'{nm[0]}of{nm[1]}')
+def confirmation(request, monkeypatch):
+    monkeypatch.setattr(Config, 'STATE_CONFIRMATIONS', {STATE.name: request.param})
+    return request.param
+
+
+def test_confirmation_falls_back_to_default(confirmation):
+    assert TransitionVoter.confirmation(STATE) == confirmation
+    assert TransitionVoter.confirmation(OTHER) == Config.STATE_CONFIRMATION
+
+
+def test_confirms_when_n_of_last_m_frames_hit(confirmation):
+    n, m = confirmation
+    voter = TransitionVoter()
+    # 命中和未命中交替，第N次命中时仍在M帧窗口内
+    frames = [STATE] * (n - 1) + [None] * (m - n)
+    for hit in frames:
+        assert voter.observe((STATE, OTHER), hit) is None
+    assert voter.observe((STATE, OTHER), STATE) == STATE
+
+
+def test_fewer_than_n_hits_do_not_confirm(confirmation):
+    n, m = confirmation
+    voter = TransitionVoter()
+    for i in range(3 * m):
+        hit = STATE if i % m < n - 1 else None
+        assert voter.observe((STATE, OTHER), hit) is None
+
+
+def test_hits_sliding_out_of_window_are_forgotten(confirmation):
+    n, m = confirmation
+    if n == 1:
+        pytest.skip('单帧确认没有窗口')
+    voter = TransitionVoter()
+    for _ in range(n - 1):
+        voter.observe((STATE,), STATE)
+    assert voter.undecided
+    for _ in range(m):
+        voter.observe((STATE,), None)
+    assert not voter.undecided
+    assert voter.observe((STATE,), STATE) is None
+
+
+def test_hit_for_other_candidate_counts_as_miss(confirmation):
+    n, m = confirmation
+    if n == 1:
+        pytest.skip('单帧确认没有窗口')
+    voter = TransitionVoter()
+    for _ in range(n - 1):
+        voter.observe((STATE, OTHER), STATE)
+    for _ in range(m - n + 1):
+        voter.observe((STATE, OTHER), OTHER)
+    assert voter.observe((STATE, OTHER), STATE) is None
+
+
+def test_strong_match_confirms_in_one_frame(confirmation):
+    voter = TransitionVoter()
+    assert voter.observe((STATE, OTHER), STATE, strong=True) == STATE
+    assert TransitionVoter().observe((STATE, OTHER), None, strong=True) is None
+
+
+def test_reset_clears_windows(confirmation):
+    n, _ = confirmation
+    voter = TransitionVoter()
+    for _ in range(n - 1):
+        voter.observe((STATE,), STATE)
+    voter.reset()
+    assert not voter.undecided
+    assert voter.observe((STATE,), STATE) == (STATE if n == 1 else None)
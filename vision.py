@@ -0,0 +1,766 @@
+"""模板匹配和界面识别
+
+模板注册表、金字塔匹配、多模板批量匹配、颜色探针和画面变化检测，
+VisionJobs 把这些匹配封装为可以提交到识别线程或识别进程的任务。
+"""
+import math
+import weakref
+import numpy as np
+from threading import Lock
+from concurrent.futures import Future
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Dict, List, Hashable, Iterable
+from dataclasses import dataclass
+from setting import Config
+from common import FishState, LazyModule, STATE_TEMPLATES
+from metrics import Metrics
+from capture import Frame
+import logging
+
+# OpenCV 导入较慢，推迟到第一次识别时
+cv2 = LazyModule('cv2', globals())
+
+
+class ImageProcessor:
+    """图像处理类，处理所有图像相关的操作"""
+    
+    @staticmethod
+    def extract_peaks(res: np.ndarray, threshold: float) -> List[Tuple[Tuple[int, int], float]]:
+        """非极大值抑制，从匹配结果中提取每个图标实例的位置和分数
+        
+        超过阈值的点按8连通划分连通域，每个连通域是一个图标实例，只有一个点的连通域被丢弃。
+        
+        Args:
+            res: cv2.matchTemplate 的结果
+            threshold: 匹配阈值
+            
+        Returns:
+            按连通域第一个点的行优先顺序排列的 [((x, y), 连通域内的最高匹配度), ...]，位置取连通域内各点的均值
+        """
+        mask = (res >= threshold).astype(np.uint8)
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count <= 1:
+            return []
+        ys, xs = np.nonzero(mask)
+        members = labels[ys, xs]
+        best = np.full(count, -np.inf)
+        np.maximum.at(best, members, res[ys, xs])
+        # np.nonzero 按行优先顺序返回，各连通域第一次出现的位置即其顺序
+        labels_found, first = np.unique(members, return_index=True)
+        order = labels_found[np.argsort(first)]
+        return [((int(centroids[label, 0]), int(centroids[label, 1])), float(best[label]))
+                for label in order if stats[label, cv2.CC_STAT_AREA] > 1]
+    
+    @staticmethod
+    def find_template(img: np.ndarray, 
+                     template: np.ndarray, 
+                     roi: Optional[Tuple[int, int, int, int]] = None) -> Tuple[float, Tuple[int, int]]:
+        """在整张图像或指定区域内进行模板匹配
+        
+        Args:
+            img: 输入图像
+            template: 模板图像
+            roi: 搜索区域 (x, y, width, height)，超出图像的部分会被裁剪，为None时搜索整张图像
+            
+        Returns:
+            最大匹配分数和匹配位置左上角在输入图像中的坐标 (x, y)，搜索区域小于模板时分数为-1
+        """
+        offset_x, offset_y = 0, 0
+        if roi is not None:
+            offset_x, offset_y = max(0, roi[0]), max(0, roi[1])
+            end_x = min(img.shape[1], roi[0] + roi[2])
+            end_y = min(img.shape[0], roi[1] + roi[3])
+            img = img[offset_y:end_y, offset_x:end_x]
+        
+        if img.shape[0] < template.shape[0] or img.shape[1] < template.shape[1]:
+            return -1.0, (offset_x, offset_y)
+        
+        res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        return max_val, (max_loc[0] + offset_x, max_loc[1] + offset_y)
+    
+    @staticmethod
+    def is_match_template(img: np.ndarray, 
+                         template: np.ndarray, 
+                         threshold: float = 0.8,
+                         roi: Optional[Tuple[int, int, int, int]] = None) -> bool:
+        """模板匹配判断，未指定搜索区域时使用金字塔匹配，分数达到阈值即提前返回"""
+        if roi is not None:
+            score, _ = ImageProcessor.find_template(img, template, roi)
+        else:
+            score, _ = PyramidMatcher.find(img, template, threshold, early_exit=True)
+        return score >= threshold
+    
+    @staticmethod
+    def match_template(img: np.ndarray, 
+                      template: np.ndarray, 
+                      threshold: float = 0.8,
+                      position: Tuple[float, float] = (0.5, 0.5)) -> Tuple[int, int]:
+        """模板匹配并返回指定位置
+        
+        Args:
+            img: 输入图像
+            template: 模板图像
+            threshold: 匹配阈值
+            position: 归一化位置坐标，范围[0,1]，(0,0)表示左上角，(1,1)表示右下角，默认为(0.5,0.5)即中心位置
+                    如果值超出范围，将自动调整到最近的合法值
+            
+        Returns:
+            返回指定位置的坐标 (x, y)
+        """
+        # 将position值限制在[0,1]范围内
+        clamped_x = max(0, min(1, position[0]))
+        clamped_y = max(0, min(1, position[1]))
+        
+        # 如果值被调整，记录日志
+        if clamped_x != position[0] or clamped_y != position[1]:
+            logging.warning(f"position参数值被调整: {position} -> ({clamped_x}, {clamped_y})")
+            
+        max_val, max_loc = PyramidMatcher.find(img, template, threshold)
+        
+        # 获取模板的宽高
+        template_width = template.shape[1]
+        template_height = template.shape[0]
+        
+        # 根据归一化位置计算实际坐标
+        x = int(max_loc[0] + template_width * clamped_x)
+        y = int(max_loc[1] + template_height * clamped_y)
+            
+        return (x, y)
+
+
+@dataclass(frozen=True)
+class Template:
+    """预加载的模板图像及其元数据"""
+    name: str  # 模板名称(文件名去掉后缀)
+    path: Path  # 模板文件路径
+    color: np.ndarray  # BGR彩色图像
+    gray: np.ndarray  # 灰度图像
+    shape: Tuple[int, int]  # 模板大小 (height, width)
+    mean: float  # 灰度均值，用于归一化匹配
+    std: float  # 灰度标准差，用于归一化匹配
+
+
+class TemplateRegistry:
+    """模板注册表，启动时一次性加载并缓存所有模板图像
+    
+    scale 不为1时模板按比例缩放，用于与截取模板时大小不同的窗口。
+    """
+    
+    def __init__(self, paths: Optional[List[Path]] = None, scale: float = 1.0):
+        self.scale = scale
+        self._templates: Dict[Path, Template] = {}
+        self._scaled: Dict[float, TemplateRegistry] = {}
+        self._lock = Lock()
+        for path in (Config.TEMPLATE_FILES if paths is None else paths):
+            self._templates[path] = self._load(path, scale)
+        if scale == 1.0:
+            logging.info(f"已预加载 {len(self._templates)} 个模板图像")
+        else:
+            logging.info(f"已按比例 {scale:.3f} 缩放 {len(self._templates)} 个模板图像")
+    
+    @staticmethod
+    def _load(path: Path, scale: float = 1.0) -> Template:
+        """读取模板图像并计算元数据"""
+        color = cv2.imread(str(path))
+        if color is None:
+            raise FileNotFoundError(f"无法读取模板图像: {path}")
+        if scale != 1.0:
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            color = cv2.resize(color, None, fx=scale, fy=scale, interpolation=interpolation)
+        gray = cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)
+        mean, std = cv2.meanStdDev(gray)
+        # 缓存的图像在多个线程间共享，禁止写入
+        color.flags.writeable = False
+        gray.flags.writeable = False
+        return Template(
+            name=path.stem,
+            path=path,
+            color=color,
+            gray=gray,
+            shape=(color.shape[0], color.shape[1]),
+            mean=float(mean[0][0]),
+            std=float(std[0][0])
+        )
+    
+    def get(self, path: Path) -> Template:
+        """获取模板，未预加载的模板会在首次使用时加载并缓存"""
+        template = self._templates.get(path)
+        if template is None:
+            template = self._load(path, self.scale)
+            self._templates[path] = template
+        return template
+    
+    def scaled(self, scale: float) -> 'TemplateRegistry':
+        """按比例缩放的模板注册表，多个实例共享同一比例的缩放结果"""
+        if scale == self.scale:
+            return self
+        with self._lock:
+            registry = self._scaled.get(scale)
+            if registry is None:
+                registry = TemplateRegistry(list(self._templates), scale)
+                self._scaled[scale] = registry
+        return registry
+
+
+class ScaleCalibrator:
+    """搜索窗口内容相对模板图像的缩放比例
+    
+    先按窗口宽度估计比例，在其附近用缩小的灰度图对各状态的界面模板做粗搜索，
+    再在最佳匹配位置附近以原始分辨率细化比例。每个窗口只需要搜索一次，结果保存在位置标定中。
+    """
+    
+    @staticmethod
+    def _resize(gray: np.ndarray, scale: float) -> np.ndarray:
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+    
+    @staticmethod
+    def estimate(img: np.ndarray, templates: TemplateRegistry) -> Tuple[float, float]:
+        """搜索模板比例
+        
+        Args:
+            img: 窗口截图
+            templates: 未缩放的模板注册表
+            
+        Returns:
+            (模板比例, 匹配分数)，窗口大小与截取模板时相同时直接返回 (1.0, 1.0)
+        """
+        width = img.shape[1]
+        if width == Config.TEMPLATE_RESOLUTION[0]:
+            return 1.0, 1.0
+        guess = width / Config.TEMPLATE_RESOLUTION[0]
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        coarse_scale = Config.PYRAMID_SCALE
+        coarse_img = ScaleCalibrator._resize(gray, coarse_scale)
+        
+        # 粗搜索: 各界面模板在缩小的截图上按一组比例匹配
+        best_val, best_scale, best_path, best_loc = -1.0, guess, None, (0, 0)
+        for path in STATE_TEMPLATES.values():
+            template = templates.get(path).gray
+            for factor in np.linspace(*Config.SCALE_SEARCH_RANGE):
+                scale = guess * float(factor)
+                coarse = ScaleCalibrator._resize(template, scale * coarse_scale)
+                if (min(coarse.shape) < Config.PYRAMID_MIN_SIZE 
+                        or coarse.shape[0] > coarse_img.shape[0] or coarse.shape[1] > coarse_img.shape[1]):
+                    continue
+                _, max_val, _, max_loc = cv2.minMaxLoc(cv2.matchTemplate(coarse_img, coarse, cv2.TM_CCOEFF_NORMED))
+                if max_val > best_val:
+                    best_val, best_scale, best_path = max_val, scale, path
+                    best_loc = (int(max_loc[0] / coarse_scale), int(max_loc[1] / coarse_scale))
+        if best_path is None:
+            return guess, -1.0
+        
+        # 精搜索: 只在粗搜索位置附近以原始分辨率匹配
+        template = templates.get(best_path).gray
+        coarse_val, coarse_best = best_val, best_scale
+        best_val = -1.0
+        for factor in np.linspace(*Config.SCALE_REFINE_RANGE):
+            scale = coarse_best * float(factor)
+            full = ScaleCalibrator._resize(template, scale)
+            margin = int(max(full.shape) * 0.1) + int(2 / coarse_scale)
+            x0, y0 = max(0, best_loc[0] - margin), max(0, best_loc[1] - margin)
+            region = gray[y0:best_loc[1] + full.shape[0] + margin, x0:best_loc[0] + full.shape[1] + margin]
+            if full.shape[0] > region.shape[0] or full.shape[1] > region.shape[1]:
+                continue
+            _, max_val, _, _ = cv2.minMaxLoc(cv2.matchTemplate(region, full, cv2.TM_CCOEFF_NORMED))
+            if max_val > best_val:
+                best_val, best_scale = max_val, scale
+        if best_val < 0:
+            return coarse_best, coarse_val
+        logging.info(f"模板比例搜索: {best_path.stem} 在比例 {best_scale:.3f} 处匹配分数 {best_val:.3f}")
+        return round(best_scale, 4), best_val
+
+
+class PyramidMatcher:
+    """由粗到精的图像金字塔模板匹配器
+    
+    先在按 Config.PYRAMID_SCALE 缩小的灰度图上匹配，同时尝试 Config.PYRAMID_DRIFT_SCALES 中的
+    模板缩放比例以容忍窗口大小的轻微变化，再只在候选峰值附近以原始分辨率做彩色精确匹配。
+    模板较小(例如窗口缩小后按比例缩放的模板)时适当增大粗匹配的比例，保证缩小后的模板不小于 Config.PYRAMID_MIN_SIZE。
+    粗匹配分数随模板相对缩小网格的偏移变化，低纹理模板(例如按钮)在某些偏移下分数很低，
+    因此按模板自身在各网格偏移下的粗匹配分数选择比例，并且每个缩放比例的最高峰总作为候选精确匹配，
+    不需要退回原始分辨率的全图匹配，未匹配时的耗时与粗匹配相当。
+    """
+    
+    # 粗匹配比例超过该值时两级匹配已不划算，直接在原始分辨率匹配
+    MAX_COARSE_SCALE = 0.5
+    
+    # 模板缓存最多保留的模板数，超出时淘汰最久未使用的模板
+    CACHE_SIZE = 64
+    
+    # 模板缓存: id(模板) -> (模板的弱引用, {(缩放比例, 粗匹配比例): (缩放后的模板或None, 缩小后的灰度模板)},
+    #                        {粗匹配比例: 各网格偏移下的最低粗匹配分数})
+    # 只持有弱引用，id 被新模板复用时旧缓存项已失效，不会取到旧模板的缩放结果
+    _template_cache: "OrderedDict[int, Tuple[weakref.ref, Dict[Tuple[float, float], Tuple[Optional[np.ndarray], np.ndarray]], Dict[float, float]]]" = OrderedDict()
+    _cache_lock = Lock()
+    
+    @classmethod
+    def _get_entry(cls, template: np.ndarray) -> tuple:
+        """获取模板的缓存项，不存在时新建"""
+        key = id(template)
+        with cls._cache_lock:
+            entry = cls._template_cache.get(key)
+            if entry is None or entry[0]() is not template:
+                # 新增缓存项时顺便清理已释放模板的缓存项
+                for dead in [k for k, (ref, *_) in cls._template_cache.items() if ref() is None]:
+                    del cls._template_cache[dead]
+                entry = (weakref.ref(template), {}, {})
+                cls._template_cache[key] = entry
+                while len(cls._template_cache) > cls.CACHE_SIZE:
+                    cls._template_cache.popitem(last=False)
+            else:
+                cls._template_cache.move_to_end(key)
+        return entry
+    
+    @classmethod
+    def _get_scaled(cls, template: np.ndarray, drift: float, 
+                    coarse_scale: float = Config.PYRAMID_SCALE) -> Tuple[np.ndarray, np.ndarray]:
+        """获取按比例缩放后的原始分辨率模板和对应的粗匹配灰度模板"""
+        entry = cls._get_entry(template)
+        scaled = entry[1].get((drift, coarse_scale))
+        if scaled is None:
+            # 原始比例不另存模板，避免缓存项持有模板本身的强引用
+            full = None
+            if drift != 1.0:
+                interpolation = cv2.INTER_AREA if drift < 1.0 else cv2.INTER_LINEAR
+                full = cv2.resize(template, None, fx=drift, fy=drift, interpolation=interpolation)
+            source = template if full is None else full
+            gray = cv2.cvtColor(source, cv2.COLOR_BGR2GRAY) if source.ndim == 3 else source
+            coarse = cv2.resize(gray, None, fx=coarse_scale, fy=coarse_scale, interpolation=cv2.INTER_AREA)
+            scaled = (full, coarse)
+            entry[1][(drift, coarse_scale)] = scaled
+        full, coarse = scaled
+        return (template if full is None else full), coarse
+    
+    @classmethod
+    def phase_score(cls, template: np.ndarray, coarse_scale: float) -> float:
+        """模板在缩小网格各偏移下与自身粗匹配模板的最低分数
+        
+        按每种偏移裁掉模板左上角的像素后缩小，与去掉一圈边缘的粗匹配模板匹配，
+        近似模板出现在截图中不同位置时粗匹配能得到的分数。
+        """
+        entry = cls._get_entry(template)
+        score = entry[2].get(coarse_scale)
+        if score is None:
+            _, coarse = cls._get_scaled(template, 1.0, coarse_scale)
+            gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY) if template.ndim == 3 else template
+            inner = coarse[1:-1, 1:-1]
+            step = max(1, round(1 / coarse_scale))
+            score = 1.0
+            for dy in range(step):
+                for dx in range(step):
+                    shifted = cv2.resize(gray[dy:, dx:], None, fx=coarse_scale, fy=coarse_scale,
+                                         interpolation=cv2.INTER_AREA)
+                    if shifted.shape[0] < inner.shape[0] or shifted.shape[1] < inner.shape[1]:
+                        continue
+                    score = min(score, float(cv2.matchTemplate(shifted, inner, cv2.TM_CCOEFF_NORMED).max()))
+            entry[2][coarse_scale] = score
+        return score
+    
+    @classmethod
+    def coarse_scale(cls, template: np.ndarray) -> Optional[float]:
+        """模板使用的粗匹配比例，缩小后过小、不适合两级匹配时返回None"""
+        min_side = min(template.shape[:2]) * min(Config.PYRAMID_DRIFT_SCALES)
+        # 粗匹配比例取 2 的负整数次幂，同一窗口的各模板共用少数几种缩小图
+        scale = Config.PYRAMID_SCALE
+        while scale < cls.MAX_COARSE_SCALE and (
+                min_side * scale < Config.PYRAMID_MIN_SIZE 
+                or cls.phase_score(template, scale) < Config.PYRAMID_PHASE_THRESHOLD):
+            scale *= 2
+        return scale if min_side * scale >= Config.PYRAMID_MIN_SIZE else None
+    
+    @staticmethod
+    def downscale(img: np.ndarray, scale: float = Config.PYRAMID_SCALE) -> np.ndarray:
+        """生成用于粗匹配的缩小灰度图"""
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    @classmethod
+    def find(cls, img: np.ndarray, 
+             template: np.ndarray, 
+             threshold: float = 0.8,
+             early_exit: bool = False) -> Tuple[float, Tuple[int, int]]:
+        """金字塔模板匹配
+        
+        Args:
+            img: 输入图像
+            template: 模板图像
+            threshold: 匹配阈值，early_exit为True时首个达到阈值的候选即返回
+            early_exit: 是否在分数达到阈值后提前返回
+            
+        Returns:
+            最大匹配分数和匹配位置左上角坐标 (x, y)
+        """
+        scale = cls.coarse_scale(template)
+        if scale is None:
+            return ImageProcessor.find_template(img, template)
+        
+        coarse_img = cls.downscale(img, scale)
+        candidates = []  # (粗匹配分数, 原始分辨率下的左上角坐标)
+        for drift in Config.PYRAMID_DRIFT_SCALES:
+            _, coarse = cls._get_scaled(template, drift, scale)
+            if coarse.shape[0] > coarse_img.shape[0] or coarse.shape[1] > coarse_img.shape[1]:
+                continue
+            res = cv2.matchTemplate(coarse_img, coarse, cv2.TM_CCOEFF_NORMED)
+            half_h, half_w = coarse.shape[0] // 2, coarse.shape[1] // 2
+            for i in range(Config.PYRAMID_MAX_CANDIDATES):
+                _, max_val, _, max_loc = cv2.minMaxLoc(res)
+                # 最高峰总作为候选，低纹理模板在不利的网格偏移下粗匹配分数可能低于阈值
+                if i > 0 and max_val < Config.PYRAMID_COARSE_THRESHOLD:
+                    break
+                candidates.append((max_val, (int(max_loc[0] / scale), int(max_loc[1] / scale))))
+                # 抑制该峰值附近的响应，继续寻找下一个候选
+                res[max(0, max_loc[1] - half_h):max_loc[1] + half_h + 1,
+                    max(0, max_loc[0] - half_w):max_loc[0] + half_w + 1] = -1.0
+        
+        # 合并不同缩放比例在同一位置产生的候选，按粗匹配分数从高到低保留
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        locations = []
+        for _, loc in candidates:
+            if all(abs(loc[0] - x) > template.shape[1] // 2 or abs(loc[1] - y) > template.shape[0] // 2
+                   for x, y in locations):
+                locations.append(loc)
+        
+        # 在候选位置附近以原始分辨率精确匹配，优先尝试原始比例的模板
+        padding = int(3 / scale)
+        best_val, best_loc = -1.0, (0, 0)
+        for x, y in locations[:Config.PYRAMID_MAX_CANDIDATES]:
+            for drift in Config.PYRAMID_DRIFT_SCALES:
+                full, _ = cls._get_scaled(template, drift, scale)
+                roi = (x - padding, y - padding, full.shape[1] + padding * 2, full.shape[0] + padding * 2)
+                max_val, max_loc = ImageProcessor.find_template(img, full, roi)
+                if max_val > best_val:
+                    best_val, best_loc = max_val, max_loc
+                if early_exit and best_val >= threshold:
+                    return best_val, best_loc
+        return best_val, best_loc
+
+
+class MultiTemplateMatcher:
+    """共享图像频谱的多模板批量匹配器
+    
+    每帧只对图像做一次傅里叶变换，与各模板预先计算的频谱相乘后批量逆变换得到相关项，
+    再用积分图求窗口方差完成归一化，结果与 cv2.TM_CCOEFF_NORMED 一致。
+    """
+    
+    def __init__(self, templates: Dict[Hashable, np.ndarray]):
+        # 键 -> (去均值后的灰度模板, 模板范数)
+        self._templates: Dict[Hashable, Tuple[np.ndarray, float]] = {}
+        for key, template in templates.items():
+            gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY) if template.ndim == 3 else template
+            zero_mean = gray.astype(np.float64) - gray.mean()
+            self._templates[key] = (zero_mean, float(np.sqrt(np.sum(zero_mean ** 2))))
+        # 变换尺寸 -> {键: 模板频谱的共轭}
+        self._spectra: Dict[Tuple[int, int], Dict[Hashable, np.ndarray]] = {}
+    
+    def _get_spectra(self, dft_shape: Tuple[int, int]) -> Dict[Hashable, np.ndarray]:
+        """获取指定变换尺寸下各模板的频谱，首次使用时计算并缓存"""
+        spectra = self._spectra.get(dft_shape)
+        if spectra is None:
+            spectra = {
+                key: np.conj(np.fft.rfft2(template, s=dft_shape))
+                for key, (template, _) in self._templates.items()
+            }
+            self._spectra[dft_shape] = spectra
+        return spectra
+    
+    def match(self, img: np.ndarray, keys: Optional[Iterable[Hashable]] = None) -> Dict[Hashable, np.ndarray]:
+        """计算各模板在灰度图像上的归一化相关系数响应图
+        
+        Args:
+            img: 灰度图像
+            keys: 需要匹配的模板键，为None时匹配全部模板，大于图像的模板会被跳过
+            
+        Returns:
+            模板键到响应图的字典，响应图大小与 cv2.matchTemplate 的结果相同
+        """
+        height, width = img.shape[:2]
+        keys = [
+            key for key in (self._templates if keys is None else keys)
+            if self._templates[key][0].shape[0] <= height and self._templates[key][0].shape[1] <= width
+        ]
+        if not keys:
+            return {}
+        
+        # 变换尺寸不小于图像时，有效区域内的循环相关不会发生回绕
+        dft_shape = (cv2.getOptimalDFTSize(height), cv2.getOptimalDFTSize(width))
+        spectra = self._get_spectra(dft_shape)
+        image_spectrum = np.fft.rfft2(img.astype(np.float64), s=dft_shape)
+        correlations = np.fft.irfft2(np.stack([spectra[key] for key in keys]) * image_spectrum, s=dft_shape)
+        sums, square_sums = cv2.integral2(img, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        
+        results = {}
+        for index, key in enumerate(keys):
+            template, norm = self._templates[key]
+            t_height, t_width = template.shape
+            out_height, out_width = height - t_height + 1, width - t_width + 1
+            window_sum = self._window_sum(sums, t_height, t_width, out_height, out_width)
+            window_square_sum = self._window_sum(square_sums, t_height, t_width, out_height, out_width)
+            variance = np.maximum(window_square_sum - window_sum ** 2 / template.size, 0)
+            denominator = np.sqrt(variance) * norm
+            numerator = correlations[index, :out_height, :out_width]
+            # 纯色窗口或纯色模板无法归一化，记为0分
+            res = np.zeros_like(numerator)
+            np.divide(numerator, denominator, out=res, where=denominator > 1e-6)
+            results[key] = res
+        return results
+    
+    @staticmethod
+    def _window_sum(integral: np.ndarray, t_height: int, t_width: int,
+                    out_height: int, out_width: int) -> np.ndarray:
+        """由积分图计算每个模板窗口内的像素和"""
+        return (integral[t_height:t_height + out_height, t_width:t_width + out_width]
+                - integral[:out_height, t_width:t_width + out_width]
+                - integral[t_height:t_height + out_height, :out_width]
+                + integral[:out_height, :out_width])
+
+
+class FishingStateClassifier:
+    """一次遍历为所有状态模板打分的状态分类器
+    
+    在金字塔缩小后的灰度截图上批量匹配各状态模板，返回每个状态的相对分数和粗匹配峰值位置，
+    状态机只在最高分状态的峰值附近做原始分辨率确认。
+    各模板按 PyramidMatcher.coarse_scale 选择的比例缩小，并裁掉边缘一个缩小像素，
+    边缘在缩小后与界面背景混合，低纹理的按钮在不利的网格偏移下分数会明显偏低。
+    粗匹配分数除以模板自身在各网格偏移下的最低分数，不同纹理的模板分数可以相互比较。
+    """
+    
+    def __init__(self, templates: TemplateRegistry):
+        # 状态 -> (粗匹配比例, 裁掉的边缘宽度, 模板自身的最低粗匹配分数)
+        self._states: Dict[FishState, Tuple[float, int, float]] = {}
+        coarse: Dict[float, Dict[FishState, np.ndarray]] = {}
+        for state, path in STATE_TEMPLATES.items():
+            template = templates.get(path).color
+            scale = PyramidMatcher.coarse_scale(template) or PyramidMatcher.MAX_COARSE_SCALE
+            border = round(1 / scale)
+            inner = np.ascontiguousarray(template[border:-border, border:-border])
+            self._states[state] = (scale, border, max(PyramidMatcher.phase_score(inner, scale), 0.1))
+            coarse.setdefault(scale, {})[state] = PyramidMatcher.downscale(inner, scale)
+        self._matchers = {scale: MultiTemplateMatcher(group) for scale, group in coarse.items()}
+    
+    def score(self, img: np.ndarray, 
+              states: Optional[Iterable[FishState]] = None) -> Dict[FishState, Tuple[float, Tuple[int, int]]]:
+        """计算各状态的相对匹配分数
+        
+        Args:
+            img: 当前屏幕截图
+            states: 需要打分的状态，为None时对所有状态打分
+            
+        Returns:
+            状态到 (相对分数, 峰值处模板左上角在截图中的坐标) 的字典，模板大于截图的状态分数为-1
+        """
+        states = list(STATE_TEMPLATES) if states is None else list(states)
+        scores = {state: (-1.0, (0, 0)) for state in states}
+        for scale, matcher in self._matchers.items():
+            keys = [state for state in states if self._states[state][0] == scale]
+            if not keys:
+                continue
+            maps = matcher.match(PyramidMatcher.downscale(img, scale), keys)
+            for state, res in maps.items():
+                _, border, expected = self._states[state]
+                _, max_val, _, max_loc = cv2.minMaxLoc(res)
+                scores[state] = (max_val / expected, 
+                                 (int(max_loc[0] / scale) - border, int(max_loc[1] / scale) - border))
+        return scores
+
+
+class VisionJobs:
+    """识别任务的实现
+    
+    状态识别、方向序列识别和位置检测中的模板匹配都以任务的形式提交，并返回 Future。
+    本类直接在调用线程中执行任务，同时也是识别工作进程中的任务实现。
+    """
+    
+    KINDS = ('find', 'classify', 'match_position', 'direction_icons')
+    
+    def __init__(self, templates: TemplateRegistry):
+        self.templates = templates
+        self.classifier = FishingStateClassifier(templates)
+        self._icon_matcher: Optional[MultiTemplateMatcher] = None
+    
+    def find(self, img: np.ndarray, 
+             path: Path, 
+             roi: Optional[Tuple[int, int, int, int]], 
+             threshold: float, 
+             early_exit: bool) -> Tuple[float, Tuple[int, int]]:
+        """在搜索区域内精确匹配，未指定搜索区域时使用金字塔匹配"""
+        template = self.templates.get(path).color
+        if roi is not None:
+            return ImageProcessor.find_template(img, template, roi)
+        return PyramidMatcher.find(img, template, threshold, early_exit)
+    
+    def classify(self, img: np.ndarray, 
+                 states: Tuple[FishState, ...]) -> Dict[FishState, Tuple[float, Tuple[int, int]]]:
+        """为候选状态打分"""
+        return self.classifier.score(img, states)
+    
+    def match_position(self, img: np.ndarray, path: Path, position: Tuple[float, float]) -> Tuple[int, int]:
+        """匹配模板并返回指定的归一化位置"""
+        return ImageProcessor.match_template(img, self.templates.get(path).color, position=position)
+    
+    def direction_icons(self, img: np.ndarray, x0: int, x1: int, 
+                        threshold: float = 0.8) -> List[Tuple[Tuple[int, int], str, float]]:
+        """找出左上角横坐标在 [x0, x1) 内的方向图标
+        
+        八个图标在灰度图上共享一次傅里叶变换批量匹配，超过 Config.DIRECTION_PREFILTER_THRESHOLD 的候选
+        再在其附近用彩色模板确认，同一位置按灰度分数从高到低取第一个彩色分数达到 threshold 的图标。
+        
+        Returns:
+            按横坐标排序的 [((x, y), 图标名称, 彩色匹配分数), ...]，坐标相对 img
+        """
+        icons = {path.stem: self.templates.get(path) for path in Config.DIRECTION_ICONS}
+        if self._icon_matcher is None:
+            self._icon_matcher = MultiTemplateMatcher({name: icon.gray for name, icon in icons.items()})
+        max_width = max(icon.shape[1] for icon in icons.values())
+        min_width = min(icon.shape[1] for icon in icons.values())
+        region = img[:, x0:min(img.shape[1], x1 + max_width)]
+        gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        
+        candidates = []  # (x, y, 灰度分数, 图标名称)
+        for name, res in self._icon_matcher.match(gray).items():
+            for (x, y), score in ImageProcessor.extract_peaks(res[:, :x1 - x0], Config.DIRECTION_PREFILTER_THRESHOLD):
+                candidates.append((x + x0, y, score, name))
+        candidates.sort()
+        
+        # 横向距离小于最窄图标一半的候选属于同一个图标
+        groups: List[List[Tuple[int, int, float, str]]] = []
+        for candidate in candidates:
+            if groups and candidate[0] - groups[-1][0][0] < min_width // 2:
+                groups[-1].append(candidate)
+            else:
+                groups.append([candidate])
+        
+        padding = 3
+        found = []
+        for group in groups:
+            for x, y, _, name in sorted(group, key=lambda c: c[2], reverse=True):
+                icon = icons[name]
+                roi = (x - padding, y - padding, icon.shape[1] + padding * 2, icon.shape[0] + padding * 2)
+                score, loc = ImageProcessor.find_template(img, icon.color, roi)
+                if score >= threshold:
+                    found.append((loc, name, score))
+                    break
+        return found
+    
+    def submit(self, kind: str, img: np.ndarray, *args) -> Future:
+        """在当前线程执行任务，返回已完成的 Future"""
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的识别任务: {kind}")
+        future = Future()
+        try:
+            future.set_result(getattr(self, kind)(img, *args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@dataclass(frozen=True)
+class ColorProbe:
+    """像素探针，监测屏幕上一个点附近的颜色是否偏离参考颜色"""
+    name: str
+    position: Tuple[int, int]  # 屏幕坐标 (x, y)
+    reference: Tuple[int, int, int]  # 参考颜色 RGB
+
+
+class ProbeSampler:
+    """批量像素探针
+    
+    每帧对所有探针周围 (2*radius+1)^2 的小块做一次向量化采样，取均值作为探针的值(RGB)。
+    与参考颜色各通道的最大差值超过 tolerance + hysteresis 时判定为偏离，回到 tolerance 以内才恢复，
+    避免抗锯齿和滤镜抖动在阈值附近反复触发。同一帧只采样一次，多个检查共享结果。
+    """
+    
+    def __init__(self, probes: Iterable[ColorProbe], 
+                 radius: int = Config.PROBE_RADIUS,
+                 tolerance: float = Config.PROBE_TOLERANCE,
+                 hysteresis: float = Config.PROBE_HYSTERESIS):
+        self.probes = list(probes)
+        self.index = {probe.name: i for i, probe in enumerate(self.probes)}
+        self.tolerance = tolerance
+        self.hysteresis = hysteresis
+        # 每个探针小块中各像素的屏幕坐标，形状为 (探针数, 像素数)
+        offsets = np.arange(-radius, radius + 1)
+        dy, dx = np.meshgrid(offsets, offsets, indexing='ij')
+        positions = np.array([probe.position for probe in self.probes], dtype=np.intp).reshape(-1, 2)
+        self._xs = positions[:, :1] + dx.ravel()
+        self._ys = positions[:, 1:] + dy.ravel()
+        self.references = np.array([probe.reference for probe in self.probes], dtype=np.float32).reshape(-1, 3)
+        self.values = np.zeros((len(self.probes), 3), dtype=np.float32)  # 最近一帧各探针的颜色
+        self.deviated = np.zeros(len(self.probes), dtype=bool)  # 最近一帧各探针是否偏离参考颜色
+        self._seq: Optional[int] = None
+    
+    def sample(self, image: np.ndarray, origin: Tuple[int, int]) -> np.ndarray:
+        """一次取出所有探针的小块，返回各探针的平均颜色 RGB，形状为 (探针数, 3)"""
+        ys = np.clip(self._ys - origin[1], 0, image.shape[0] - 1)
+        xs = np.clip(self._xs - origin[0], 0, image.shape[1] - 1)
+        return image[ys, xs].mean(axis=1, dtype=np.float32)[:, ::-1]
+    
+    @Metrics.timed('probe')
+    def read(self, frame: Frame) -> np.ndarray:
+        """采样一帧并返回各探针是否偏离参考颜色，同一帧重复调用时直接返回上次的结果"""
+        if frame.seq != self._seq:
+            self.values = self.sample(frame.image, frame.origin)
+            distance = np.abs(self.values - self.references).max(axis=1)
+            self.deviated = np.where(self.deviated, 
+                                     distance > self.tolerance, 
+                                     distance > self.tolerance + self.hysteresis)
+            self._seq = frame.seq
+        return self.deviated
+    
+    def is_deviated(self, frame: Frame, name: str) -> bool:
+        """指定探针在该帧是否偏离参考颜色"""
+        return bool(self.read(frame)[self.index[name]])
+    
+    @staticmethod
+    def patch_color(image: np.ndarray, 
+                    origin: Tuple[int, int], 
+                    position: Tuple[int, int], 
+                    radius: int = Config.PROBE_RADIUS) -> Tuple[int, int, int]:
+        """计算一个点附近小块的平均颜色 RGB，用作探针的参考颜色"""
+        sampler = ProbeSampler([ColorProbe('', position, (0, 0, 0))], radius)
+        return tuple(int(round(float(v))) for v in sampler.sample(image, origin)[0])
+
+
+class FrameChangeDetector:
+    """基于分块均值的画面变化检测
+    
+    把画面缩小成每 tile x tile 像素一个均值的签名，与参考签名比较，
+    只看指定区域覆盖的分块，各分块各通道的最大差值不超过 threshold 时认为画面未变化。
+    """
+    
+    def __init__(self, tile: int = Config.FRAME_DIFF_TILE, threshold: float = Config.FRAME_DIFF_THRESHOLD):
+        self.tile = tile
+        self.threshold = threshold
+    
+    def signature(self, img: np.ndarray) -> np.ndarray:
+        """计算画面的分块均值签名，每个分块在每个方向上隔行隔列取4个采样点"""
+        height, width = img.shape[:2]
+        size = (max(1, width // self.tile), max(1, height // self.tile))
+        step = max(1, self.tile // 4)
+        return cv2.resize(img[::step, ::step], size, interpolation=cv2.INTER_AREA).astype(np.int16)
+    
+    def changed(self, signature: np.ndarray, 
+                reference: Optional[np.ndarray], 
+                image_shape: Tuple[int, ...],
+                regions: Optional[Iterable[Tuple[int, int, int, int]]] = None) -> bool:
+        """比较两个签名，regions 为图像坐标的区域 (x, y, width, height)，为None时比较整个画面"""
+        if reference is None or reference.shape != signature.shape:
+            return True
+        diff = np.abs(signature - reference).max(axis=2)
+        if regions is None:
+            return bool(diff.max() > self.threshold)
+        
+        scale_y = signature.shape[0] / image_shape[0]
+        scale_x = signature.shape[1] / image_shape[1]
+        for x, y, width, height in regions:
+            # 区域覆盖到的所有分块
+            top = max(0, int(y * scale_y))
+            left = max(0, int(x * scale_x))
+            bottom = math.ceil((y + height) * scale_y)
+            right = math.ceil((x + width) * scale_x)
+            tiles = diff[top:bottom, left:right]
+            if tiles.size and tiles.max() > self.threshold:
+                return True
+        return False
@@ -0,0 +1,171 @@
+"""多进程识别
+
+截图通过共享内存传给工作进程，只在配置了 vision_pool: process 时导入。
+"""
+import copy
+import sys
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Tuple, Dict, Any, List, TYPE_CHECKING
+from dataclasses import dataclass
+from threading import Lock
+from setting import Config
+from vision import TemplateRegistry, VisionJobs
+import logging
+
+if TYPE_CHECKING:
+    from multiprocessing import shared_memory
+
+
+@dataclass(frozen=True)
+class SharedImage:
+    """共享内存中图像的描述，进程间只传递描述而不复制像素"""
+    name: str  # 共享内存名称
+    offset: int  # 图像数据在共享内存中的偏移
+    shape: Tuple[int, ...]
+    strides: Tuple[int, ...]
+
+
+# 识别工作进程中各模板比例的任务实现和已连接的共享内存
+_worker_templates: Optional[TemplateRegistry] = None
+_worker_jobs: Dict[float, VisionJobs] = {}
+_worker_segments: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+
+
+def _init_vision_worker() -> None:
+    """识别工作进程初始化，加载模板"""
+    global _worker_templates
+    _worker_templates = TemplateRegistry()
+
+
+def _attach_shared_memory(name: str) -> 'shared_memory.SharedMemory':
+    """连接主进程创建的共享内存"""
+    from multiprocessing import shared_memory
+    if sys.version_info >= (3, 13):
+        # 只连接不负责释放，避免工作进程退出时资源跟踪器删除共享内存
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _run_vision_job(kind: str, image: SharedImage, args: tuple, scale: float = 1.0) -> Any:
+    """在识别工作进程中按指定的模板比例执行任务"""
+    segment = _worker_segments.get(image.name)
+    if segment is None:
+        segment = _attach_shared_memory(image.name)
+        _worker_segments[image.name] = segment
+        # 主进程释放的共享内存不会通知工作进程，只保留最近使用的连接，
+        # 其它连接关闭后映射才会真正释放；上一个任务的数组已经不再引用它们
+        while len(_worker_segments) > Config.VISION_WORKER_SEGMENTS:
+            _worker_segments.popitem(last=False)[1].close()
+    else:
+        _worker_segments.move_to_end(image.name)
+    img = np.ndarray(image.shape, dtype=np.uint8, buffer=segment.buf,
+                     offset=image.offset, strides=image.strides)
+    jobs = _worker_jobs.get(scale)
+    if jobs is None:
+        jobs = VisionJobs(_worker_templates.scaled(scale))
+        _worker_jobs[scale] = jobs
+    return jobs.submit(kind, img, *args).result()
+
+
+class VisionWorkerPool:
+    """基于进程的识别工作池
+    
+    帧总线的槽位分配在共享内存中，提交任务时只把图像所在的共享内存名称、偏移和形状发给工作进程，
+    工作进程直接在共享内存上匹配，不经过序列化。图像不在共享内存中时在调用线程执行。
+    """
+    
+    def __init__(self, templates: TemplateRegistry, workers: int = Config.VISION_WORKERS):
+        from concurrent.futures import ProcessPoolExecutor
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_vision_worker)
+        self._templates = templates
+        self._local = VisionJobs(templates)
+        self.scale = templates.scale
+        # id(共享内存上的数组) -> (数组, 共享内存)
+        self._segments: Dict[int, Tuple[np.ndarray, 'shared_memory.SharedMemory']] = {}
+        # 已释放、等待数组及其视图的引用全部消失后关闭并删除的共享内存
+        self._retired: List['shared_memory.SharedMemory'] = []
+        # 多个实例的采集线程和动作线程会同时分配和释放缓冲区
+        self._lock = Lock()
+        logging.info(f"已启动 {workers} 个识别工作进程")
+    
+    def allocate(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """在共享内存中分配图像缓冲区"""
+        from multiprocessing import shared_memory
+        segment = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        array = np.ndarray(shape, dtype=np.uint8, buffer=segment.buf)
+        with self._lock:
+            self._segments[id(array)] = (array, segment)
+            self._close_retired()
+        return array
+    
+    def release(self, array: np.ndarray) -> None:
+        """释放 allocate 分配的缓冲区，调用方之后不能再使用该数组及其视图
+        
+        共享内存在数组及其视图的引用全部消失后才关闭并删除，此时还有引用时留到下一次分配或释放
+        """
+        with self._lock:
+            entry = self._segments.pop(id(array), None)
+            if entry is not None:
+                self._retired.append(entry[1])
+            del array, entry
+            self._close_retired()
+    
+    def _close_retired(self) -> None:
+        """关闭并删除已经没有数组引用的共享内存，先关闭再删除，删除时不会有仍在使用的视图，调用时需持有锁"""
+        remaining = []
+        for segment in self._retired:
+            try:
+                segment.close()
+            except BufferError:
+                remaining.append(segment)
+                continue
+            segment.unlink()
+        # 原地修改，scaled 得到的识别池共享同一个列表
+        self._retired[:] = remaining
+    
+    def _describe(self, img: np.ndarray) -> Optional[SharedImage]:
+        """获取图像在共享内存中的描述，图像不在共享内存中时返回None"""
+        base = img
+        while base is not None and id(base) not in self._segments:
+            base = base.base if isinstance(base.base, np.ndarray) else None
+        if base is None:
+            return None
+        offset = img.__array_interface__['data'][0] - base.__array_interface__['data'][0]
+        return SharedImage(self._segments[id(base)][1].name, offset, img.shape, img.strides)
+    
+    def submit(self, kind: str, img: np.ndarray, *args) -> Future:
+        """提交识别任务
+        
+        Args:
+            kind: 任务类型，见 VisionJobs.KINDS
+            img: 输入图像，应为 allocate 分配的缓冲区或其视图，在任务完成前不能被修改
+            args: 任务参数
+        """
+        image = self._describe(img)
+        if image is None:
+            return self._local.submit(kind, img, *args)
+        return self._executor.submit(_run_vision_job, kind, image, args, self.scale)
+    
+    def scaled(self, scale: float) -> 'VisionWorkerPool':
+        """共享同一组工作进程和共享内存、按指定比例缩放模板的识别池，只需关闭原来的识别池"""
+        if scale == self.scale:
+            return self
+        pool = copy.copy(self)
+        pool.scale = scale
+        pool._local = VisionJobs(self._templates.scaled(scale))
+        return pool
+    
+    def close(self) -> None:
+        """关闭工作进程并释放共享内存
+        
+        应在帧总线关闭(FrameBus.close)之后调用，仍被数组引用的共享内存不会关闭和删除，只记录警告
+        """
+        self._executor.shutdown()
+        with self._lock:
+            self._retired.extend(segment for _, segment in self._segments.values())
+            self._segments.clear()
+            self._close_retired()
+            for segment in self._retired:
+                logging.warning(f"共享内存 {segment.name} 仍被数组引用，未能释放")